@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Codificación compacta negociada para el tráfico entre nodos (sincronización del KV, tareas
+reenviadas y mensajes). Cada nodo anuncia en el latido los formatos que entiende y el emisor
+elige el mejor común; con un par que no anuncia nada se sigue enviando JSON.
+  - formatos: msgpack (si está instalado) o JSON compacto; en ambos, las listas numéricas
+    se envían como buffers little-endian {"$nd": [dtype, forma, bytes]} en lugar de texto
+  - compresión por encima de un umbral: zstd o lz4 si están instalados, si no deflate (zlib)
+Los receptores aceptan siempre el JSON de siempre además de los formatos compactos. La
+descompresión se puede acotar (`maximo` bytes): un cuerpo pequeño que se expande a gigas
+se corta en cuanto pasa del límite en lugar de agotar la memoria.
+"""
+import base64, importlib.util, json, zlib
+from typing import Dict, Any, List, Optional, Tuple
+
+from Libs.motores import ModuloPerezoso
+
+np = ModuloPerezoso("numpy")  # solo hace falta al empaquetar/desempaquetar arrays
+
+TIPO_JSON = "application/json"
+TIPO_MSGPACK = "application/msgpack"
+TIPO_JSON_COMPACTO = "application/vnd.so+json"
+
+_TIPOS = {"msgpack": TIPO_MSGPACK, "json-nd": TIPO_JSON_COMPACTO}
+_FORMATO_DE_TIPO = {v: k for k, v in _TIPOS.items()}
+
+ARRAY_MINIMO = 16  # elementos a partir de los que una lista numérica viaja como buffer
+_DTYPES = {"i": "<i8", "f": "<f8"}
+
+
+def _instalado(modulo: str) -> bool:
+    return importlib.util.find_spec(modulo) is not None
+
+
+# Dependencias opcionales: se detectan sin importarlas (se cargan en el primer uso)
+msgpack = ModuloPerezoso("msgpack")
+zstandard = ModuloPerezoso("zstandard")
+lz4_frame = ModuloPerezoso("lz4.frame")
+
+FORMATOS: List[str] = (["msgpack"] if _instalado("msgpack") else []) + ["json-nd"]
+COMPRESIONES: List[str] = (
+    (["zstd"] if _instalado("zstandard") else [])
+    + (["lz4"] if _instalado("lz4") else [])
+    + ["deflate"]
+)
+
+
+def capacidades() -> Dict[str, List[str]]:
+    """Lo que este nodo sabe decodificar, en orden de preferencia (se anuncia en el latido)."""
+    return {"formatos": list(FORMATOS), "compresion": list(COMPRESIONES)}
+
+
+# --- Arrays numéricos como buffers ---
+def _como_array(lista: list) -> Optional["np.ndarray"]:
+    """ndarray si la lista es numérica y rectangular; None si no (se deja como está)."""
+    try:
+        arr = np.asarray(lista)
+    except ValueError:
+        return None  # irregular
+    if arr.dtype.kind not in _DTYPES or arr.size < ARRAY_MINIMO:
+        return None
+    return arr.astype(_DTYPES[arr.dtype.kind], copy=False)
+
+
+def _es_numero(valor: Any) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def empaquetar_arrays(obj: Any, binario: bool = True) -> Any:
+    """Sustituye las listas numéricas grandes por {"$nd": [dtype, forma, datos]}."""
+    if isinstance(obj, dict):
+        return {k: empaquetar_arrays(v, binario) for k, v in obj.items()}
+    if isinstance(obj, list) and obj:
+        primero = obj[0]
+        if _es_numero(primero) or (isinstance(primero, list) and primero and _es_numero(primero[0])):
+            arr = _como_array(obj)
+            if arr is not None:
+                datos = arr.tobytes()
+                return {"$nd": [arr.dtype.str, list(arr.shape),
+                                datos if binario else base64.b64encode(datos).decode("ascii")]}
+            if _es_numero(primero):
+                return obj
+        return [empaquetar_arrays(v, binario) for v in obj]
+    return obj
+
+
+def _desempaquetar(d: Dict[str, Any]) -> Any:
+    """object_hook: reconstruye las listas a partir de un {"$nd": ...}."""
+    if len(d) == 1 and "$nd" in d:
+        dtype, forma, datos = d["$nd"]
+        if isinstance(datos, str):
+            datos = base64.b64decode(datos)
+        return np.frombuffer(datos, dtype=dtype).reshape(forma).tolist()
+    return d
+
+
+# --- Compresión ---
+def _comprimir(cuerpo: bytes, algoritmo: str) -> bytes:
+    if algoritmo == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(cuerpo)
+    if algoritmo == "lz4":
+        return lz4_frame.compress(cuerpo)
+    return zlib.compress(cuerpo, 6)
+
+
+class CuerpoDemasiadoGrande(ValueError):
+    pass
+
+
+def _descomprimir(cuerpo: bytes, algoritmo: str, maximo: Optional[int] = None) -> bytes:
+    """Descomprime sin producir más de `maximo` bytes (None: sin límite)."""
+    limite = -1 if maximo is None else maximo + 1  # un byte de más delata que se pasa
+    if algoritmo == "zstd":
+        with zstandard.ZstdDecompressor().stream_reader(cuerpo) as lector:
+            trozos, total = [], 0
+            while limite < 0 or total < limite:
+                trozo = lector.read(65536 if limite < 0 else min(65536, limite - total))
+                if not trozo:
+                    break
+                trozos.append(trozo)
+                total += len(trozo)
+        salida = b"".join(trozos)
+    elif algoritmo == "lz4":
+        salida = lz4_frame.LZ4FrameDecompressor().decompress(cuerpo, max_length=limite)
+    elif algoritmo == "deflate":
+        d = zlib.decompressobj()
+        salida = d.decompress(cuerpo, max(limite, 0))
+        if not d.eof and (maximo is None or len(salida) <= maximo):
+            raise ValueError("Cuerpo deflate incompleto")
+    else:
+        raise ValueError(f"Content-Encoding no soportado: {algoritmo}")
+    if maximo is not None and len(salida) > maximo:
+        raise CuerpoDemasiadoGrande(f"El cuerpo descomprimido supera {maximo} bytes")
+    return salida
+
+
+def _primero_comun(mios: List[str], suyos: List[str]) -> Optional[str]:
+    return next((x for x in mios if x in suyos), None)
+
+
+def codificar(obj: Any, par: Optional[Dict[str, List[str]]] = None,
+              umbral_compresion: int = 1024) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Cuerpo y cabeceras para enviar `obj` a un nodo con capacidades `par` (las de su latido).
+    Sin capacidades (nodo de una versión anterior) se envía JSON sin comprimir.
+    """
+    par = par or {}
+    formato = _primero_comun(FORMATOS, par.get("formatos") or [])
+    if formato == "msgpack":
+        cuerpo = msgpack.packb(empaquetar_arrays(obj, binario=True), use_bin_type=True)
+    elif formato == "json-nd":
+        cuerpo = json.dumps(empaquetar_arrays(obj, binario=False), separators=(",", ":")).encode()
+    else:
+        return json.dumps(obj).encode(), {"Content-Type": TIPO_JSON}
+    cabeceras = {"Content-Type": _TIPOS[formato]}
+    if len(cuerpo) >= umbral_compresion:
+        algoritmo = _primero_comun(COMPRESIONES, par.get("compresion") or [])
+        if algoritmo is not None:
+            cuerpo = _comprimir(cuerpo, algoritmo)
+            cabeceras["Content-Encoding"] = algoritmo
+    return cuerpo, cabeceras
+
+
+def es_compacto(content_type: Optional[str], content_encoding: Optional[str]) -> bool:
+    tipo = (content_type or "").split(";")[0].strip()
+    return tipo in _FORMATO_DE_TIPO or bool(content_encoding and content_encoding != "identity")
+
+
+def decodificar(cuerpo: bytes, content_type: Optional[str], content_encoding: Optional[str] = None,
+                maximo: Optional[int] = None) -> Any:
+    """
+    Objeto Python de un cuerpo en cualquiera de los formatos aceptados (incluido JSON).
+    Con `maximo`, CuerpoDemasiadoGrande si descomprimido ocupa más de esos bytes.
+    """
+    if content_encoding and content_encoding != "identity":
+        cuerpo = _descomprimir(cuerpo, content_encoding, maximo)
+    tipo = (content_type or "").split(";")[0].strip()
+    if tipo == TIPO_MSGPACK:
+        return msgpack.unpackb(cuerpo, object_hook=_desempaquetar, raw=False)
+    return json.loads(cuerpo, object_hook=_desempaquetar if tipo == TIPO_JSON_COMPACTO else None)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Motores de cálculo de las tareas, sin dependencias del servidor HTTP para poder
+ejecutarse tanto en el proceso del nodo como en procesos de cómputo.
+"""
+from typing import Dict, Any
+import numpy as np
+
+from Libs import memoria_compartida
+
+
+def regresion_lineal(X: np.ndarray, y: np.ndarray, X_test: np.ndarray) -> Dict[str, Any]:
+    """
+    Mínimos cuadrados con término independiente. Forma las ecuaciones normales por bloques
+    (n, ΣX, XᵀX, Σy, Xᵀy) en lugar de materializar [1 | X]: no copia X y lo recorre sin
+    asignar matrices del tamaño de los datos. Un X 1-D es una sola variable (columna).
+    """
+    if X.ndim == 1:
+        X = X.reshape(-1, 1)
+    n, d = X.shape
+    if X_test.ndim == 1:
+        X_test = X_test.reshape(-1, d)
+    suma_x = X.sum(axis=0)
+    A = np.empty((d + 1, d + 1))
+    A[0, 0] = n
+    A[0, 1:] = suma_x
+    A[1:, 0] = suma_x
+    A[1:, 1:] = X.T @ X
+    b = np.empty(d + 1)
+    b[0] = y.sum()
+    b[1:] = X.T @ y
+    w = np.linalg.pinv(A) @ b
+    y_pred = w[0] + X_test @ w[1:]
+    return {"coeficientes": w.tolist(), "predicciones": y_pred.tolist()}
+
+
+def regresion_lineal_json(X, y, X_test) -> Dict[str, Any]:
+    """Regresión sobre listas tal como llegan en el payload."""
+    return regresion_lineal(np.array(X, dtype=float), np.array(y, dtype=float), np.array(X_test, dtype=float))
+
+
+def calcular_gradiente(modelo, datos):
+    # Simulación: devuelve un vector de ceros del mismo tamaño que el modelo
+    return np.zeros_like(modelo).tolist()
+
+
+def regresion_lineal_compartida(descriptor: Dict[str, Any]) -> Dict[str, Any]:
+    """Punto de entrada en un proceso de cómputo: X, y y X_test son vistas sobre memoria compartida."""
+    arrays = memoria_compartida.abrir(descriptor)
+    return regresion_lineal(arrays["X"], arrays["y"], arrays["X_test"])
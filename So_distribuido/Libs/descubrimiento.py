@@ -16,7 +16,8 @@ class Descubridor:
         obtener_metricas_fn,  # ← NUEVO: función callback para obtener métricas locales
         ttl: int = 1,
         intervalo: float = 2.0,
-        timeout: float = 6.0
+        timeout: float = 6.0,
+        al_expirar=None  # callback(url) cuando un vecino deja de anunciarse
     ):
         self.grupo = grupo
         self.puerto = puerto
@@ -25,6 +26,7 @@ class Descubridor:
         self.obtener_metricas_fn = obtener_metricas_fn  # e.g., lambda: {"carga": _carga}
         self.intervalo = intervalo
         self.timeout = timeout
+        self.al_expirar = al_expirar
         # vecinos: nombre -> (último_ts, url, métricas_dict)
         self.vecinos: Dict[str, tuple] = {}
         self._detener = threading.Event()
@@ -43,6 +45,9 @@ class Descubridor:
         sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
         return sock
 
+    def _destinos(self) -> List[tuple]:
+        return [(self.grupo, self.puerto)]
+
     def anunciar(self):
         sock = self._socket_emisor()
         while not self._detener.is_set():
@@ -54,52 +59,64 @@ class Descubridor:
                 "ts": time.time(),
                 **metricas_locales  # incluye carga, etc.
             }
-            try:
-                sock.sendto(json.dumps(mensaje).encode('utf-8'), (self.grupo, self.puerto))
-            except Exception:
-                pass  # silencioso ante fallos de red
+            datos = json.dumps(mensaje).encode('utf-8')
+            for destino in self._destinos():
+                try:
+                    sock.sendto(datos, destino)
+                except Exception:
+                    pass  # silencioso ante fallos de red
             time.sleep(self.intervalo)
 
-            def escuchar(self):
-                sock = self._socket_receptor()
-                sock.settimeout(0.5)  # timeout corto para responder rápido a detener()
-                while not self._detener.is_set():
-                    try:
-                        data, _ = sock.recvfrom(4096)
-                        try:
-                            info = json.loads(data.decode('utf-8'))
-                            if not isinstance(info, dict):
-                                continue
-                            nombre_vecino = info.get("nombre")
-                            if not nombre_vecino or nombre_vecino == self.nombre:
-                                continue
-                            ts = info.get("ts", 0)
-                            url = info.get("url", "")
-                            if not url or not isinstance(ts, (int, float)):
-                                continue
-                            metricas = {k: v for k, v in info.items() if k not in {"nombre", "url", "ts"}}
-                            self.vecinos[nombre_vecino] = (ts, url, metricas)
-                        except (json.JSONDecodeError, UnicodeDecodeError, ValueError, KeyError):
-                            # Mensaje malformado: ignorar silenciosamente
-                            continue
-                    except socket.timeout:
-                        # Timeout normal: permite verificar _detener frecuentemente
-                        pass
-                    except OSError as e:
-                        # Error de socket grave (ej: interfaz caída)
-                        print(f"[Descubridor] Error de socket: {e}")
-                        time.sleep(1)  # evitar bucle rápido de error
-                    # Purgar expirados en cada iteración (ligero y constante)
-                    ahora = time.time()
-                    expirados = [k for k, (ts, _, _) in self.vecinos.items() if ahora - ts > self.timeout]
-                    for k in expirados:
-                        self.vecinos.pop(k, None)
-                sock.close()
+    def _procesar_anuncio(self, data: bytes) -> bool:
+        """Valida un latido recibido y actualiza la tabla de vecinos. Devuelve True si se aceptó."""
+        try:
+            info = json.loads(data.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError):
+            # Mensaje malformado: ignorar silenciosamente
+            return False
+        if not isinstance(info, dict):
+            return False
+        nombre_vecino = info.get("nombre")
+        if not nombre_vecino or nombre_vecino == self.nombre:
+            return False
+        ts = info.get("ts", 0)
+        url = info.get("url", "")
+        if not url or not isinstance(ts, (int, float)):
+            return False
+        metricas = {k: v for k, v in info.items() if k not in {"nombre", "url", "ts"}}
+        self.vecinos[nombre_vecino] = (ts, url, metricas)
+        return True
+
+    def _purgar_expirados(self):
+        ahora = time.time()
+        expirados = [k for k, (ts, _, _) in self.vecinos.items() if ahora - ts > self.timeout]
+        for k in expirados:
+            vecino = self.vecinos.pop(k, None)
+            if vecino is not None and self.al_expirar is not None:
+                self.al_expirar(vecino[1])
+
+    def escuchar(self):
+        sock = self._socket_receptor()
+        sock.settimeout(0.5)  # timeout corto para responder rápido a detener()
+        while not self._detener.is_set():
+            try:
+                data, _ = sock.recvfrom(65535)
+                self._procesar_anuncio(data)
+            except socket.timeout:
+                # Timeout normal: permite verificar _detener frecuentemente
+                pass
+            except OSError as e:
+                # Error de socket grave (ej: interfaz caída)
+                print(f"[Descubridor] Error de socket: {e}")
+                time.sleep(1)  # evitar bucle rápido de error
+            # Purgar expirados en cada iteración (ligero y constante)
+            self._purgar_expirados()
+        sock.close()
 
     def iniciar(self):
         self._detener.clear()
-        threading.Thread(target=self.anunciar, daemon=True).start()
-        threading.Thread(target=self.escuchar, daemon=True).start()
+        threading.Thread(target=self.anunciar, daemon=True, name="descubrimiento-anunciar").start()
+        threading.Thread(target=self.escuchar, daemon=True, name="descubrimiento-escuchar").start()
 
     def detener(self):
         self._detener.set()
@@ -114,4 +131,28 @@ class Descubridor:
                 "ultimo_latido": ts,
                 **metricas
             })
-        return resultado
\ No newline at end of file
+        return resultado
+
+
+class DescubridorLoopback(Descubridor):
+    """
+    Sustituto de la multidifusión para clústeres locales (pruebas y benchmarks):
+    cada nodo escucha en su propio puerto UDP de 127.0.0.1 y envía el latido por
+    unicast a los puertos de sus pares.
+    """
+
+    def __init__(self, puerto: int, pares: List[int], nombre: str, servicio_url: str,
+                 obtener_metricas_fn, **kwargs):
+        super().__init__("127.0.0.1", puerto, nombre, servicio_url, obtener_metricas_fn, **kwargs)
+        self.pares = [p for p in pares if p != puerto]
+
+    def _socket_emisor(self):
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+
+    def _socket_receptor(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.bind(("127.0.0.1", self.puerto))
+        return sock
+
+    def _destinos(self) -> List[tuple]:
+        return [("127.0.0.1", p) for p in self.pares]
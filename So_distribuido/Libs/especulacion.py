@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecución especulativa (hedged requests) para recortar la latencia de cola.
+Si un reenvío no termina dentro de un umbral basado en percentiles del historial,
+se lanza un duplicado en otro nodo; gana el primer resultado y el perdedor se cancela.
+"""
+import threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Callable
+
+# Configuración por defecto para cualquier tipo de tarea sin entrada propia
+CONFIG_POR_DEFECTO = {
+    "habilitada": True,
+    "percentil": 95,    # umbral = p95 de la latencia observada de reenvío
+    "min_ms": 50.0,     # nunca especular antes de esto
+    "min_muestras": 20  # sin historial suficiente no se especula
+}
+
+
+class PoliticaEspeculativa:
+    def __init__(
+        self,
+        metricas,
+        config_por_tipo: Optional[Dict[str, Dict[str, Any]]] = None,
+        max_extra: float = 0.1,
+        max_hilos: int = 32
+    ):
+        self.metricas = metricas
+        self.config_por_tipo = config_por_tipo or {}
+        # Fracción máxima de carga extra: cada petición aporta `max_extra` fichas, cada duplicado gasta una
+        self.max_extra = max_extra
+        self._fichas = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="especulacion")
+
+    def config(self, tipo: str) -> Dict[str, Any]:
+        base = dict(CONFIG_POR_DEFECTO)
+        base.update(self.config_por_tipo.get("*", {}))
+        base.update(self.config_por_tipo.get(tipo, {}))
+        return base
+
+    @staticmethod
+    def nombre_metrica(tipo: str) -> str:
+        return f"reenvio_ms_{tipo}"
+
+    def umbral_s(self, tipo: str) -> Optional[float]:
+        """Segundos a esperar antes de duplicar, o None si no se debe especular."""
+        cfg = self.config(tipo)
+        if not cfg["habilitada"]:
+            return None
+        p = self.metricas.percentil(self.nombre_metrica(tipo), cfg["percentil"],
+                                    min_muestras=cfg["min_muestras"])
+        if p is None:
+            return None
+        return max(p, cfg["min_ms"]) / 1000.0
+
+    def _registrar_peticion(self):
+        with self._lock:
+            self._fichas = min(self._fichas + self.max_extra, 1.0 + self.max_extra * 10)
+
+    def _consumir_ficha(self) -> bool:
+        with self._lock:
+            if self._fichas >= 1.0:
+                self._fichas -= 1.0
+                return True
+            return False
+
+    def ejecutar(
+        self,
+        tipo: str,
+        lanzar: Callable[[str], Any],
+        destinos: List[str],
+        cancelar: Callable[[str], None],
+        es_final: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Lanza la tarea en destinos[0] y, si tarda más que el umbral, duplica en destinos[1].
+        Solo gana un resultado para el que `es_final` es cierto (por defecto, cualquiera);
+        los demás cuentan como fallos y se sigue esperando a la otra copia.
+        Devuelve (url_ganadora, resultado). Sin ganador devuelve la primera respuesta no final,
+        o propaga la última excepción si todas fallaron.
+        """
+        self._registrar_peticion()
+        t0 = time.time()
+        umbral = self.umbral_s(tipo)
+        if umbral is None or len(destinos) < 2:
+            # Sin posibilidad de duplicar no hace falta pasar por el pool
+            return destinos[0], self._medir(tipo, t0, lanzar(destinos[0]))
+
+        principal = self._pool.submit(lanzar, destinos[0])
+        hechos, _ = wait([principal], timeout=umbral)
+        if hechos or not self._consumir_ficha():
+            return destinos[0], self._medir(tipo, t0, principal.result())
+
+        if self.metricas is not None:
+            self.metricas.inc("tareas_especuladas")
+        duplicado = self._pool.submit(lanzar, destinos[1])
+        origen = {principal: destinos[0], duplicado: destinos[1]}
+        pendientes = set(origen)
+        ultimo_error, no_final = None, None
+        while pendientes:
+            hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for f in hechos:
+                try:
+                    resultado = f.result()
+                except Exception as e:
+                    ultimo_error = e
+                    continue
+                if es_final is not None and not es_final(resultado):
+                    no_final = no_final or (origen[f], resultado)
+                    continue
+                for perdedor in pendientes:
+                    cancelar(origen[perdedor])
+                if f is duplicado and self.metricas is not None:
+                    self.metricas.inc("especulaciones_ganadas")
+                return origen[f], self._medir(tipo, t0, resultado)
+        if no_final is not None:
+            return no_final[0], self._medir(tipo, t0, no_final[1])
+        raise ultimo_error
+
+    def _medir(self, tipo: str, t0: float, resultado):
+        if self.metricas is not None:
+            self.metricas.observe(self.nombre_metrica(tipo), (time.time() - t0) * 1000.0)
+        return resultado
+
+
+class RegistroCancelaciones:
+    """Ids de tareas canceladas (acotado en tamaño) y a dónde se reenvió cada tarea."""
+
+    def __init__(self, max_entradas: int = 10000):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._canceladas: "OrderedDict[str, float]" = OrderedDict()
+        # Con especulación una tarea va a dos destinos: se guardan todos, no solo el último
+        self._reenvios: "OrderedDict[str, List[str]]" = OrderedDict()
+
+    @staticmethod
+    def _acotar(d: OrderedDict, maximo: int):
+        while len(d) > maximo:
+            d.popitem(last=False)
+
+    def cancelar(self, tarea_id: str) -> List[str]:
+        """Marca la tarea como cancelada; devuelve las URLs a las que se reenvió."""
+        with self._lock:
+            self._canceladas[tarea_id] = time.time()
+            self._acotar(self._canceladas, self.max_entradas)
+            return self._reenvios.pop(tarea_id, [])
+
+    def esta_cancelada(self, tarea_id: str) -> bool:
+        with self._lock:
+            return tarea_id in self._canceladas
+
+    def registrar_reenvio(self, tarea_id: str, url: str):
+        with self._lock:
+            destinos = self._reenvios.setdefault(tarea_id, [])
+            if url not in destinos:
+                destinos.append(url)
+            self._acotar(self._reenvios, self.max_entradas)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Primitivas de estado del nodo sin un lock global:
+  - ContadorPorHilo: cada hilo escribe solo en su propia celda; la lectura suma las celdas
+  - LocksRayados: N locks indexados por hash de la clave, para que escritores de claves
+    distintas no se serialicen entre sí
+Las lecturas no toman locks: se apoyan en que, con el GIL, leer una celda o copiar un
+dict (dict.copy()) es atómico.
+"""
+import threading
+from typing import List
+from Libs.perfilado import LockInstrumentado
+
+
+class ContadorPorHilo:
+    """Contador (p.ej. la carga del nodo) que se incrementa sin contención entre hilos."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._registro = threading.Lock()  # solo al dar de alta la celda de un hilo
+        self._celdas: List[tuple] = []  # (hilo, [valor])
+        self._base = 0  # aportación acumulada de hilos ya terminados
+
+    def _celda(self) -> list:
+        celda = getattr(self._local, "celda", None)
+        if celda is None:
+            celda = self._local.celda = [0]
+            with self._registro:
+                self._compactar()
+                self._celdas = self._celdas + [(threading.current_thread(), celda)]
+        return celda
+
+    def _compactar(self):
+        # Las celdas de hilos muertos ya no cambian: se pliegan en la base
+        vivas = []
+        for hilo, celda in self._celdas:
+            if hilo.is_alive():
+                vivas.append((hilo, celda))
+            else:
+                self._base += celda[0]
+        self._celdas = vivas
+
+    def sumar(self, n: int = 1):
+        self._celda()[0] += n
+
+    def restar(self, n: int = 1):
+        self._celda()[0] -= n
+
+    def valor(self) -> int:
+        # Copia de la lista (se reemplaza, no se muta) y de la base en el mismo instante lógico
+        with self._registro:
+            base, celdas = self._base, self._celdas
+        return base + sum(celda[0] for _, celda in celdas)
+
+
+class LocksRayados:
+    """Conjunto fijo de locks; cada clave usa siempre el mismo."""
+
+    def __init__(self, nombre: str, n: int = 16):
+        self._locks = [LockInstrumentado(nombre) for _ in range(n)]
+        self._n = n
+
+    def para(self, clave) -> LockInstrumentado:
+        return self._locks[hash(clave) % self._n]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Difusión del KV por rumores (gossip push) con un único bucle en segundo plano.
+Las escrituras solo marcan la clave como rumor; cada `intervalo` el bucle envía las claves
+marcadas (solo esas, no el estado completo) a `fanout` vecinos elegidos al azar. Un rumor
+se repite ~log(N) rondas y quien recibe una versión nueva lo retoma, así que llega a todo
+el clúster en O(log N) rondas con hilos y coste por escritura constantes.
+  - contrapresión: como mucho `en_vuelo_max` envíos pendientes por vecino; un vecino lento
+    se salta y, si no queda ninguno libre, los rumores esperan a la ronda siguiente
+  - anti-entropía: cada `anti_entropia_cada` rondas se envía el estado completo a un vecino
+    al azar para reparar rumores perdidos
+"""
+import math, random, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable
+
+
+class DifusorGossip:
+    def __init__(
+        self,
+        kv,
+        obtener_vecinos_fn: Callable[[], List[Dict[str, Any]]],
+        metricas=None,
+        intervalo: float = 0.2,
+        fanout: int = 3,
+        en_vuelo_max: int = 1,
+        max_claves: int = 1000,
+        anti_entropia_cada: int = 25,
+    ):
+        self.kv = kv
+        self.obtener_vecinos_fn = obtener_vecinos_fn
+        self.metricas = metricas
+        self.intervalo = intervalo
+        self.fanout = fanout
+        self.en_vuelo_max = en_vuelo_max
+        self.max_claves = max_claves
+        self.anti_entropia_cada = anti_entropia_cada
+        self.rondas = 0
+        self._rumores: Dict[str, int] = {}  # clave -> rondas que le quedan
+        self._en_vuelo: Dict[str, int] = {}  # url -> envíos sin terminar
+        self._lock = threading.Lock()
+        self._n_vecinos = 0
+        self._detener = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, fanout), thread_name_prefix="gossip-envio")
+
+    def _inc(self, nombre: str, n: int = 1):
+        if self.metricas is not None:
+            self.metricas.inc(nombre, n)
+
+    def rondas_rumor(self) -> int:
+        """Rondas que se repite un rumor: log_{fanout+1}(N) más margen."""
+        n = self._n_vecinos + 1
+        return math.ceil(math.log(max(n, 2)) / math.log(self.fanout + 1)) + 2
+
+    def marcar(self, clave: str):
+        rondas = self.rondas_rumor()
+        with self._lock:
+            self._rumores[clave] = rondas
+
+    def pendientes(self) -> int:
+        return len(self._rumores)
+
+    def iniciar(self):
+        threading.Thread(target=self._bucle, daemon=True, name="gossip-kv").start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.ronda()
+            except Exception:
+                self._inc("gossip_errores")
+
+    def _enviar(self, vecino: Dict[str, Any], estado: Dict[str, Dict[str, Any]]) -> bool:
+        url = vecino["url"]
+        with self._lock:
+            if self._en_vuelo.get(url, 0) >= self.en_vuelo_max:
+                return False
+            self._en_vuelo[url] = self._en_vuelo.get(url, 0) + 1
+
+        def _terminado(_):
+            with self._lock:
+                self._en_vuelo[url] -= 1
+
+        self._pool.submit(self.kv.replicar_a_vecino, url, vecino.get("codificacion"), estado) \
+            .add_done_callback(_terminado)
+        return True
+
+    def ronda(self):
+        vecinos = [v for v in self.obtener_vecinos_fn() if v.get("url") and v["url"] != self.kv.mi_url]
+        self._n_vecinos = len(vecinos)
+        self.rondas += 1
+        if not vecinos:
+            return
+        with self._lock:
+            libres = [v for v in vecinos if self._en_vuelo.get(v["url"], 0) < self.en_vuelo_max]
+            claves = list(self._rumores)[:self.max_claves]
+        if not libres:
+            self._inc("gossip_contrapresion")
+            return
+        if claves:
+            paquete = {}
+            for clave in claves:
+                reg = self.kv.registro(clave)
+                if reg is not None:
+                    paquete[clave] = reg
+            enviados = sum(self._enviar(v, paquete) for v in random.sample(libres, min(self.fanout, len(libres))))
+            if enviados:
+                self._inc("gossip_mensajes", enviados)
+                with self._lock:
+                    for clave in claves:
+                        restantes = self._rumores.get(clave)
+                        if restantes is None:
+                            continue
+                        if restantes <= 1:
+                            del self._rumores[clave]
+                        else:
+                            self._rumores[clave] = restantes - 1
+        if self.anti_entropia_cada and self.rondas % self.anti_entropia_cada == 0:
+            if self._enviar(random.choice(libres), self.kv.estado_completo()):
+                self._inc("gossip_anti_entropia")
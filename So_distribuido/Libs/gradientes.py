@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Códecs de compresión para los mensajes "gradiente" del entrenamiento federado.
+Un gradiente viaja como {"grad_cod": {"codec": ..., "n": ..., ...}} con los datos en
+base64 en lugar de una lista de floats en texto (~19 bytes por valor):
+  - f32: float32 sin más (~5 bytes por valor en base64)
+  - q16 / q8: cuantización lineal por vector (mínimo y escala) a 16 u 8 bits
+  - topk: solo los k valores de mayor magnitud (índice u32 + valor f32); lo que no se
+    envía se acumula en un residuo por destino y se suma al gradiente siguiente
+    (error feedback), así que nada se pierde, solo se retrasa
+  - delta: diferencia en q8 respecto a lo que el receptor reconstruyó en la ronda anterior;
+    cada `refresco` rondas (o si el receptor perdió la base) se envía el vector completo
+La decodificación es vectorizada con NumPy. Se pueden añadir códecs con registrar_codec().
+"""
+import base64, math, threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from Libs.motores import ModuloPerezoso
+
+np = ModuloPerezoso("numpy")
+
+
+def _b64(array) -> str:
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def _desde_b64(texto: str, dtype: str):
+    return np.frombuffer(base64.b64decode(texto), dtype=dtype)
+
+
+# --- Códecs sin estado: (codificar(g) -> dict, decodificar(dict) -> ndarray) ---
+def _cod_f32(g) -> Dict[str, Any]:
+    return {"datos": _b64(g.astype("<f4"))}
+
+
+def _dec_f32(d: Dict[str, Any]):
+    return _desde_b64(d["datos"], "<f4").astype(np.float64)
+
+
+def _cuantizador(bits: int):
+    dtype = "<u2" if bits == 16 else "u1"
+    niveles = (1 << bits) - 1
+
+    def codificar(g) -> Dict[str, Any]:
+        minimo, maximo = (float(g.min()), float(g.max())) if g.size else (0.0, 0.0)
+        escala = (maximo - minimo) / niveles or 1.0
+        q = np.rint((g - minimo) / escala).astype(dtype)
+        return {"min": minimo, "escala": escala, "datos": _b64(q)}
+
+    def decodificar(d: Dict[str, Any]):
+        return _desde_b64(d["datos"], dtype).astype(np.float64) * d["escala"] + d["min"]
+
+    return codificar, decodificar
+
+
+def _dec_topk(d: Dict[str, Any]):
+    idx, val = _desde_b64(d["idx"], "<u4"), _desde_b64(d["val"], "<f4")
+    if idx.size != val.size or (idx.size and int(idx.max()) >= d["n"]):
+        raise ValueError(f"Índices top-k fuera de un gradiente de {d['n']} valores")
+    salida = np.zeros(d["n"])
+    salida[idx] = val
+    return salida
+
+
+_cod_q8, _dec_q8 = _cuantizador(8)
+_cod_q16, _dec_q16 = _cuantizador(16)
+
+CODECS: Dict[str, Tuple[Optional[Callable], Callable]] = {
+    "f32": (_cod_f32, _dec_f32),
+    "q16": (_cod_q16, _dec_q16),
+    "q8": (_cod_q8, _dec_q8),
+    "topk": (None, _dec_topk),  # codifica CompresorGradientes (necesita el residuo)
+}
+
+
+def registrar_codec(nombre: str, codificar: Callable, decodificar: Callable):
+    """Códec sin estado adicional: codificar(ndarray) -> dict, decodificar(dict) -> ndarray."""
+    CODECS[nombre] = (codificar, decodificar)
+
+
+def disponibles() -> List[str]:
+    return list(CODECS) + ["delta"]
+
+
+def codificar(gradiente: Any, codec: str = "q16") -> Dict[str, Any]:
+    """Gradiente autocontenido con un códec sin estado (p.ej. para guardarlo en el KV)."""
+    g = np.asarray(gradiente, dtype=np.float64).ravel()
+    return {"codec": codec, "n": int(g.size), **CODECS[codec][0](g)}
+
+
+def decodificar(d: Dict[str, Any]):
+    """Decodifica un gradiente autocontenido (cualquier códec salvo delta)."""
+    return CODECS[d["codec"]][1](d)
+
+
+def gradiente_de(payload: Dict[str, Any]):
+    """Gradiente de un payload guardado: {"grad": lista} (sin comprimir) o {"grad_cod": ...}."""
+    if "grad_cod" in payload:
+        return decodificar(payload["grad_cod"])
+    return np.asarray(payload["grad"], dtype=float)
+
+
+class BaseDeltaPerdida(ValueError):
+    pass
+
+
+class CompresorGradientes:
+    """Estado por par (residuos de top-k y bases de delta) de ambos extremos."""
+
+    def __init__(self, codec: str = "q8", ratio_topk: float = 0.01, refresco: int = 10):
+        if codec not in disponibles():
+            raise ValueError(f"Códec de gradiente desconocido: {codec}")
+        self.codec = codec
+        self.ratio_topk = ratio_topk
+        self.refresco = refresco
+        self._residuos: Dict[str, Any] = {}  # destino -> lo que top-k aún no envió
+        self._bases_tx: Dict[str, Tuple[int, Any]] = {}  # destino -> (ronda, lo que reconstruyó)
+        self._bases_rx: Dict[str, Tuple[int, Any]] = {}  # origen -> (ronda, reconstrucción)
+        self._lock = threading.Lock()
+
+    # --- Emisor ---
+    def comprimir(self, destino: str, gradiente: Any, codec: Optional[str] = None) -> Dict[str, Any]:
+        codec = codec or self.codec
+        g = np.asarray(gradiente, dtype=np.float64).ravel()
+        with self._lock:
+            if codec == "topk":
+                cuerpo = self._topk(destino, g)
+            elif codec == "delta":
+                cuerpo = self._delta(destino, g)
+            else:
+                cuerpo = CODECS[codec][0](g)
+        return {"codec": codec, "n": int(g.size), **cuerpo}
+
+    def _topk(self, destino: str, g) -> Dict[str, Any]:
+        residuo = self._residuos.get(destino)
+        acumulado = g + residuo if residuo is not None and residuo.shape == g.shape else g.copy()
+        k = min(g.size, max(1, math.ceil(self.ratio_topk * g.size)))
+        idx = np.argpartition(np.abs(acumulado), g.size - k)[g.size - k:] if g.size else np.zeros(0, int)
+        idx.sort()
+        valores = acumulado[idx].astype("<f4")
+        acumulado[idx] -= valores  # lo enviado sale del residuo (queda el error de redondeo a f32)
+        self._residuos[destino] = acumulado
+        return {"idx": _b64(idx.astype("<u4")), "val": _b64(valores)}
+
+    def _delta(self, destino: str, g) -> Dict[str, Any]:
+        ronda, base = self._bases_tx.get(destino, (0, None))
+        ronda += 1
+        completo = base is None or base.shape != g.shape or (self.refresco and (ronda - 1) % self.refresco == 0)
+        if completo:
+            cuerpo = _cod_q16(g)
+            reconstruido = _dec_q16(cuerpo)
+        else:
+            cuerpo = _cod_q8(g - base)  # la diferencia tiene menos rango: más precisión por bit
+            reconstruido = base + _dec_q8(cuerpo)
+        # La base es lo que el receptor reconstruye, no el valor exacto: el error no se acumula
+        self._bases_tx[destino] = (ronda, reconstruido)
+        return {"ronda": ronda, "completo": completo, **cuerpo}
+
+    def olvidar(self, destino: str):
+        """El envío falló o el receptor perdió la base: la próxima ronda va completa."""
+        with self._lock:
+            self._bases_tx.pop(destino, None)
+
+    # --- Receptor ---
+    def descomprimir(self, origen: str, d: Dict[str, Any]):
+        if d["codec"] != "delta":
+            g = decodificar(d)
+        else:
+            with self._lock:
+                if d["completo"]:
+                    g = _dec_q16(d)
+                else:
+                    ronda, base = self._bases_rx.get(origen, (None, None))
+                    if base is None or ronda != d["ronda"] - 1 or base.size != d["n"]:
+                        raise BaseDeltaPerdida(f"Delta de {origen} sin la ronda {d['ronda'] - 1}")
+                    g = base + _dec_q8(d)
+                self._bases_rx[origen] = (d["ronda"], g)
+        if g.size != d["n"]:
+            raise ValueError(f"Gradiente de {g.size} valores, se anunciaron {d['n']}")
+        return g
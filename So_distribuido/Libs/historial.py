@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Recolección del historial de tareas y trabajos guardado en el KV.
+Sin ella la lista "tareas" y los trabajo_<id> crecen sin límite y cada ronda de
+anti-entropía los reenvía enteros. Cada `intervalo` el compactador:
+  - reduce las tareas terminadas de la lista "tareas" a {"id", "tipo", "estado", "fin"}
+    (sin payload) y desaloja las que terminaron hace más de `ttl`, y las que siguen sin
+    terminar más de `ttl_pendiente` después de enviarse (su estado ya no llegará)
+  - resume los trabajos terminados (estado global y recuento por estado) con TTL `ttl`
+  - llama a kv.compactar() para eliminar registros caducados y lápidas vencidas
+Las claves compartidas solo las reescribe el nodo responsable de cada una (es_responsable)
+y con escritura condicional a la versión leída: un envío concurrente de tareas no se pierde.
+Lo desalojado se puede archivar en un JSONL local (ArchivoHistorial).
+"""
+import json, threading, time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Callable
+
+CLAVE_TAREAS = "tareas"
+PREFIJO_TRABAJO = "trabajo_"
+FINALES = ("COMPLETADA", "FALLIDA")
+
+
+class ArchivoHistorial:
+    """Añade una línea JSON por registro desalojado; el fichero solo crece (rotarlo fuera)."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def archivar(self, clave: str, datos: Any):
+        linea = json.dumps({"ts": time.time(), "clave": clave, "datos": datos}, default=str)
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+
+    def leer(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                return [json.loads(l) for l in f if l.strip()]
+        except FileNotFoundError:
+            return []
+
+
+def compactar_lista_tareas(
+    lista: List[Dict[str, Any]],
+    estado_de: Callable[[str], Optional[str]],
+    ttl: float,
+    ahora: Optional[float] = None,
+    archivar: Optional[Callable[[str, Any], None]] = None,
+    ttl_pendiente: Optional[float] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    estado_de(id) devuelve el estado final de una tarea (COMPLETADA/FALLIDA) o None si sigue viva.
+    Las que siguen vivas más de `ttl_pendiente` desde su "ts" también se desalojan.
+    Devuelve la lista compactada, o None si no cambia nada (para no reescribir la clave).
+    """
+    ahora = time.time() if ahora is None else ahora
+    nueva, cambios = [], False
+    for entrada in lista:
+        if entrada.get("estado") not in FINALES:
+            final = estado_de(entrada["id"])
+            if final is None:
+                if ttl_pendiente is not None and ahora - entrada.get("ts", ahora) > ttl_pendiente:
+                    if archivar is not None:
+                        archivar(CLAVE_TAREAS, entrada)
+                    cambios = True
+                    continue
+                nueva.append(entrada)
+                continue
+            entrada = {"id": entrada["id"], "tipo": entrada.get("tipo"), "estado": final, "fin": ahora}
+            cambios = True
+        if ahora - entrada.get("fin", ahora) > ttl:
+            if archivar is not None:
+                archivar(CLAVE_TAREAS, entrada)
+            cambios = True
+            continue
+        nueva.append(entrada)
+    return nueva if cambios else None
+
+
+def resumir_trabajo(estado: Dict[str, Any], ahora: Optional[float] = None) -> Dict[str, Any]:
+    """Estado de un trabajo terminado sin dependencias ni ubicaciones de cada tarea."""
+    tareas = estado.get("tareas", {})
+    return {
+        "estado": estado["estado"],
+        "resumen": True,
+        "fin": time.time() if ahora is None else ahora,
+        "por_estado": dict(Counter(t["estado"] for t in tareas.values())),
+        "no_completadas": sorted(tid for tid, t in tareas.items() if t["estado"] != "COMPLETADA"),
+    }
+
+
+class CompactadorHistorial:
+    def __init__(
+        self,
+        kv,
+        estado_tarea_fn: Callable[[str], Optional[str]],
+        metricas=None,
+        ttl: float = 3600.0,
+        intervalo: float = 30.0,
+        archivo: Optional[ArchivoHistorial] = None,
+        ttl_pendiente: Optional[float] = 86400.0,
+        es_responsable: Optional[Callable[[str], bool]] = None,
+    ):
+        self.kv = kv
+        self.estado_tarea_fn = estado_tarea_fn
+        self.metricas = metricas
+        self.ttl = ttl
+        self.ttl_pendiente = ttl_pendiente
+        # es_responsable(clave): si este nodo reescribe esa clave compartida (None: siempre)
+        self.es_responsable = es_responsable or (lambda clave: True)
+        self.intervalo = intervalo
+        self.archivo = archivo
+        self._detener = threading.Event()
+
+    def _inc(self, nombre: str, n: int = 1):
+        if self.metricas is not None and n:
+            self.metricas.inc(nombre, n)
+
+    def _archivar(self, clave: str, datos: Any):
+        if self.archivo is not None:
+            self.archivo.archivar(clave, datos)
+
+    def ronda(self) -> Dict[str, int]:
+        ahora = time.time()
+        hechos = {"tareas": 0, "trabajos": 0, "claves": 0}
+        reg = self.kv.registro(CLAVE_TAREAS) if self.es_responsable(CLAVE_TAREAS) else None
+        lista = reg.get("valor") if reg and not reg.get("borrado") else None
+        if lista:
+            # Lo desalojado se archiva solo si la escritura condicional llega a aplicarse
+            desalojadas: List[Any] = []
+            nueva = compactar_lista_tareas(lista, self.estado_tarea_fn, self.ttl, ahora,
+                                           lambda clave, datos: desalojadas.append(datos),
+                                           ttl_pendiente=self.ttl_pendiente)
+            if nueva is not None:
+                if self.kv.put(CLAVE_TAREAS, nueva, si_version=reg["version"]) is None:
+                    self._inc("historial_conflictos")  # otro envío entre medias: en la próxima ronda
+                else:
+                    for datos in desalojadas:
+                        self._archivar(CLAVE_TAREAS, datos)
+                    hechos["tareas"] = len(lista) - len(nueva)
+        for clave, reg in self.kv.estado_completo().items():
+            valor = reg.get("valor")
+            if (clave.startswith(PREFIJO_TRABAJO) and isinstance(valor, dict)
+                    and valor.get("estado") in FINALES and not valor.get("resumen")
+                    and self.es_responsable(clave)):
+                if self.kv.put(clave, resumir_trabajo(valor, ahora), ttl=self.ttl,
+                               si_version=reg["version"]) is not None:
+                    hechos["trabajos"] += 1
+        hechos["claves"] = self.kv.compactar(self._archivar if self.archivo is not None else None)
+        self._inc("historial_tareas_desalojadas", hechos["tareas"])
+        self._inc("historial_trabajos_resumidos", hechos["trabajos"])
+        return hechos
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.ronda()
+            except Exception:
+                self._inc("historial_errores")
+
+    def iniciar(self):
+        threading.Thread(target=self._bucle, daemon=True, name="kv-compactador").start()
+
+    def detener(self):
+        self._detener.set()
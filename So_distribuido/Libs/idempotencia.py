@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tabla de deduplicación por id de tarea: ejecuciones en curso y resultados recientes.
+Un duplicado se engancha a la ejecución existente o recibe el resultado en caché
+en lugar de volver a calcularlo. Memoria acotada por tamaño máximo y TTL.
+RenovadorLease mantiene vivo el lease del KV mientras dura una ejecución larga.
+"""
+import threading, time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+EN_CURSO = "EN_CURSO"
+COMPLETADA = "COMPLETADA"
+
+
+class Entrada:
+    def __init__(self):
+        self.estado = EN_CURSO
+        self.resultado: Optional[Any] = None
+        self.ts = time.time()
+        self.evento = threading.Event()
+
+    def __repr__(self):
+        return f"Entrada({self.estado})"
+
+
+class TablaDeduplicacion:
+    def __init__(self, max_entradas: int = 10000, ttl: float = 600.0):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Las en curso nunca se desalojan; las completadas se ordenan por antigüedad
+        self._en_curso: Dict[str, Entrada] = {}
+        self._completadas: "OrderedDict[str, Entrada]" = OrderedDict()
+
+    def _purgar(self, ahora: float):
+        while self._completadas:
+            tid, e = next(iter(self._completadas.items()))
+            if ahora - e.ts <= self.ttl and len(self._completadas) <= self.max_entradas:
+                break
+            self._completadas.popitem(last=False)
+
+    def registrar(self, tarea_id: str) -> Optional[Entrada]:
+        """
+        Marca la tarea como en curso.
+        Retorna None si es nueva (el llamador debe ejecutarla) o la entrada existente si es duplicada.
+        """
+        ahora = time.time()
+        with self._lock:
+            self._purgar(ahora)
+            existente = self._en_curso.get(tarea_id) or self._completadas.get(tarea_id)
+            if existente is not None:
+                return existente
+            self._en_curso[tarea_id] = Entrada()
+            return None
+
+    def completar(self, tarea_id: str, resultado: Any):
+        with self._lock:
+            e = self._en_curso.pop(tarea_id, None) or Entrada()
+            e.estado = COMPLETADA
+            e.resultado = resultado
+            e.ts = time.time()
+            self._completadas[tarea_id] = e
+            self._completadas.move_to_end(tarea_id)
+            self._purgar(e.ts)
+        e.evento.set()
+
+    def abandonar(self, tarea_id: str):
+        """La ejecución falló: se libera el id para que un reintento pueda ejecutarla."""
+        with self._lock:
+            e = self._en_curso.pop(tarea_id, None)
+        if e is not None:
+            e.evento.set()
+
+    def resultado(self, tarea_id: str) -> Optional[Any]:
+        with self._lock:
+            e = self._completadas.get(tarea_id)
+            if e is None or time.time() - e.ts > self.ttl:
+                return None
+            return e.resultado
+
+    @staticmethod
+    def esperar(entrada: Entrada, timeout: Optional[float] = None) -> Optional[Any]:
+        """Espera a que termine la ejecución original; None si falló o venció el timeout."""
+        entrada.evento.wait(timeout)
+        return entrada.resultado if entrada.estado == COMPLETADA else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._en_curso) + len(self._completadas)
+
+
+class RenovadorLease:
+    """
+    Latido del lease durante la ejecución (with): llama a renovar() cada `intervalo` s.
+    Si renovar() devuelve False (otro nodo se quedó el lease) deja de renovar.
+    Al salir espera al hilo: ninguna renovación puede llegar después de liberar el lease.
+    """
+
+    def __init__(self, renovar: Callable[[], bool], intervalo: float):
+        self.renovar = renovar
+        self.intervalo = intervalo
+        self.renovaciones = 0
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="lease-latido")
+
+    def _bucle(self):
+        while not self._fin.wait(self.intervalo):
+            try:
+                if not self.renovar():
+                    return
+                self.renovaciones += 1
+            except Exception:
+                continue  # KV inaccesible: se reintenta en el siguiente latido
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._fin.set()
+        self._hilo.join()
@@ -1,83 +1,245 @@
 # -*- coding: utf-8 -*-
 """
 Almacén clave-valor replicado con consistencia eventual (gossip ligero).
-Cada nodo mantiene su propio estado y lo sincroniza con vecinos.
+Cada nodo mantiene su propio estado y lo sincroniza con vecinos: las escrituras marcan la
+clave y el DifusorGossip (Libs/gossip.py) la difunde en su siguiente ronda.
+Ciclo de vida: un registro puede llevar `expira` (TTL absoluto, igual en todas las réplicas)
+y los borrados dejan una lápida que se propaga por gossip y caduca tras un periodo de gracia;
+compactar() elimina lo caducado y puede archivar lo desalojado.
+Las escrituras de una clave se serializan con un lock rayado por clave; las lecturas
+no bloquean: los Registro son inmutables (se reemplazan, no se modifican) y las
+instantáneas parten de una copia atómica del dict.
 """
 import threading
 import time
-import httpx
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from Libs import codificacion
+from Libs.estado_nodo import LocksRayados
+from Libs.motores import ModuloPerezoso
+
+httpx = ModuloPerezoso("httpx")
 
 class Registro:
-    def __init__(self, valor: Any, version: int):
+    """Inmutable: una escritura crea un Registro nuevo, así que su forma de dict se calcula una vez."""
+    __slots__ = ("valor", "version", "expira", "borrado", "_dict")
+
+    def __init__(self, valor: Any, version: int, expira: Optional[float] = None, borrado: bool = False):
         self.valor = valor
         self.version = version
+        self.expira = expira  # epoch a partir del que el registro ya no existe (None: no caduca)
+        self.borrado = borrado  # lápida: la clave se borró en `version`
+        self._dict = None
+
+    def vigente(self, ahora: float) -> bool:
+        return not self.borrado and (self.expira is None or self.expira > ahora)
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Forma de replicación, compartida entre llamadas: quien la reciba no debe modificarla."""
+        d = self._dict
+        if d is None:
+            d = {"valor": self.valor, "version": self.version}
+            if self.expira is not None:
+                d["expira"] = self.expira
+            if self.borrado:
+                d["borrado"] = True
+            self._dict = d
+        return d
 
     def __repr__(self):
         return f"Registro(v={self.version}, val={self.valor})"
 
 class KVReplicado:
-    def __init__(self, mi_url: str):
+    def __init__(self, mi_url: str, metricas=None, umbral_compresion: int = 1024, gracia_lapida: float = 300.0):
         self.mi_url = mi_url
-        self._lock = threading.Lock()
+        self.metricas = metricas
+        self.umbral_compresion = umbral_compresion
+        self.gracia_lapida = gracia_lapida  # lo que dura una lápida: más que lo que tarda en difundirse
+        self._locks = LocksRayados("kv")
         self._data: Dict[str, Registro] = {}
+        self.gossip = None  # DifusorGossip, solo en el nodo que difunde (ver iniciar_gossip)
+
+    def _marcar(self, clave: str):
+        if self.gossip is not None:
+            self.gossip.marcar(clave)
 
     def get(self, clave: str) -> Optional[Any]:
-        with self._lock:
-            reg = self._data.get(clave)
-            return reg.valor if reg else None
+        reg = self._data.get(clave)
+        return reg.valor if reg and reg.vigente(time.time()) else None
 
-    def put(self, clave: str, valor: Any, version: Optional[int] = None) -> int:
-        with self._lock:
+    @staticmethod
+    def _expira(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def put(self, clave: str, valor: Any, version: Optional[int] = None, ttl: Optional[float] = None,
+            si_version: Optional[int] = None) -> Optional[int]:
+        """
+        Escribe `valor`; con `ttl` (segundos) el registro desaparece de todas las réplicas al caducar.
+        Con `si_version` solo escribe si la versión actual sigue siendo esa (leer-modificar-escribir
+        sin pisar otra escritura; 0 = que no exista, esté borrada o haya caducado); si no, devuelve None.
+        """
+        with self._locks.para(clave):
+            if si_version is not None:
+                actual = self._data.get(clave)
+                vigente = actual is not None and actual.vigente(time.time())
+                if (actual.version if vigente else 0) != si_version:
+                    return None
             if clave not in self._data:
                 nueva_ver = version if version is not None else 1
-                self._data[clave] = Registro(valor, nueva_ver)
+                self._data[clave] = Registro(valor, nueva_ver, self._expira(ttl))
             else:
                 reg = self._data[clave]
                 if version is None:
                     nueva_ver = reg.version + 1
                 else:
                     nueva_ver = max(reg.version + 1, version)
-                self._data[clave] = Registro(valor, nueva_ver)
+                self._data[clave] = Registro(valor, nueva_ver, self._expira(ttl))
             ver_final = self._data[clave].version
-
-        # Propagar asíncronamente a vecinos (modo fire-and-forget)
-        # Se debe llamar desde fuera en un hilo o tarea async
+        self._marcar(clave)
         return ver_final
 
+    def borrar(self, clave: str) -> Optional[int]:
+        """Deja una lápida que gana a las versiones anteriores al fusionar y caduca tras la gracia."""
+        with self._locks.para(clave):
+            reg = self._data.get(clave)
+            if reg is None or reg.borrado:
+                return None
+            version = reg.version + 1
+            self._data[clave] = Registro(None, version, time.time() + self.gracia_lapida, borrado=True)
+        self._marcar(clave)
+        return version
+
+    def adquirir_lease(self, clave: str, dueno: str, ttl: float,
+                       ttl_registro: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Intenta tomar la propiedad de `clave` durante `ttl` segundos.
+        Retorna (True, dueno) si se obtuvo o renovó; (False, dueno_actual) si otro nodo la tiene vigente.
+        Best-effort: dos nodos pueden ganar a la vez antes de converger por gossip.
+        `ttl_registro`: cuánto se conserva el registro del lease en el KV.
+        """
+        ahora = time.time()
+        with self._locks.para(clave):
+            reg = self._data.get(clave)
+            actual = reg.valor if reg and reg.vigente(ahora) and isinstance(reg.valor, dict) else None
+            if actual and actual.get("dueno") != dueno and (
+                actual.get("estado") == "COMPLETADA" or actual.get("expira", 0) > ahora
+            ):
+                return False, actual.get("dueno")
+            version = reg.version + 1 if reg else 1
+            self._data[clave] = Registro(
+                {"dueno": dueno, "expira": ahora + ttl, "estado": "EN_CURSO"}, version, self._expira(ttl_registro)
+            )
+        self._marcar(clave)
+        return True, dueno
+
+    def liberar_lease(self, clave: str, dueno: str, completada: bool = False,
+                      ttl_registro: Optional[float] = None):
+        """Suelta la propiedad. Si la tarea terminó, el lease queda marcado como COMPLETADA."""
+        with self._locks.para(clave):
+            reg = self._data.get(clave)
+            if not reg or reg.borrado or not isinstance(reg.valor, dict) or reg.valor.get("dueno") != dueno:
+                return
+            valor = dict(reg.valor, expira=0, estado="COMPLETADA" if completada else "LIBRE")
+            self._data[clave] = Registro(valor, reg.version + 1, self._expira(ttl_registro))
+        self._marcar(clave)
+
     def estado_completo(self) -> Dict[str, Dict[str, Any]]:
-        """Devuelve {clave: {"valor": ..., "version": ...}} para replicación."""
-        with self._lock:
-            return {
-                k: {"valor": v.valor, "version": v.version}
-                for k, v in self._data.items()
-            }
+        """Devuelve {clave: {"valor": ..., "version": ...}} para replicación (lápidas incluidas)."""
+        ahora = time.time()
+        return {
+            k: v.a_dict()
+            for k, v in self._data.copy().items()
+            if v.expira is None or v.expira > ahora
+        }
 
     def fusionar_desde_vecino(self, estado_remoto: Dict[str, Dict[str, Any]]):
         """Fusiona estado remoto: solo sobrescribe si versión es mayor."""
-        with self._lock:
-            for clave, datos in estado_remoto.items():
-                ver_remota = datos["version"]
-                val_remoto = datos["valor"]
-                if clave not in self._data or self._data[clave].version < ver_remota:
-                    self._data[clave] = Registro(val_remoto, ver_remota)
-
-    def replicar_a_vecino(self, vecino_url: str):
-        """Envía estado completo a un vecino (gossip push)."""
+        data = self._data
+        leer = data.get
+        ahora = time.time()
+        for clave, datos in estado_remoto.items():
+            ver_remota = datos["version"]
+            reg = leer(clave)
+            if reg is not None and reg.version >= ver_remota:
+                continue  # caso común en gossip: nada que escribir, sin tomar locks
+            expira = datos.get("expira")
+            if expira is not None and expira <= ahora:
+                continue  # ya caducado: no resucitarlo
+            with self._locks.para(clave):
+                reg = data.get(clave)
+                if reg is None or reg.version < ver_remota:
+                    data[clave] = Registro(datos["valor"], ver_remota, expira, datos.get("borrado", False))
+                    self._marcar(clave)  # versión nueva: el rumor sigue desde aquí
+
+    def registro(self, clave: str) -> Optional[Dict[str, Any]]:
+        """{"valor": ..., "version": ...} de una clave (o su lápida), o None si no está."""
+        reg = self._data.get(clave)
+        return reg.a_dict() if reg else None
+
+    def diferencias(self, digesto: Dict[str, int]) -> List[str]:
+        """Claves de un resumen {clave: versión} que aquí faltan o tienen una versión menor."""
+        faltan = []
+        for clave, version in digesto.items():
+            reg = self._data.get(clave)
+            if reg is None or reg.version < version:
+                faltan.append(clave)
+        return faltan
+
+    def leer_registro(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Registro más reciente disponible; aquí, el local (ver KVParticionado.leer_registro)."""
+        return self.registro(clave)
+
+    def compactar(self, archivar: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> int:
+        """
+        Elimina los registros caducados y las lápidas que pasaron su gracia. Los registros con
+        valor desalojados se pasan a `archivar(clave, registro)` si se indica. Devuelve cuántos.
+        """
+        ahora = time.time()
+        eliminados = 0
+        for clave, reg in self._data.copy().items():
+            if reg.expira is None or reg.expira > ahora:
+                continue
+            with self._locks.para(clave):
+                if self._data.get(clave) is not reg:
+                    continue  # reescrito mientras tanto
+                del self._data[clave]
+            eliminados += 1
+            if archivar is not None and not reg.borrado:
+                archivar(clave, reg.a_dict())
+        if eliminados and self.metricas is not None:
+            self.metricas.inc("kv_claves_compactadas", eliminados)
+        return eliminados
+
+    def descartar(self, clave: str, version: int) -> bool:
+        """Borra la clave si sigue en `version` (ya entregada a sus dueños en el modo particionado)."""
+        with self._locks.para(clave):
+            reg = self._data.get(clave)
+            if reg is None or reg.version != version:
+                return False
+            del self._data[clave]
+            return True
+
+    def replicar_a_vecino(self, vecino_url: str, capacidades: Optional[Dict[str, List[str]]] = None,
+                          estado: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Envía `estado` (por defecto el completo) a un vecino, en el formato que anuncia."""
         try:
-            estado = self.estado_completo()
+            if estado is None:
+                estado = self.estado_completo()
+            cuerpo, cabeceras = codificacion.codificar(estado, capacidades, self.umbral_compresion)
+            if self.metricas is not None:
+                self.metricas.inc("bytes_kv_sync_tx", len(cuerpo))
             httpx.post(
                 f"{vecino_url}/kv/sync",
-                json=estado,
+                content=cuerpo,
+                headers=cabeceras,
                 timeout=2.0
             )
         except Exception:
             # Silencioso: tolerancia a fallos
             pass
 
-    def replicar_a_vecinos(self, vecinos: List[Dict[str, str]]):
-        """Replica estado a todos los vecinos válidos (en hilos separados)."""
-        from threading import Thread
-        urls = [v["url"] for v in vecinos if v.get("url") and v["url"] != self.mi_url]
-        for url in urls:
-            Thread(target=self.replicar_a_vecino, args=(url,), daemon=True).start()
\ No newline at end of file
+    def iniciar_gossip(self, obtener_vecinos_fn: Callable[[], List[Dict[str, Any]]], **opciones):
+        """Arranca el bucle de difusión (ver DifusorGossip para las opciones)."""
+        from Libs.gossip import DifusorGossip
+        self.gossip = DifusorGossip(self, obtener_vecinos_fn, metricas=self.metricas, **opciones)
+        self.gossip.iniciar()
+        return self.gossip
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+KV particionado: cada clave vive en R réplicas elegidas en un anillo de hash consistente
+(con nodos virtuales) construido a partir de los vecinos del Descubridor, en lugar de en
+todos los nodos. Misma interfaz que KVReplicado para el resto del nodo.
+  - escrituras y leases: las coordina la primera réplica viva de la clave, que aplica la
+    operación en su almacén y la propaga a las demás; con quorum_escritura > 1 espera acuses
+  - lecturas: locales si este nodo es réplica; con quorum_lectura > 1 consulta varias
+    réplicas, devuelve la versión más alta y repara las atrasadas
+  - hinted handoff: lo que no se pudo entregar a una réplica se anota y se reintenta en la
+    siguiente ronda de anti-entropía; las claves que dejan de correspondernos tras un cambio
+    de miembros se entregan a sus nuevas réplicas y se descartan aquí
+"""
+import bisect, hashlib, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Callable, Set
+
+from Libs import codificacion
+from Libs.kv import KVReplicado
+from Libs.motores import ModuloPerezoso
+
+httpx = ModuloPerezoso("httpx")
+
+# Operaciones de escritura que se ejecutan en el coordinador de la clave
+OPERACIONES = ("put", "borrar", "adquirir_lease", "liberar_lease")
+
+
+class QuorumNoAlcanzado(RuntimeError):
+    pass
+
+
+def _es_caida(e: Exception) -> bool:
+    """Conexión rechazada o timeout: la réplica no respondió (no es que rechazara la operación)."""
+    import httpx as _httpx
+    return isinstance(e, (_httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def _hash(texto: str) -> int:
+    return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), "big")
+
+
+class AnilloHash:
+    def __init__(self, vnodos: int = 64):
+        self.vnodos = vnodos
+        # (puntos ordenados, dueño de cada punto, miembros): se sustituye entero al cambiar
+        self._estado: Tuple[List[int], List[str], Tuple[str, ...]] = ([], [], ())
+
+    @property
+    def miembros(self) -> Tuple[str, ...]:
+        return self._estado[2]
+
+    def reconstruir(self, miembros: Iterable[str]) -> bool:
+        """Rehace el anillo si cambió el conjunto de miembros. Devuelve True si cambió."""
+        miembros = tuple(sorted(set(miembros)))
+        if miembros == self._estado[2]:
+            return False
+        puntos = sorted((_hash(f"{m}#{i}"), m) for m in miembros for i in range(self.vnodos))
+        self._estado = ([p for p, _ in puntos], [m for _, m in puntos], miembros)
+        return True
+
+    def preferentes(self, clave: str, n: int) -> List[str]:
+        """Los n primeros miembros distintos en sentido horario desde el hash de la clave."""
+        puntos, duenos, miembros = self._estado
+        n = min(n, len(miembros))
+        elegidos: List[str] = []
+        i = bisect.bisect(puntos, _hash(clave))
+        for k in range(len(puntos)):
+            m = duenos[(i + k) % len(puntos)]
+            if m not in elegidos:
+                elegidos.append(m)
+                if len(elegidos) == n:
+                    break
+        return elegidos
+
+
+class KVParticionado:
+    def __init__(
+        self,
+        mi_url: str,
+        obtener_vecinos_fn: Callable[[], List[Dict[str, Any]]],
+        metricas=None,
+        replicas: int = 3,
+        quorum_lectura: int = 1,
+        quorum_escritura: int = 1,
+        vnodos: int = 64,
+        umbral_compresion: int = 1024,
+        timeout: float = 2.0,
+        intervalo_anti_entropia: float = 2.0,
+        gracia_lapida: float = 300.0,
+    ):
+        self.mi_url = mi_url
+        self.metricas = metricas
+        self.replicas = replicas
+        self.quorum_lectura = quorum_lectura
+        self.quorum_escritura = quorum_escritura
+        self.umbral_compresion = umbral_compresion
+        self.timeout = timeout
+        self.intervalo_anti_entropia = intervalo_anti_entropia
+        self.local = KVReplicado(mi_url, metricas=metricas, umbral_compresion=umbral_compresion,
+                                 gracia_lapida=gracia_lapida)
+        self.anillo = AnilloHash(vnodos)
+        self._obtener_vecinos_fn = obtener_vecinos_fn
+        self._refrescado = 0.0
+        self._capacidades: Dict[str, Any] = {}  # url -> formatos que anuncia en el latido
+        self._pistas: Dict[str, Set[str]] = {}  # url de réplica -> claves pendientes de entregar
+        self._lock_pistas = threading.Lock()
+        self._ronda = threading.Lock()
+        self._ultima_ronda = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="kv-quorum")
+
+    def _inc(self, nombre: str, n: int = 1):
+        if self.metricas is not None:
+            self.metricas.inc(nombre, n)
+
+    # --- Miembros ---
+    def _refrescar(self, forzar: bool = False):
+        ahora = time.time()
+        if not forzar and ahora - self._refrescado < 1.0:
+            return
+        self._refrescado = ahora
+        vecinos = [v for v in self._obtener_vecinos_fn() if v.get("url")]
+        self._capacidades = {v["url"]: v.get("codificacion") for v in vecinos}
+        if self.anillo.reconstruir([self.mi_url] + list(self._capacidades)):
+            self._inc("kv_anillo_cambios")
+
+    def replicas_de(self, clave: str) -> List[str]:
+        self._refrescar()
+        return self.anillo.preferentes(clave, self.replicas) or [self.mi_url]
+
+    # --- Transporte ---
+    def _post(self, url: str, ruta: str, obj: Any) -> Any:
+        cuerpo, cabeceras = codificacion.codificar(obj, self._capacidades.get(url), self.umbral_compresion)
+        r = httpx.post(f"{url}{ruta}", content=cuerpo, headers=cabeceras, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _leer_remoto(self, url: str, clave: str) -> Optional[Dict[str, Any]]:
+        r = httpx.get(f"{url}/kv/registro", params={"clave": clave}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _anotar_pista(self, url: str, clave: str):
+        with self._lock_pistas:
+            self._pistas.setdefault(url, set()).add(clave)
+        self._inc("kv_pistas_anotadas")
+
+    def _replicar_en(self, url: str, clave: str, registro: Dict[str, Any]) -> bool:
+        try:
+            self._post(url, "/kv/sync", {clave: registro})
+            return True
+        except Exception:
+            self._anotar_pista(url, clave)
+            return False
+
+    def _esperar(self, futuros: List, necesarios: int) -> int:
+        """Cuenta resultados verdaderos hasta `necesarios` o hasta el timeout."""
+        if necesarios <= 0:
+            return 0
+        ok = 0
+        try:
+            for f in as_completed(futuros, timeout=self.timeout):
+                if f.result():
+                    ok += 1
+                    if ok >= necesarios:
+                        break
+        except FuturesTimeout:
+            pass
+        return ok
+
+    # --- Escrituras ---
+    def _coordinar(self, op: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        """Aplica la operación aquí y la propaga a las demás réplicas de la clave."""
+        res = getattr(self.local, op)(*args, **kwargs)
+        if (op == "adquirir_lease" and not res[0]) or (op == "put" and res is None):
+            return res  # no cambió nada
+        clave = args[0]
+        registro = self.local.registro(clave)
+        if registro is None:
+            return res
+        replicas = self.replicas_de(clave)
+        otros = [u for u in replicas if u != self.mi_url]
+        futuros = [self._pool.submit(self._replicar_en, u, clave, registro) for u in otros]
+        necesarios = min(self.quorum_escritura, len(replicas)) - (1 if self.mi_url in replicas else 0)
+        if self._esperar(futuros, necesarios) < necesarios:
+            self._inc("kv_quorum_escritura_fallido")
+            raise QuorumNoAlcanzado(f"Escritura de {clave}: sin quórum de {self.quorum_escritura}")
+        return res
+
+    def ejecutar_coordinado(self, op: str, args: List[Any], kwargs: Optional[Dict[str, Any]] = None) -> Any:
+        """Punto de entrada de /kv/coordinar: este nodo actúa como coordinador de la clave."""
+        if op not in OPERACIONES:
+            raise ValueError(f"Operación no coordinable: {op}")
+        return self._coordinar(op, list(args), kwargs or {})
+
+    def _operar(self, op: str, clave: str, *args, **kwargs) -> Any:
+        replicas = self.replicas_de(clave)
+        for url in replicas:
+            if url == self.mi_url:
+                return self._coordinar(op, [clave, *args], kwargs)
+            try:
+                return self._post(url, "/kv/coordinar", {"op": op, "args": [clave, *args], "kwargs": kwargs})["r"]
+            except Exception as e:
+                # Solo se pasa a la siguiente réplica si esta no respondió; un quórum fallido
+                # o una operación rechazada es la respuesta del coordinador y se propaga
+                if getattr(getattr(e, "response", None), "status_code", None) == 503:
+                    raise QuorumNoAlcanzado(f"{op} de {clave}: sin quórum en {url}") from e
+                if not _es_caida(e):
+                    raise
+                self._inc("kv_coordinador_caido")
+        # Ninguna réplica responde: se guarda aquí y se entrega cuando vuelvan (hinted handoff)
+        res = getattr(self.local, op)(clave, *args, **kwargs)
+        for url in replicas:
+            self._anotar_pista(url, clave)
+        return res
+
+    def put(self, clave: str, valor: Any, version: Optional[int] = None, ttl: Optional[float] = None,
+            si_version: Optional[int] = None) -> Optional[int]:
+        return self._operar("put", clave, valor, version, ttl=ttl, si_version=si_version)
+
+    def borrar(self, clave: str) -> Optional[int]:
+        return self._operar("borrar", clave)
+
+    def adquirir_lease(self, clave: str, dueno: str, ttl: float,
+                       ttl_registro: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        return tuple(self._operar("adquirir_lease", clave, dueno, ttl, ttl_registro=ttl_registro))
+
+    def liberar_lease(self, clave: str, dueno: str, completada: bool = False,
+                      ttl_registro: Optional[float] = None):
+        self._operar("liberar_lease", clave, dueno, completada=completada, ttl_registro=ttl_registro)
+
+    # --- Lecturas ---
+    def get(self, clave: str) -> Optional[Any]:
+        mejor = self.leer_registro(clave)
+        if mejor is None or mejor.get("borrado") or mejor.get("expira", float("inf")) <= time.time():
+            return None
+        return mejor["valor"]
+
+    def leer_registro(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Registro más reciente entre un quórum de lectura de réplicas (con reparación)."""
+        replicas = self.replicas_de(clave)
+        necesarios = max(1, min(self.quorum_lectura, len(replicas)))
+        respuestas: Dict[str, Optional[Dict[str, Any]]] = {}
+        if self.mi_url in replicas:
+            respuestas[self.mi_url] = self.local.registro(clave)
+        otros = [u for u in replicas if u != self.mi_url]
+        if len(respuestas) < necesarios and otros:
+            futuros = {self._pool.submit(self._leer_remoto, u, clave): u for u in otros}
+            try:
+                for f in as_completed(futuros, timeout=self.timeout):
+                    try:
+                        respuestas[futuros[f]] = f.result()
+                    except Exception:
+                        continue
+                    if len(respuestas) >= necesarios:
+                        break
+            except FuturesTimeout:
+                pass
+        if len(respuestas) < necesarios:
+            if self.quorum_lectura <= 1:
+                return self.local.registro(clave)  # réplicas caídas: lo que haya aquí (p.ej. una pista)
+            self._inc("kv_quorum_lectura_fallido")
+            raise QuorumNoAlcanzado(f"Lectura de {clave}: sin quórum de {self.quorum_lectura}")
+        mejor = max((r for r in respuestas.values() if r), key=lambda r: r["version"], default=None)
+        if mejor is None:
+            return None
+        for url, r in respuestas.items():
+            if r is None or r["version"] < mejor["version"]:
+                self._inc("kv_reparaciones_lectura")
+                if url == self.mi_url:
+                    self.local.fusionar_desde_vecino({clave: mejor})
+                else:
+                    self._pool.submit(self._replicar_en, url, clave, mejor)
+        return mejor
+
+    # --- Estado local y anti-entropía ---
+    def registro(self, clave: str) -> Optional[Dict[str, Any]]:
+        return self.local.registro(clave)
+
+    def estado_completo(self) -> Dict[str, Dict[str, Any]]:
+        return self.local.estado_completo()
+
+    def compactar(self, archivar=None) -> int:
+        """Cada réplica compacta lo suyo: los TTL y las lápidas viajan en el registro."""
+        return self.local.compactar(archivar)
+
+    def fusionar_desde_vecino(self, estado_remoto: Dict[str, Dict[str, Any]]):
+        self.local.fusionar_desde_vecino(estado_remoto)
+
+    def replicar_a_vecinos(self, vecinos: List[Dict[str, Any]] = None):
+        """Lanza una ronda de anti-entropía en segundo plano (como mucho una cada intervalo)."""
+        if time.time() - self._ultima_ronda < self.intervalo_anti_entropia or self._ronda.locked():
+            return
+        self._ultima_ronda = time.time()
+        threading.Thread(target=self.anti_entropia, daemon=True, name="kv-replicar").start()
+
+    def diferencias(self, digesto: Dict[str, int]) -> List[str]:
+        return self.local.diferencias(digesto)
+
+    def anti_entropia(self):
+        """
+        Con cada réplica intercambia primero un resumen clave -> versión de lo que comparte con
+        este nodo (y de sus pistas pendientes) y le envía solo las claves que le faltan o tiene
+        atrasadas; después traspasa las claves que ya no nos corresponden.
+        """
+        if not self._ronda.acquire(blocking=False):
+            return
+        try:
+            self._refrescar(forzar=True)
+            registros = self.local.estado_completo()
+            digestos: Dict[str, Dict[str, int]] = {}
+            sobrantes = []
+            for clave, reg in registros.items():
+                replicas = self.anillo.preferentes(clave, self.replicas)
+                for url in replicas:
+                    if url != self.mi_url:
+                        digestos.setdefault(url, {})[clave] = reg["version"]
+                if self.mi_url not in replicas:
+                    sobrantes.append((clave, reg["version"], replicas))
+            with self._lock_pistas:
+                pistas, self._pistas = self._pistas, {}
+            for url, claves in pistas.items():
+                for clave in claves:
+                    reg = registros.get(clave) or self.local.registro(clave)
+                    if reg is not None:
+                        registros[clave] = reg
+                        digestos.setdefault(url, {})[clave] = reg["version"]
+            vivos = set(self.anillo.miembros)
+            entregados = set()
+            for url, digesto in digestos.items():
+                if url in vivos:
+                    try:
+                        faltan = self._post(url, "/kv/digest", digesto)["faltan"]
+                        if faltan:
+                            self._post(url, "/kv/sync", {c: registros[c] for c in faltan if c in registros})
+                        entregados.add(url)
+                        self._inc("kv_anti_entropia_enviadas", len(faltan))
+                        self._inc("kv_pistas_entregadas", len(pistas.get(url, ())))
+                        continue
+                    except Exception:
+                        pass
+                if pistas.get(url):
+                    with self._lock_pistas:
+                        self._pistas.setdefault(url, set()).update(pistas[url])
+            for clave, version, replicas in sobrantes:
+                if all(u in entregados for u in replicas) and self.local.descartar(clave, version):
+                    self._inc("kv_claves_traspasadas")
+        finally:
+            self._ronda.release()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Plano de datos en memoria compartida entre el proceso del nodo y los procesos de cómputo.
+El nodo escribe los arrays de una tarea directamente desde el JSON decodificado a un
+segmento de multiprocessing.shared_memory; el proceso de cómputo recibe solo un descriptor
+pequeño (nombre, offsets, formas) y los envuelve como arrays de NumPy sin copiarlos.
+Los segmentos tienen contador de referencias y se reutilizan por clases de tamaño.
+"""
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Tuple
+import numpy as np
+
+_ALINEACION = 64  # bytes: cada array empieza en una línea de caché
+
+
+def _forma(valor: Any) -> Tuple[int, ...]:
+    """Forma de una lista anidada rectangular sin convertirla (se mira el primer elemento)."""
+    if isinstance(valor, np.ndarray):
+        return valor.shape
+    forma = []
+    while isinstance(valor, (list, tuple)):
+        forma.append(len(valor))
+        if not valor:
+            break
+        valor = valor[0]
+    return tuple(forma)
+
+
+class Segmento:
+    def __init__(self, shm: shared_memory.SharedMemory, clase: int):
+        self.shm = shm
+        self.clase = clase  # capacidad en bytes (potencia de dos)
+        self.refs = 0
+
+    @property
+    def nombre(self) -> str:
+        return self.shm.name
+
+
+class PoolSegmentos:
+    """
+    Segmentos reutilizables por clase de tamaño. adquirir() entrega un segmento con una
+    referencia; retener()/soltar() ajustan el contador y al llegar a cero el segmento vuelve
+    al pool (o se destruye si ya hay `max_libres` esperando).
+    """
+
+    def __init__(self, max_libres: int = 8, tam_minimo: int = 1 << 20):
+        self.max_libres = max_libres
+        self.tam_minimo = tam_minimo
+        self._lock = threading.Lock()
+        self._libres: Dict[int, List[Segmento]] = {}
+        self._n_libres = 0
+        self.creados = 0
+        self.reutilizados = 0
+
+    def _clase(self, nbytes: int) -> int:
+        return max(self.tam_minimo, 1 << max(nbytes - 1, 0).bit_length())
+
+    def adquirir(self, nbytes: int) -> Segmento:
+        clase = self._clase(nbytes)
+        with self._lock:
+            libres = self._libres.get(clase)
+            if libres:
+                seg = libres.pop()
+                self._n_libres -= 1
+                self.reutilizados += 1
+            else:
+                seg = None
+                self.creados += 1
+        if seg is None:
+            seg = Segmento(shared_memory.SharedMemory(create=True, size=clase), clase)
+        seg.refs = 1
+        return seg
+
+    def retener(self, seg: Segmento):
+        with self._lock:
+            seg.refs += 1
+
+    def soltar(self, seg: Segmento):
+        with self._lock:
+            seg.refs -= 1
+            if seg.refs > 0:
+                return
+            if self._n_libres < self.max_libres:
+                self._libres.setdefault(seg.clase, []).append(seg)
+                self._n_libres += 1
+                return
+        _destruir(seg)
+
+    def cerrar(self):
+        with self._lock:
+            libres = [s for lista in self._libres.values() for s in lista]
+            self._libres.clear()
+            self._n_libres = 0
+        for seg in libres:
+            _destruir(seg)
+
+
+def _destruir(seg: Segmento):
+    seg.shm.close()
+    seg.shm.unlink()
+
+
+def empaquetar(pool: PoolSegmentos, arrays: Dict[str, Any]) -> Tuple[Segmento, Dict[str, Any]]:
+    """
+    Copia cada array (ndarray o lista anidada tal como llega en el JSON) a un segmento del
+    pool, convirtiendo directamente sobre la memoria compartida. Devuelve el segmento (con
+    una referencia que el llamador debe soltar) y el descriptor para el proceso de cómputo.
+    """
+    disposicion = {}
+    offset = 0
+    for nombre, valor in arrays.items():
+        forma = _forma(valor)
+        nbytes = int(np.prod(forma, dtype=np.int64)) * 8
+        disposicion[nombre] = {"offset": offset, "forma": list(forma), "dtype": "<f8"}
+        offset += -(-nbytes // _ALINEACION) * _ALINEACION
+    seg = pool.adquirir(offset)
+    try:
+        for nombre, valor in arrays.items():
+            d = disposicion[nombre]
+            vista = np.ndarray(d["forma"], dtype=d["dtype"], buffer=seg.shm.buf, offset=d["offset"])
+            vista[...] = valor  # una sola pasada: lista -> float64 en el segmento
+            del vista  # no retener exports del buffer (impedirían cerrar el segmento)
+    except Exception:
+        pool.soltar(seg)
+        raise
+    return seg, {"segmento": seg.nombre, "arrays": disposicion}
+
+
+# Segmentos abiertos en este proceso (lado del proceso de cómputo): como el pool reutiliza
+# segmentos, los mismos nombres vuelven a aparecer y no hace falta volver a mapearlos
+_abiertos: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+_MAX_ABIERTOS = 16
+
+
+def _adjuntar(nombre: str) -> shared_memory.SharedMemory:
+    shm = _abiertos.get(nombre)
+    if shm is None:
+        shm = _abiertos[nombre] = shared_memory.SharedMemory(name=nombre)
+        while len(_abiertos) > _MAX_ABIERTOS:
+            _, viejo = _abiertos.popitem(last=False)
+            try:
+                viejo.close()
+            except BufferError:
+                pass  # aún hay vistas vivas: se libera cuando el GC las recoja
+    else:
+        _abiertos.move_to_end(nombre)
+    return shm
+
+
+def abrir(descriptor: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Vistas NumPy (sin copia) de los arrays descritos por `empaquetar`."""
+    shm = _adjuntar(descriptor["segmento"])
+    return {
+        nombre: np.ndarray(d["forma"], dtype=d["dtype"], buffer=shm.buf, offset=d["offset"])
+        for nombre, d in descriptor["arrays"].items()
+    }
@@ -1,5 +1,5 @@
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from pydantic import BaseModel
 
@@ -10,4 +10,5 @@ class Mensaje(BaseModel):
     origen: str
     destino: str
     payload: Dict[str, Any]
-    ts: float = time.time()
\ No newline at end of file
+    ts: float = time.time()
+    traza: Optional[str] = None  # traceparent W3C del span que envía el mensaje
\ No newline at end of file
@@ -1,33 +1,94 @@
 # -*- coding: utf-8 -*-
 """
 Métricas simples en memoria, estilo Prometheus (texto).
+Las escrituras se serializan por nombre de métrica (locks rayados) y las lecturas
+trabajan sobre copias de los dicts, sin bloquear a los hilos que escriben.
+De cada observación se guardan las últimas `max_observaciones` (para percentiles y series)
+y la suma y cuenta de toda la vida del proceso (para las medias).
 """
-import threading, time
-from typing import Dict
+import itertools, time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+from Libs.estado_nodo import LocksRayados
 
 class Metricas:
-    def __init__(self):
-        self._lock = threading.Lock()
+    def __init__(self, max_observaciones:int=10000):
+        self._locks = LocksRayados("metricas")
+        self.max_observaciones = max_observaciones
         self.contadores: Dict[str, float] = {}
-        self.observaciones: Dict[str, list] = {}
+        self.observaciones: Dict[str, deque] = {}
+        self._totales: Dict[str, list] = {}  # nombre -> [suma, n] desde el arranque
 
     def inc(self, nombre:str, valor:float=1.0):
-        with self._lock:
+        with self._locks.para(nombre):
             self.contadores[nombre] = self.contadores.get(nombre, 0.0) + valor
 
     def observe(self, nombre:str, valor:float):
-        with self._lock:
-            self.observaciones.setdefault(nombre, []).append(valor)
+        with self._locks.para(nombre):
+            vals = self.observaciones.get(nombre)
+            if vals is None:
+                vals = self.observaciones[nombre] = deque(maxlen=self.max_observaciones)
+                self._totales[nombre] = [0.0, 0]
+            vals.append(valor)
+            total = self._totales[nombre]
+            total[0] += valor
+            total[1] += 1
+
+    def nuevas_observaciones(self, nombre:str, vistas:int)->Tuple[int, list]:
+        """
+        (total observado desde el arranque, observaciones posteriores a las `vistas` primeras).
+        Si entre medias hubo más de `max_observaciones`, las más antiguas ya no están.
+        """
+        with self._locks.para(nombre):
+            vals = self.observaciones.get(nombre)
+            if vals is None:
+                return 0, []
+            total = self._totales[nombre][1]
+            nuevas = min(max(total - vistas, 0), len(vals))
+            return total, list(itertools.islice(vals, len(vals) - nuevas, None))
+
+    def percentil(self, nombre:str, p:float, ventana:int=1000, min_muestras:int=1)->Optional[float]:
+        """Percentil p (0-100) de las últimas `ventana` observaciones, o None si no hay suficientes."""
+        vals = list(self.observaciones.get(nombre, ()))[-ventana:]
+        if len(vals) < max(min_muestras, 1):
+            return None
+        ordenados = sorted(vals)
+        idx = min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)
+        return ordenados[idx]
+
+    def instantanea(self)->Dict[str, Any]:
+        """Contadores y (suma, n) de cada observación: se pueden sumar entre procesos."""
+        # Sin bloquear: si otro hilo observa entre leer la suma y la cuenta el promedio apenas se desvía
+        return {
+            "contadores": self.contadores.copy(),
+            "observaciones": {k: [suma, n] for k, (suma, n) in self._totales.copy().items() if n},
+        }
 
     def exportar_texto(self)->str:
-        with self._lock:
-            lineas = []
-            for k,v in self.contadores.items():
-                lineas.append(f"# TYPE {k} counter")
-                lineas.append(f"{k} {v}")
-            for k,vals in self.observaciones.items():
-                if vals:
-                    avg = sum(vals)/len(vals)
-                    lineas.append(f"# TYPE {k}_avg gauge")
-                    lineas.append(f"{k}_avg {avg}")
-            return "\n".join(lineas)
+        return texto_de(self.instantanea())
+
+
+def fusionar_instantaneas(instantaneas: List[Dict[str, Any]])->Dict[str, Any]:
+    """Suma instantáneas de varios procesos (p.ej. los workers de un nodo)."""
+    contadores: Dict[str, float] = {}
+    observaciones: Dict[str, list] = {}
+    for inst in instantaneas:
+        for k, v in inst["contadores"].items():
+            contadores[k] = contadores.get(k, 0.0) + v
+        for k, (suma, n) in inst["observaciones"].items():
+            acc = observaciones.setdefault(k, [0.0, 0])
+            acc[0] += suma
+            acc[1] += n
+    return {"contadores": contadores, "observaciones": observaciones}
+
+
+def texto_de(inst: Dict[str, Any])->str:
+    lineas = []
+    for k,v in inst["contadores"].items():
+        lineas.append(f"# TYPE {k} counter")
+        lineas.append(f"{k} {v}")
+    for k,(suma,n) in inst["observaciones"].items():
+        if n:
+            lineas.append(f"# TYPE {k}_avg gauge")
+            lineas.append(f"{k}_avg {suma/n}")
+    return "\n".join(lineas)
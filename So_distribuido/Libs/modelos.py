@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de modelos ajustados y predicción sin reajuste.
+Una tarea regresion_lineal con "modelo_id" publica sus coeficientes en el KV
+(modelo_<id>, con versión propia); cada nodo que sirve predicciones los guarda en
+memoria como arrays de NumPy la primera vez y luego solo calcula w0 + X @ w, sin
+volver a leer el KV en cada petición (se revalida la versión cada `revalidar` s).
+"""
+import threading, time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from Libs.motores import ModuloPerezoso
+
+np = ModuloPerezoso("numpy")
+
+PREFIJO = "modelo_"
+
+
+class ModeloDesconocido(KeyError):
+    pass
+
+
+class ModeloEnCache:
+    def __init__(self, version: int, coeficientes: List[float]):
+        w = np.asarray(coeficientes, dtype=float)
+        self.version = version
+        self.intercepto = float(w[0])
+        self.pesos = np.ascontiguousarray(w[1:])
+        self.comprobado = time.monotonic()
+
+    def predecir(self, X: Any) -> "np.ndarray":
+        Xb = np.asarray(X, dtype=float)
+        if Xb.ndim == 1:
+            Xb = Xb.reshape(1, -1)
+        if Xb.ndim != 2 or Xb.shape[1] != self.pesos.shape[0]:
+            raise ValueError(f"Se esperaban filas de {self.pesos.shape[0]} valores, llegó forma {Xb.shape}")
+        return Xb @ self.pesos + self.intercepto
+
+
+class RegistroModelos:
+    def __init__(self, kv, metricas=None, max_cache: int = 64, revalidar: float = 1.0, intentos: int = 8):
+        self.kv = kv
+        self.metricas = metricas
+        self.intentos = intentos  # escrituras condicionales antes de rendirse si otros publican a la vez
+        self.max_cache = max_cache
+        self.revalidar = revalidar
+        self._cache: "OrderedDict[str, ModeloEnCache]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _inc(self, nombre: str):
+        if self.metricas is not None:
+            self.metricas.inc(nombre)
+
+    def _guardar(self, modelo_id: str, modelo: ModeloEnCache):
+        with self._lock:
+            self._cache[modelo_id] = modelo
+            self._cache.move_to_end(modelo_id)
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+
+    def publicar(self, modelo_id: str, coeficientes: List[float], tipo: str = "regresion_lineal") -> Dict[str, Any]:
+        """
+        Guarda una versión nueva del modelo en el KV y en la caché local.
+        La versión del modelo es la del registro en el KV: se escribe condicionada a la versión
+        leída, así dos publicaciones simultáneas no pueden quedarse con el mismo número.
+        """
+        clave = PREFIJO + modelo_id
+        actual = self.kv.get(clave)
+        previa = actual["version"] if isinstance(actual, dict) else 0
+        for _ in range(self.intentos):
+            version = previa + 1
+            escrita = self.kv.put(clave, {
+                "id": modelo_id, "version": version, "tipo": tipo,
+                "coeficientes": list(coeficientes), "ts": time.time(),
+            }, version=version, si_version=previa)
+            if escrita == version:
+                break
+            if escrita is not None:
+                # La clave se había borrado y el KV asignó otra versión: se reescribe con la suya
+                previa = escrita
+                continue
+            self._inc("modelos_conflictos")  # otro nodo publicó entre medias
+            actual = self.kv.get(clave)
+            previa = actual["version"] if isinstance(actual, dict) else 0
+        else:
+            raise RuntimeError(f"No se pudo publicar {modelo_id}: demasiadas publicaciones simultáneas")
+        self._guardar(modelo_id, ModeloEnCache(version, coeficientes))
+        self._inc("modelos_publicados")
+        return {"id": modelo_id, "version": version}
+
+    def describir(self, modelo_id: str) -> Optional[Dict[str, Any]]:
+        return self.kv.get(PREFIJO + modelo_id)
+
+    def obtener(self, modelo_id: str, version: Optional[int] = None) -> ModeloEnCache:
+        """Modelo en caché; se recarga del KV si falta, si se pide otra versión o si toca revalidar."""
+        modelo = self._cache.get(modelo_id)
+        if modelo is not None and (version is None or version == modelo.version):
+            if version is not None or time.monotonic() - modelo.comprobado < self.revalidar:
+                self._inc("modelos_cache_aciertos")
+                return modelo
+        datos = self.kv.get(PREFIJO + modelo_id)
+        if not isinstance(datos, dict):
+            raise ModeloDesconocido(modelo_id)
+        if version is not None and datos["version"] != version:
+            raise ModeloDesconocido(f"{modelo_id} v{version}")
+        if modelo is not None and modelo.version == datos["version"]:
+            modelo.comprobado = time.monotonic()
+            self._inc("modelos_cache_aciertos")
+            return modelo
+        self._inc("modelos_cache_fallos")
+        modelo = ModeloEnCache(datos["version"], datos["coeficientes"])
+        self._guardar(modelo_id, modelo)
+        return modelo
+
+    def predecir(self, modelo_id: str, X: Any, version: Optional[int] = None) -> Tuple[int, "np.ndarray"]:
+        modelo = self.obtener(modelo_id, version)
+        return modelo.version, modelo.predecir(X)
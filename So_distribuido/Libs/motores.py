@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Carga perezosa de dependencias pesadas para que el nodo arranque rápido:
+  - ModuloPerezoso: importa un módulo (p.ej. httpx) en el primer acceso a un atributo
+  - MotoresPerezosos: motores de cálculo por tipo de tarea que se importan la primera vez
+    que llega su tipo, o todos a la vez al calentar el nodo en segundo plano
+"""
+import importlib, threading, time
+from types import ModuleType
+from typing import Dict, Optional
+
+
+class ModuloPerezoso:
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo: Optional[ModuleType] = None
+
+    def __getattr__(self, atributo: str):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return getattr(self._modulo, atributo)
+
+
+class MotoresPerezosos:
+    def __init__(self, modulos: Dict[str, str], metricas=None):
+        """modulos: {tipo: módulo que implementa el tipo}; varios tipos pueden compartir módulo."""
+        self.modulos = modulos
+        self.metricas = metricas
+        self._lock = threading.Lock()
+        self._cargados: Dict[str, ModuleType] = {}
+
+    def cargar(self, tipo: str) -> ModuleType:
+        modulo = self._cargados.get(tipo)
+        if modulo is not None:
+            return modulo
+        nombre = self.modulos[tipo]  # KeyError: tipo sin motor
+        with self._lock:
+            if tipo not in self._cargados:
+                t0 = time.perf_counter()
+                self._cargados[tipo] = importlib.import_module(nombre)
+                if self.metricas is not None:
+                    self.metricas.observe(f"motor_carga_ms_{tipo}", (time.perf_counter() - t0) * 1000.0)
+            return self._cargados[tipo]
+
+    def calentar(self):
+        for tipo in self.modulos:
+            self.cargar(tipo)
+
+    def calientes(self) -> Dict[str, bool]:
+        return {tipo: tipo in self._cargados for tipo in self.modulos}
+
+    def todos_calientes(self) -> bool:
+        return len(self._cargados) == len(self.modulos)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Modo multiproceso: varios workers de uvicorn forman un único nodo lógico por host.
+  - AgenteHost: cada worker reclama un índice con flock; el que obtiene el lock de líder
+    ejecuta el descubrimiento, el gossip y guarda el KV del nodo
+  - TablaCompartida: fila por worker en memoria compartida (mmap en /dev/shm) con carga y
+    ranuras; cada worker escribe solo su fila y cualquiera puede sumarlas
+  - ServidorIPC / ClienteIPC / ProxyIPC: llamadas JSON sobre sockets Unix locales, para
+    que los demás workers usen el KV y la lista de vecinos del líder y para agregar métricas
+"""
+import fcntl, json, mmap, os, socket, struct, tempfile, threading, time
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+_CABECERA = struct.Struct("!I")
+
+
+def directorio_host(puerto: int) -> str:
+    """Directorio compartido por los workers de un puerto: en /dev/shm si existe."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"so_nodo_{puerto}")
+
+
+def _recibir_exacto(sock: socket.socket, n: int) -> bytes:
+    datos = bytearray()
+    while len(datos) < n:
+        bloque = sock.recv(n - len(datos))
+        if not bloque:
+            raise ConnectionError("Conexión IPC cerrada")
+        datos += bloque
+    return bytes(datos)
+
+
+def _enviar(sock: socket.socket, obj: Any):
+    cuerpo = json.dumps(obj).encode()
+    sock.sendall(_CABECERA.pack(len(cuerpo)) + cuerpo)
+
+
+def _recibir(sock: socket.socket) -> Any:
+    (n,) = _CABECERA.unpack(_recibir_exacto(sock, _CABECERA.size))
+    return json.loads(_recibir_exacto(sock, n))
+
+
+class ServidorIPC:
+    """Expone operaciones {"kv.get": fn, ...} en un socket Unix; un hilo por conexión."""
+
+    def __init__(self, ruta: str, operaciones: Dict[str, Callable]):
+        self.ruta = ruta
+        self.operaciones = operaciones
+        self._sock: Optional[socket.socket] = None
+
+    def iniciar(self):
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)  # socket de un proceso anterior con el mismo índice
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.ruta)
+        self._sock.listen(64)
+        threading.Thread(target=self._aceptar, daemon=True, name="ipc-servidor").start()
+
+    def cerrar(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _aceptar(self):
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._atender, args=(conn,), daemon=True, name="ipc-conexion").start()
+
+    def _atender(self, conn: socket.socket):
+        with conn:
+            while True:
+                try:
+                    peticion = _recibir(conn)
+                except (ConnectionError, OSError, ValueError):
+                    return
+                fn = self.operaciones.get(peticion.get("op"))
+                try:
+                    if fn is None:
+                        raise KeyError(f"Operación IPC desconocida: {peticion.get('op')}")
+                    respuesta = {"ok": True, "r": fn(*peticion.get("args", []), **peticion.get("kwargs", {}))}
+                except Exception as e:
+                    respuesta = {"ok": False, "error": repr(e)}
+                try:
+                    _enviar(conn, respuesta)
+                except OSError:
+                    return
+
+
+class ClienteIPC:
+    """Cliente con una conexión persistente por hilo; reconecta tras un fallo."""
+
+    def __init__(self, ruta: str, timeout: float = 5.0):
+        self.ruta = ruta
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conexion(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.ruta)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"IPC no disponible en {self.ruta}: {e}") from e
+            self._local.sock = sock
+        return sock
+
+    def llamar(self, op: str, *args, **kwargs) -> Any:
+        sock = self._conexion()
+        try:
+            _enviar(sock, {"op": op, "args": list(args), "kwargs": kwargs})
+            respuesta = _recibir(sock)
+        except (OSError, ValueError) as e:
+            sock.close()
+            self._local.sock = None
+            raise ConnectionError(f"Fallo IPC en {op}: {e}") from e
+        if not respuesta["ok"]:
+            raise RuntimeError(respuesta["error"])
+        return respuesta["r"]
+
+
+class ProxyIPC:
+    """Objeto que reenvía por IPC solo los métodos permitidos (p.ej. los del KV del líder)."""
+
+    def __init__(self, cliente: ClienteIPC, prefijo: str, metodos: Iterable[str]):
+        self._cliente = cliente
+        self._prefijo = prefijo
+        self._metodos = set(metodos)
+
+    def __getattr__(self, nombre: str):
+        if nombre not in self._metodos:
+            raise AttributeError(nombre)
+        op = f"{self._prefijo}.{nombre}"
+        return lambda *args, **kwargs: self._cliente.llamar(op, *args, **kwargs)
+
+
+class TablaCompartida:
+    """Tabla de enteros de 64 bits en un fichero mapeado en memoria; una fila por worker."""
+
+    CAMPOS = ("ts_ms", "carga", "ranuras", "ranuras_libres", "cola")
+
+    def __init__(self, ruta: str, filas: int):
+        self.filas = filas
+        tam = filas * len(self.CAMPOS) * 8
+        fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < tam:
+                os.ftruncate(fd, tam)
+            self._mmap = mmap.mmap(fd, tam)
+        finally:
+            os.close(fd)
+        self._celdas = memoryview(self._mmap).cast("q")
+
+    def escribir(self, fila: int, valores: Dict[str, int]):
+        base = fila * len(self.CAMPOS)
+        for i, campo in enumerate(self.CAMPOS[1:], start=1):
+            self._celdas[base + i] = int(valores.get(campo, 0))
+        # La marca de tiempo al final: una fila con ts vigente ya tiene sus valores escritos
+        self._celdas[base] = int(time.time() * 1000)
+
+    def leer(self, vigencia_s: float) -> List[Dict[str, int]]:
+        """Filas de workers que han publicado en los últimos `vigencia_s` segundos."""
+        limite = int((time.time() - vigencia_s) * 1000)
+        n = len(self.CAMPOS)
+        filas = []
+        for f in range(self.filas):
+            valores = self._celdas[f * n:(f + 1) * n].tolist()
+            if valores[0] >= limite:
+                filas.append(dict(zip(self.CAMPOS, valores)))
+        return filas
+
+
+class AgenteHost:
+    """Coordinación de los workers de un mismo nodo lógico dentro de un host."""
+
+    def __init__(self, directorio: str, workers: int, vigencia_s: float = 5.0, espera_indice: float = 10.0):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.workers = workers
+        self.vigencia_s = vigencia_s
+        self.es_lider = False
+        self._fds: List[int] = []  # ficheros con flock tomados: se liberan al morir el proceso
+        self.indice = self._reclamar_indice(espera_indice)
+        self.tabla = TablaCompartida(os.path.join(directorio, "estado"), workers)
+        self._clientes: Dict[int, ClienteIPC] = {}
+
+    def _flock(self, nombre: str) -> bool:
+        fd = os.open(os.path.join(self.directorio, nombre), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fds.append(fd)
+        return True
+
+    def _reclamar_indice(self, espera: float) -> int:
+        # Un worker reiniciado por uvicorn puede llegar antes de que el muerto suelte su lock
+        limite = time.time() + espera
+        while True:
+            for i in range(self.workers):
+                if self._flock(f"w{i}.lock"):
+                    return i
+            if time.time() > limite:
+                raise RuntimeError(f"Sin índice de worker libre en {self.directorio}")
+            time.sleep(0.1)
+
+    def intentar_liderazgo(self) -> bool:
+        if not self.es_lider and self._flock("lider.lock"):
+            self.es_lider = True
+        return self.es_lider
+
+    def ruta_worker(self, indice: int) -> str:
+        return os.path.join(self.directorio, f"w{indice}.sock")
+
+    @property
+    def ruta_lider(self) -> str:
+        return os.path.join(self.directorio, "lider.sock")
+
+    def publicar(self, valores: Dict[str, int]):
+        self.tabla.escribir(self.indice, valores)
+
+    def agregados(self) -> Dict[str, int]:
+        """Suma de carga y ranuras de todos los workers vivos del host."""
+        totales = {c: 0 for c in TablaCompartida.CAMPOS[1:]}
+        for fila in self.tabla.leer(self.vigencia_s):
+            for c in totales:
+                totales[c] += fila[c]
+        return totales
+
+    def _otros(self) -> List[ClienteIPC]:
+        clientes = []
+        for i in range(self.workers):
+            if i == self.indice:
+                continue
+            if i not in self._clientes:
+                self._clientes[i] = ClienteIPC(self.ruta_worker(i), timeout=2.0)
+            clientes.append(self._clientes[i])
+        return clientes
+
+    def recolectar(self, op: str, *args) -> List[Any]:
+        """Resultado de `op` en cada uno de los demás workers que responda."""
+        resultados = []
+        for c in self._otros():
+            try:
+                resultados.append(c.llamar(op, *args))
+            except (ConnectionError, RuntimeError):
+                pass  # worker reiniciándose: se omite
+        return resultados
+
+    def difundir(self, op: str, *args):
+        self.recolectar(op, *args)
+
+    def preguntar(self, op: str, *args) -> Any:
+        """Primer resultado no nulo de `op` entre los demás workers."""
+        for c in self._otros():
+            try:
+                r = c.llamar(op, *args)
+            except (ConnectionError, RuntimeError):
+                continue
+            if r is not None:
+                return r
+        return None
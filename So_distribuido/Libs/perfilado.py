@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnóstico en caliente sin herramientas externas:
+  - perfilador por muestreo de todos los hilos (sys._current_frames) con salida en
+    pilas colapsadas ("hilo;modulo:funcion;... N"), lista para flamegraph.pl o speedscope
+  - locks instrumentados que acumulan el tiempo de espera cuando hay contención
+"""
+import os, sys, threading, time, weakref
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Locks instrumentados vivos; /metrics agrega sus contadores por nombre
+_LOCKS: "weakref.WeakSet[LockInstrumentado]" = weakref.WeakSet()
+
+
+class LockInstrumentado:
+    """
+    Sustituto de threading.Lock que mide la espera solo cuando el lock está ocupado:
+    el camino sin contención es un acquire no bloqueante, sin llamadas a time.
+    Los contadores no usan Metricas para poder instrumentar también los locks de Metricas.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.espera_s = 0.0
+        self.contenciones = 0
+        _LOCKS.add(self)
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        t0 = time.perf_counter()
+        ok = self._lock.acquire(True, timeout)
+        # Se actualizan con el lock tomado (o perdidos si venció el timeout, es solo diagnóstico)
+        self.espera_s += time.perf_counter() - t0
+        self.contenciones += 1
+        return ok
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def exportar_esperas_texto() -> str:
+    """Contadores de espera de los locks instrumentados en formato Prometheus."""
+    totales: Dict[str, List[float]] = {}
+    for l in list(_LOCKS):
+        t = totales.setdefault(l.nombre, [0.0, 0])
+        t[0] += l.espera_s
+        t[1] += l.contenciones
+    lineas = []
+    for nombre, (espera, contenciones) in sorted(totales.items()):
+        lineas.append(f"# TYPE lock_espera_segundos_{nombre} counter")
+        lineas.append(f"lock_espera_segundos_{nombre} {espera}")
+        lineas.append(f"# TYPE lock_contenciones_{nombre} counter")
+        lineas.append(f"lock_contenciones_{nombre} {contenciones}")
+    return "\n".join(lineas)
+
+
+def _marco(frame) -> str:
+    codigo = frame.f_code
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+
+def muestrear_pilas(excluir: Optional[int] = None) -> List[str]:
+    """Una muestra: la pila colapsada de cada hilo vivo (raíz a la izquierda)."""
+    nombres = {t.ident: t.name for t in threading.enumerate()}
+    pilas = []
+    for ident, frame in sys._current_frames().items():
+        if ident == excluir:
+            continue
+        marcos = []
+        while frame is not None:
+            marcos.append(_marco(frame))
+            frame = frame.f_back
+        marcos.append(nombres.get(ident, f"hilo-{ident}"))
+        pilas.append(";".join(reversed(marcos)))
+    return pilas
+
+
+class Perfilador:
+    """Perfilador por muestreo bajo demanda; solo admite una captura a la vez."""
+
+    def __init__(self, max_segundos: float = 60.0):
+        self.max_segundos = max_segundos
+        self._ocupado = threading.Lock()
+
+    def perfilar(self, segundos: float, intervalo: float = 0.01) -> Optional[Counter]:
+        """
+        Muestrea todas las pilas cada `intervalo` durante `segundos` (acotado a max_segundos).
+        Devuelve {pila_colapsada: muestras}, o None si ya hay otra captura en curso.
+        """
+        if not self._ocupado.acquire(False):
+            return None
+        try:
+            propio = threading.get_ident()
+            pilas: Counter = Counter()
+            limite = time.perf_counter() + min(max(segundos, 0.0), self.max_segundos)
+            while True:
+                pilas.update(muestrear_pilas(excluir=propio))
+                if time.perf_counter() >= limite:
+                    return pilas
+                time.sleep(intervalo)
+        finally:
+            self._ocupado.release()
+
+
+def formatear_colapsado(pilas: Counter) -> str:
+    return "\n".join(f"{pila} {n}" for pila, n in pilas.most_common())
@@ -6,25 +6,51 @@ Toma decisiones autónomas sobre ejecución o reenvío de tareas.
 
 from typing import List, Dict, Any
 
+from Libs.recursos import solicitud_de_tarea
+
 class PlanificadorLocal:
-    def __init__(self, mi_nombre: str, mi_url: str, metricas, obtener_carga_fn):
+    # Bonificación para nodos que ya guardan las entradas de la tarea (localidad de datos)
+    BONO_AFINIDAD = 0.25
+
+    def __init__(self, mi_nombre: str, mi_url: str, metricas, obtener_carga_fn, obtener_recursos_fn=None,
+                 salud=None):
         self.mi_nombre = mi_nombre
         self.mi_url = mi_url
         self.metricas = metricas
         self.obtener_carga_fn = obtener_carga_fn
+        self.obtener_recursos_fn = obtener_recursos_fn  # e.g., recursos.instantanea
+        self.salud = salud  # SaludVecinos: se saltan los vecinos con el circuito abierto
+
+    def _puntuar_nodo(self, nodo: Dict[str, Any], solicitud: Dict[str, float] = None) -> float:
+        """
+        Puntúa un nodo según la capacidad libre que le quedaría tras colocar la tarea, en [0, 1)
+        si cabe y negativa si no. Nodos sin información de ranuras (versiones antiguas) se
+        puntúan por carga en la misma escala: 1 / (1 + carga + cpu).
+        """
+        solicitud = solicitud or {"cpu": 1.0, "mem_mb": 0.0}
+        ranuras = nodo.get("ranuras")
+        if not ranuras:
+            # Un nodo antiguo libre no debe ganar siempre a uno con ranuras: tras recibir la
+            # tarea cuenta como uno de dos ranuras con una ocupada
+            return 1.0 / (1.0 + nodo.get("carga", 0.0) + solicitud.get("cpu", 1.0))
 
-    def _puntuar_nodo(self, nodo: Dict[str, Any]) -> float:
-        """Calcula puntuación inversamente proporcional a la carga."""
-        carga = nodo.get("carga", 0.0)
-        return 1.0 / (1.0 + carga)
+        cpu = min(solicitud.get("cpu", 1.0), float(ranuras))
+        libres = nodo.get("ranuras_libres", ranuras)
+        cola = nodo.get("cola", 0)
+        mem_libre = nodo.get("mem_libre_mb")
+        cabe = libres >= cpu and cola == 0
+        if cabe and mem_libre is not None and solicitud.get("mem_mb", 0.0) > mem_libre:
+            cabe = False
+        if not cabe:
+            # No cabe: puntuación negativa, menos mala cuanto menor la cola relativa a su tamaño
+            return -(cola + cpu) / ranuras
+        # Utilización resultante normalizada: reparte para mantener el clúster parejo
+        return 1.0 - (ranuras - libres + cpu) / ranuras
 
-    def elegir_ejecutor(self, vecinos: List[Dict[str, Any]], tarea=None) -> str:
+    def clasificar(self, vecinos: List[Dict[str, Any]], tarea=None) -> List[str]:
         """
-        Decide quién debe ejecutar la tarea.
-        Retorna:
-          - "YO" si este nodo debe ejecutarla.
-          - URL de un vecino si debe reenviarse.
-          - None si no hay nodos disponibles.
+        Ordena los candidatos de mejor a peor.
+        Retorna una lista con "YO" para este nodo y la URL de cada vecino.
         """
         # Construir candidato propio
         carga_propia = self.obtener_carga_fn()
@@ -33,34 +59,55 @@ class PlanificadorLocal:
             "url": self.mi_url,
             "carga": carga_propia
         }
+        if self.obtener_recursos_fn is not None:
+            candidato_propio.update(self.obtener_recursos_fn() or {})
+        solicitud = solicitud_de_tarea(tarea)
+        afinidad = set((getattr(tarea, "payload", None) or {}).get("_afinidad") or [])
 
-        # Filtrar vecinos: excluir al nodo local si aparece (evitar duplicados)
+        # Filtrar vecinos: excluir al nodo local si aparece (evitar duplicados), a los que
+        # anuncian sus tipos sin incluir el de la tarea (sin "tipos": versión antigua, se acepta)
+        # y a los que tienen el circuito abierto
+        tipo = getattr(tarea, "tipo", None)
         vecinos_filtrados = [
             v for v in vecinos
             if v.get("nombre") != self.mi_nombre
+            and (tipo is None or "tipos" not in v or tipo in v["tipos"])
         ]
+        if self.salud is not None:
+            sanos = [v for v in vecinos_filtrados if self.salud.disponible(v.get("url"))]
+            if len(sanos) < len(vecinos_filtrados) and self.metricas is not None:
+                self.metricas.inc("planificador_vecinos_omitidos", len(vecinos_filtrados) - len(sanos))
+            vecinos_filtrados = sanos
 
         # Lista completa de candidatos: yo + vecinos válidos
         candidatos = [candidato_propio] + vecinos_filtrados
 
-        if not candidatos:
-            return None
-
         # Calcular puntuaciones
         puntuados = []
         for c in candidatos:
-            score = self._puntuar_nodo(c)
+            score = self._puntuar_nodo(c, solicitud)
+            if score >= 0 and c.get("url") in afinidad:
+                score += self.BONO_AFINIDAD
             puntuados.append((score, c))
 
-        # Ordenar de mejor a peor
+        # Ordenar de mejor a peor (estable: ante empate gana este nodo)
         puntuados.sort(key=lambda x: x[0], reverse=True)
 
-        # El mejor candidato es el primero
-        mejor_score, mejor_nodo = puntuados[0]
-
-        # Si el mejor es este nodo, devolver "YO"
-        if mejor_nodo["url"] == self.mi_url:
-            return "YO"
+        return ["YO" if nodo["url"] == self.mi_url else nodo["url"] for _, nodo in puntuados]
 
-        # De lo contrario, devolver la URL del mejor vecino
-        return mejor_nodo["url"]
\ No newline at end of file
+    def elegir_ejecutor(self, vecinos: List[Dict[str, Any]], tarea=None) -> str:
+        """
+        Decide quién debe ejecutar la tarea.
+        Retorna:
+          - "YO" si este nodo debe ejecutarla.
+          - URL de un vecino si debe reenviarse.
+          - None si no hay nodos disponibles.
+        """
+        orden = self.clasificar(vecinos, tarea)
+        if not orden:
+            return None
+        # El mejor candidato es el primero; un vecino semiabierto solo si queda libre su prueba
+        for candidato in orden:
+            if candidato == "YO" or self.salud is None or self.salud.permite(candidato):
+                return candidato
+        return None
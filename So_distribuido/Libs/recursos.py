@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Contabilidad de recursos del nodo: CPUs, memoria, límites de cgroup y ranuras de ejecución.
+La admisión de tareas se hace por ranuras (bin packing) en lugar de un contador crudo.
+"""
+import os, threading, time
+from typing import Dict, Any, Optional
+
+# Valores por encima de este umbral en cgroup v1 significan "sin límite"
+_SIN_LIMITE_V1 = 1 << 60
+
+
+def _leer(ruta: str) -> Optional[str]:
+    try:
+        with open(ruta) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def detectar_cpus() -> float:
+    """CPUs utilizables: afinidad del proceso acotada por la cuota de cgroup (v2 o v1)."""
+    try:
+        n = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        n = float(os.cpu_count() or 1)
+
+    cpu_max = _leer("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<cuota> <periodo>" o "max <periodo>"
+    if cpu_max:
+        partes = cpu_max.split()
+        if len(partes) == 2 and partes[0] != "max":
+            n = min(n, int(partes[0]) / int(partes[1]))
+    else:
+        cuota = _leer("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        periodo = _leer("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if cuota and periodo and int(cuota) > 0:
+            n = min(n, int(cuota) / int(periodo))
+    return max(n, 1.0)
+
+
+def limite_memoria_mb() -> Optional[float]:
+    """Límite de memoria del cgroup en MB, o None si no hay límite."""
+    v = _leer("/sys/fs/cgroup/memory.max")
+    if v is None:
+        v = _leer("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if not v or v == "max":
+        return None
+    limite = int(v)
+    if limite >= _SIN_LIMITE_V1:
+        return None
+    return limite / (1024 * 1024)
+
+
+def memoria_libre_mb() -> Optional[float]:
+    """Memoria disponible: MemAvailable del host acotada por lo que queda del cgroup."""
+    libre = None
+    meminfo = _leer("/proc/meminfo")
+    if meminfo:
+        for linea in meminfo.splitlines():
+            if linea.startswith("MemAvailable:"):
+                libre = int(linea.split()[1]) / 1024
+                break
+    limite = limite_memoria_mb()
+    if limite is not None:
+        usado = _leer("/sys/fs/cgroup/memory.current") or _leer("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+        if usado:
+            restante = max(limite - int(usado) / (1024 * 1024), 0.0)
+            libre = restante if libre is None else min(libre, restante)
+    return libre
+
+
+def solicitud_de_tarea(tarea=None) -> Dict[str, float]:
+    """Normaliza la solicitud de recursos de una tarea (objeto Tarea o dict). Por defecto 1 CPU."""
+    recursos = getattr(tarea, "recursos", None)
+    if recursos is None and isinstance(tarea, dict):
+        recursos = tarea.get("recursos")
+    recursos = recursos or {}
+    return {
+        "cpu": float(recursos.get("cpu", 1.0)),
+        "mem_mb": float(recursos.get("mem_mb", 0.0)),
+    }
+
+
+class Recursos:
+    def __init__(self, ranuras: Optional[int] = None, intervalo_memoria: float = 1.0):
+        self.cpus = detectar_cpus()
+        # Una ranura por CPU utilizable salvo que se configure explícitamente
+        self.ranuras = int(ranuras) if ranuras else max(1, int(self.cpus))
+        self.mem_limite_mb = limite_memoria_mb()
+        self._cond = threading.Condition()
+        self.ocupadas = 0.0
+        self.mem_reservada_mb = 0.0
+        self.en_cola = 0
+        self._intervalo_memoria = intervalo_memoria
+        self._mem_libre_cache = (0.0, None)
+
+    def _ajustar(self, solicitud: Dict[str, float]) -> Dict[str, float]:
+        # Una tarea más grande que el nodo se ejecuta sola en lugar de no caber nunca
+        return {"cpu": min(max(solicitud.get("cpu", 1.0), 0.0), float(self.ranuras)),
+                "mem_mb": max(solicitud.get("mem_mb", 0.0), 0.0)}
+
+    def _mem_libre(self) -> Optional[float]:
+        ts, valor = self._mem_libre_cache
+        ahora = time.time()
+        if ahora - ts > self._intervalo_memoria:
+            valor = memoria_libre_mb()
+            self._mem_libre_cache = (ahora, valor)
+        return valor
+
+    def _cabe(self, s: Dict[str, float]) -> bool:
+        if self.ocupadas + s["cpu"] > self.ranuras:
+            return False
+        if s["mem_mb"] > 0:
+            libre = self._mem_libre()
+            # Nunca se admite más memoria de la que queda libre, haya o no reservas en curso
+            if libre is not None and s["mem_mb"] > libre:
+                return False
+        return True
+
+    def cabe(self, solicitud: Dict[str, float]) -> bool:
+        with self._cond:
+            return self._cabe(self._ajustar(solicitud))
+
+    def reservar(self, solicitud: Dict[str, float], timeout: Optional[float] = None) -> bool:
+        """Espera en cola hasta que la solicitud quepa. Devuelve False si vence el timeout."""
+        s = self._ajustar(solicitud)
+        with self._cond:
+            self.en_cola += 1
+            try:
+                if not self._cond.wait_for(lambda: self._cabe(s), timeout=timeout):
+                    return False
+            finally:
+                self.en_cola -= 1
+            self.ocupadas += s["cpu"]
+            self.mem_reservada_mb += s["mem_mb"]
+            return True
+
+    def liberar(self, solicitud: Dict[str, float]):
+        s = self._ajustar(solicitud)
+        with self._cond:
+            self.ocupadas = max(self.ocupadas - s["cpu"], 0.0)
+            self.mem_reservada_mb = max(self.mem_reservada_mb - s["mem_mb"], 0.0)
+            self._cond.notify_all()
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Resumen anunciado en el latido y en /estado."""
+        mem_libre = self._mem_libre()
+        with self._cond:
+            return {
+                "cpus": self.cpus,
+                "ranuras": self.ranuras,
+                "ranuras_libres": self.ranuras - self.ocupadas,
+                "cola": self.en_cola,
+                "mem_libre_mb": mem_libre,
+                "mem_limite_mb": self.mem_limite_mb,
+            }
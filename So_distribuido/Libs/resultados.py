@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Registro en memoria de resultados y eventos por tarea o trabajo.
+Alimenta las suscripciones SSE: progreso, resultados parciales y finalización.
+Los suscriptores SSE esperan con asyncio (sin un hilo por conexión); los publicadores
+pueden estar en cualquier hilo.
+"""
+import asyncio, threading, time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+PROGRESO = "progreso"
+PARCIAL = "parcial"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+TERMINALES = {COMPLETADO, FALLIDO}
+
+
+class _Flujo:
+    def __init__(self, max_eventos: int):
+        self.eventos: deque = deque(maxlen=max_eventos)
+        self.seq = 0
+        self.terminado = False
+        self.ts = time.time()
+        # callables sin argumentos que despiertan a cada suscriptor en espera
+        self.suscriptores: set = set()
+
+
+class RegistroResultados:
+    def __init__(self, max_flujos: int = 10000, max_eventos: int = 1000):
+        self.max_flujos = max_flujos
+        self.max_eventos = max_eventos
+        self._lock = threading.Lock()
+        self._flujos: "OrderedDict[str, _Flujo]" = OrderedDict()
+        # difusor(clave, tipo, datos): replica cada evento en otros procesos del mismo nodo
+        self.difusor: Optional[Callable[[str, str, Dict[str, Any]], None]] = None
+
+    def _flujo(self, clave: str) -> _Flujo:
+        f = self._flujos.get(clave)
+        if f is None:
+            f = self._flujos[clave] = _Flujo(self.max_eventos)
+            if len(self._flujos) > self.max_flujos:
+                self._desalojar()
+        return f
+
+    def _desalojar(self):
+        # Primero los terminados más antiguos; si no hay, el más antiguo sin suscriptores
+        for clave, f in self._flujos.items():
+            if f.terminado and not f.suscriptores:
+                del self._flujos[clave]
+                return
+        for clave, f in self._flujos.items():
+            if not f.suscriptores:
+                del self._flujos[clave]
+                return
+
+    def publicar(self, clave: str, tipo: str, datos: Optional[Dict[str, Any]] = None, difundir: bool = True) -> int:
+        """Añade un evento al flujo y despierta a sus suscriptores. Devuelve su número de secuencia."""
+        if difundir and self.difusor is not None:
+            self.difusor(clave, tipo, datos or {})
+        with self._lock:
+            f = self._flujo(clave)
+            if f.terminado:
+                return f.seq
+            f.seq += 1
+            f.ts = time.time()
+            f.eventos.append({"seq": f.seq, "tipo": tipo, "ts": f.ts, "datos": datos or {}})
+            if tipo in TERMINALES:
+                f.terminado = True
+            self._flujos.move_to_end(clave)
+            suscriptores = list(f.suscriptores)
+            seq = f.seq
+        for despertar in suscriptores:
+            try:
+                despertar()
+            except RuntimeError:
+                pass  # el loop del suscriptor ya se cerró
+        return seq
+
+    def eventos_desde(self, clave: str, desde: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """Eventos con seq > desde y si el flujo terminó."""
+        with self._lock:
+            f = self._flujos.get(clave)
+            if f is None:
+                return [], False
+            return [e for e in f.eventos if e["seq"] > desde], f.terminado
+
+    def ultimo(self, clave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            f = self._flujos.get(clave)
+            if f is None or not f.eventos:
+                return None
+            return dict(f.eventos[-1], terminado=f.terminado)
+
+    async def esperar(self, clave: str, desde: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Espera (sin bloquear hilos) hasta que haya eventos nuevos, el flujo termine o venza el timeout."""
+        loop = asyncio.get_running_loop()
+        evento = asyncio.Event()
+
+        def sub():
+            loop.call_soon_threadsafe(evento.set)
+
+        with self._lock:
+            f = self._flujo(clave)
+            f.suscriptores.add(sub)
+        try:
+            eventos, terminado = self.eventos_desde(clave, desde)
+            if eventos or terminado:
+                return eventos, terminado
+            try:
+                await asyncio.wait_for(evento.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.eventos_desde(clave, desde)
+        finally:
+            with self._lock:
+                f.suscriptores.discard(sub)
+
+    def esperar_terminal(self, clave: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Versión bloqueante para hilos: espera el evento terminal del flujo (o None si vence)."""
+        evento = threading.Event()
+        with self._lock:
+            f = self._flujo(clave)
+            f.suscriptores.add(evento.set)
+        limite = time.time() + timeout
+        try:
+            while True:
+                with self._lock:
+                    if f.terminado:
+                        return dict(f.eventos[-1]) if f.eventos else None
+                restante = limite - time.time()
+                if restante <= 0:
+                    return None
+                evento.wait(restante)
+                evento.clear()
+        finally:
+            with self._lock:
+                f.suscriptores.discard(evento.set)
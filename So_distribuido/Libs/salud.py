@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Salud de los vecinos con cortacircuitos (circuit breakers) por nodo.
+Se alimenta de los sondeos de /estado y del resultado de cada reenvío de tareas:
+  - RTT medio exponencial (EWMA) de los sondeos y tasa de error EWMA de todo
+  - circuito CERRADO (normal) -> ABIERTO tras `umbral_errores` fallos seguidos o una tasa
+    de error >= `tasa_error_max`; el planificador no elige vecinos con el circuito abierto
+  - pasados `enfriamiento` s pasa a SEMIABIERTO: se deja pasar una sola petición de prueba
+    (permite() la reserva; disponible() solo consulta); un éxito lo cierra y un fallo lo
+    vuelve a abrir. Si el resultado de la prueba no llega en `enfriamiento` s, se admite otra
+Así un vecino caído deja de recibir tareas al primer par de errores, sin esperar a que
+caduque su latido.
+"""
+import threading, time
+from typing import Dict, Any, Optional
+
+CERRADO = "CERRADO"
+ABIERTO = "ABIERTO"
+SEMIABIERTO = "SEMIABIERTO"
+_NIVEL = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}  # valor del gauge vecino_circuito
+
+
+class EstadoVecino:
+    def __init__(self):
+        self.rtt_ms: Optional[float] = None
+        self.tasa_error = 0.0
+        self.fallos_seguidos = 0
+        self.circuito = CERRADO
+        self.abierto_desde = 0.0
+        self.prueba_desde: Optional[float] = None  # petición de prueba en vuelo (semiabierto)
+
+    def describir(self) -> Dict[str, Any]:
+        return {"rtt_ms": self.rtt_ms, "tasa_error": round(self.tasa_error, 4),
+                "fallos_seguidos": self.fallos_seguidos, "circuito": self.circuito}
+
+
+class SaludVecinos:
+    def __init__(
+        self,
+        metricas=None,
+        alfa: float = 0.3,
+        umbral_errores: int = 2,
+        tasa_error_max: float = 0.5,
+        enfriamiento: float = 5.0,
+    ):
+        self.metricas = metricas
+        self.alfa = alfa
+        self.umbral_errores = umbral_errores
+        self.tasa_error_max = tasa_error_max
+        self.enfriamiento = enfriamiento
+        self._vecinos: Dict[str, EstadoVecino] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, nombre: str):
+        if self.metricas is not None:
+            self.metricas.inc(nombre)
+
+    def _estado(self, url: str) -> EstadoVecino:
+        e = self._vecinos.get(url)
+        if e is None:
+            e = self._vecinos.setdefault(url, EstadoVecino())
+        return e
+
+    def exito(self, url: str, rtt_ms: Optional[float] = None):
+        with self._lock:
+            e = self._estado(url)
+            if rtt_ms is not None:
+                e.rtt_ms = rtt_ms if e.rtt_ms is None else (1 - self.alfa) * e.rtt_ms + self.alfa * rtt_ms
+            e.tasa_error *= 1 - self.alfa
+            e.fallos_seguidos = 0
+            e.prueba_desde = None
+            if e.circuito != CERRADO:
+                e.circuito = CERRADO
+                self._inc("salud_circuitos_cerrados")
+
+    def fallo(self, url: str):
+        with self._lock:
+            e = self._estado(url)
+            e.tasa_error = (1 - self.alfa) * e.tasa_error + self.alfa
+            e.fallos_seguidos += 1
+            e.prueba_desde = None
+            if e.circuito == ABIERTO:
+                return
+            if (e.circuito == SEMIABIERTO or e.fallos_seguidos >= self.umbral_errores
+                    or e.tasa_error >= self.tasa_error_max):
+                e.circuito = ABIERTO
+                e.abierto_desde = time.monotonic()
+                self._inc("salud_circuitos_abiertos")
+
+    def _libre(self, e: EstadoVecino, ahora: float) -> bool:
+        if e.circuito == CERRADO:
+            return True
+        if e.circuito == ABIERTO:
+            return ahora - e.abierto_desde >= self.enfriamiento
+        return e.prueba_desde is None or ahora - e.prueba_desde >= self.enfriamiento
+
+    def disponible(self, url: str) -> bool:
+        """Como permite() pero sin reservar la prueba: para filtrar candidatos."""
+        e = self._vecinos.get(url)
+        return e is None or self._libre(e, time.monotonic())
+
+    def permite(self, url: str) -> bool:
+        """
+        ¿Se le puede enviar trabajo ahora? Con el circuito cerrado siempre; si no, solo una
+        petición de prueba a la vez (el circuito abierto y enfriado pasa a semiabierto).
+        """
+        e = self._vecinos.get(url)
+        if e is None or e.circuito == CERRADO:
+            return True
+        with self._lock:
+            ahora = time.monotonic()
+            if not self._libre(e, ahora):
+                return False
+            if e.circuito != CERRADO:
+                e.circuito = SEMIABIERTO
+                e.prueba_desde = ahora
+            return True
+
+    def olvidar(self, url: str):
+        """El vecino dejó de anunciarse: si vuelve, empieza de cero."""
+        with self._lock:
+            self._vecinos.pop(url, None)
+
+    def describir(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {url: e.describir() for url, e in self._vecinos.items()}
+
+    def exportar_texto(self) -> str:
+        """Gauges por vecino en el formato de texto de /metrics."""
+        lineas = ["# TYPE vecino_rtt_ms gauge", "# TYPE vecino_tasa_error gauge", "# TYPE vecino_circuito gauge"]
+        for url, d in self.describir().items():
+            etiqueta = f'{{vecino="{url}"}}'
+            if d["rtt_ms"] is not None:
+                lineas.append(f"vecino_rtt_ms{etiqueta} {d['rtt_ms']:.3f}")
+            lineas.append(f"vecino_tasa_error{etiqueta} {d['tasa_error']}")
+            lineas.append(f"vecino_circuito{etiqueta} {_NIVEL[d['circuito']]}")
+        return "\n".join(lineas)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Series temporales de las métricas en anillos de tamaño fijo, y su fusión entre nodos.
+Un hilo muestrea Metricas cada segundo (diferencia de contadores y observaciones nuevas)
+y lo anota en varios niveles de resolución (por defecto 1 s durante 10 min y 1 min
+durante 24 h). Cada ranura guarda suma, cuenta y máximo; en las observaciones, además,
+un histograma logarítmico de cubetas fijas, así que los percentiles exportados son los
+de la ventana pedida. Todo se puede sumar entre nodos:
+  - las ranuras se identifican por int(ts // resolución), igual en todo el clúster
+  - los histogramas son recuentos por cubeta, así que los percentiles del clúster salen
+    del histograma sumado y no de promediar percentiles
+Memoria acotada: niveles x capacidad ranuras por serie y como mucho `max_series` series.
+"""
+import math, threading, time
+from typing import Dict, Any, List, Optional, Tuple
+
+NIVELES = ((1.0, 600), (60.0, 1440))  # (resolución en s, ranuras)
+_FACTOR = 2 ** 0.25  # ~19 % de anchura por cubeta
+_LOG_FACTOR = math.log(_FACTOR)
+_CUBETA_MIN, _CUBETA_MAX = -40, 120  # ~1e-3 .. ~1e9; fuera se satura
+
+
+class Anillo:
+    """`capacidad` ranuras de `resolucion` s con suma, cuenta, máximo y (opcional) histograma."""
+
+    def __init__(self, resolucion: float, capacidad: int, con_histograma: bool = False):
+        self.resolucion = resolucion
+        self.capacidad = capacidad
+        self.ids = [-1] * capacidad
+        self.suma = [0.0] * capacidad
+        self.n = [0] * capacidad
+        self.maximo = [float("-inf")] * capacidad
+        self.hist: Optional[List[Optional[Dict[int, int]]]] = [None] * capacidad if con_histograma else None
+
+    def anotar(self, ts: float, suma: float, n: int = 1, maximo: Optional[float] = None,
+               cubetas: Optional[Dict[int, int]] = None):
+        rid = int(ts // self.resolucion)
+        i = rid % self.capacidad
+        if self.ids[i] != rid:
+            self.ids[i], self.suma[i], self.n[i], self.maximo[i] = rid, 0.0, 0, float("-inf")
+            if self.hist is not None:
+                self.hist[i] = None
+        self.suma[i] += suma
+        self.n[i] += n
+        if maximo is not None and maximo > self.maximo[i]:
+            self.maximo[i] = maximo
+        if cubetas and self.hist is not None:
+            h = self.hist[i] = self.hist[i] or {}
+            for c, k in cubetas.items():
+                h[c] = h.get(c, 0) + k
+
+    def _ranuras(self, ventana: float, ahora: Optional[float]):
+        """(id, índice) de las ranuras vigentes de los últimos `ventana` s, en orden."""
+        ahora = time.time() if ahora is None else ahora
+        ultimo = int(ahora // self.resolucion)
+        primero = ultimo - min(int(ventana // self.resolucion), self.capacidad - 1)
+        for rid in range(primero, ultimo + 1):
+            i = rid % self.capacidad
+            if self.ids[i] == rid:
+                yield rid, i
+
+    def puntos(self, ventana: float, ahora: Optional[float] = None) -> List[List[float]]:
+        """[[id_ranura, suma, n, máximo], ...] de las ranuras de los últimos `ventana` s, en orden."""
+        salida = []
+        for rid, i in self._ranuras(ventana, ahora):
+            maximo = self.maximo[i]
+            salida.append([rid, self.suma[i], self.n[i], maximo if maximo != float("-inf") else None])
+        return salida
+
+    def histograma(self, ventana: float, ahora: Optional[float] = None) -> Dict[int, int]:
+        """Suma de los histogramas de las ranuras de los últimos `ventana` s."""
+        total: Dict[int, int] = {}
+        if self.hist is None:
+            return total
+        for _, i in self._ranuras(ventana, ahora):
+            for c, k in (self.hist[i] or {}).items():
+                total[c] = total.get(c, 0) + k
+        return total
+
+
+def cubeta(valor: float) -> int:
+    if valor <= 0:
+        return _CUBETA_MIN
+    return max(_CUBETA_MIN, min(_CUBETA_MAX, math.floor(math.log(valor) / _LOG_FACTOR)))
+
+
+def percentil_histograma(histograma: Dict[Any, int], p: float) -> Optional[float]:
+    """Percentil p (0-100) aproximado: centro geométrico de la cubeta que lo contiene."""
+    total = sum(histograma.values())
+    if not total:
+        return None
+    objetivo = p / 100.0 * total
+    acumulado = 0
+    for c in sorted(histograma, key=int):
+        acumulado += histograma[c]
+        if acumulado >= objetivo:
+            return _FACTOR ** (int(c) + 0.5)
+    return None
+
+
+class SeriesMetricas:
+    def __init__(self, metricas, niveles: Tuple[Tuple[float, int], ...] = NIVELES, max_series: int = 256):
+        self.metricas = metricas
+        self.niveles = tuple(niveles)
+        self.max_series = max_series
+        self._series: Dict[str, List[Anillo]] = {}
+        self._anterior: Dict[str, float] = {}  # último valor visto de cada contador
+        self._vistos: Dict[str, int] = {}  # observaciones (total desde el arranque) ya muestreadas
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+
+    def _anillos(self, nombre: str) -> Optional[List[Anillo]]:
+        anillos = self._series.get(nombre)
+        if anillos is None:
+            if len(self._series) >= self.max_series:
+                return None
+            con_histograma = nombre.startswith("o:")
+            anillos = self._series[nombre] = [Anillo(r, c, con_histograma) for r, c in self.niveles]
+        return anillos
+
+    def muestrear(self, ahora: Optional[float] = None):
+        """Anota lo ocurrido desde la muestra anterior."""
+        ahora = time.time() if ahora is None else ahora
+        contadores = self.metricas.contadores.copy()
+        observaciones = list(self.metricas.observaciones)
+        with self._lock:
+            for nombre, valor in contadores.items():
+                delta = valor - self._anterior.get(nombre, 0.0)
+                self._anterior[nombre] = valor
+                if delta:
+                    anillos = self._anillos("c:" + nombre)
+                    for a in anillos or ():
+                        a.anotar(ahora, delta)
+            for nombre in observaciones:
+                total, nuevos = self.metricas.nuevas_observaciones(nombre, self._vistos.get(nombre, 0))
+                self._vistos[nombre] = total
+                if not nuevos:
+                    continue
+                anillos = self._anillos("o:" + nombre)
+                if anillos is None:
+                    continue
+                suma, maximo = sum(nuevos), max(nuevos)
+                cubetas: Dict[int, int] = {}
+                for v in nuevos:
+                    c = cubeta(v)
+                    cubetas[c] = cubetas.get(c, 0) + 1
+                for a in anillos:
+                    a.anotar(ahora, suma, len(nuevos), maximo, cubetas)
+
+    def exportar(self, resolucion: float = 1.0, ventana: float = 300.0) -> Dict[str, Any]:
+        """Instantánea serializable y sumable (ver fusionar) del nivel de `resolucion` más cercano."""
+        nivel = min(range(len(self.niveles)), key=lambda i: abs(self.niveles[i][0] - resolucion))
+        ahora = time.time()
+        with self._lock:
+            contadores, observaciones, histogramas = {}, {}, {}
+            for clave, anillos in self._series.items():
+                tipo, nombre = clave.split(":", 1)
+                puntos = anillos[nivel].puntos(ventana, ahora)
+                if tipo == "c":
+                    contadores[nombre] = [[rid, suma] for rid, suma, _, _ in puntos]
+                else:
+                    observaciones[nombre] = puntos
+                    hist = anillos[nivel].histograma(ventana, ahora)
+                    if hist:
+                        histogramas[nombre] = {str(c): n for c, n in hist.items()}
+        return {
+            "resolucion": self.niveles[nivel][0],
+            "totales": self.metricas.contadores.copy(),
+            "contadores": contadores,
+            "observaciones": observaciones,
+            "histogramas": histogramas,
+        }
+
+    def _bucle(self):
+        paso = min(r for r, _ in self.niveles)
+        while not self._detener.wait(paso):
+            try:
+                self.muestrear()
+            except Exception:
+                self.metricas.inc("series_errores")
+
+    def iniciar(self):
+        threading.Thread(target=self._bucle, daemon=True, name="metricas-series").start()
+
+    def detener(self):
+        self._detener.set()
+
+
+def fusionar(exportaciones: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Suma las exportaciones de varios nodos o workers (misma resolución) ranura a ranura."""
+    totales: Dict[str, float] = {}
+    contadores: Dict[str, Dict[int, float]] = {}
+    observaciones: Dict[str, Dict[int, List[Any]]] = {}
+    histogramas: Dict[str, Dict[str, int]] = {}
+    for e in exportaciones:
+        for k, v in e.get("totales", {}).items():
+            totales[k] = totales.get(k, 0.0) + v
+        for k, puntos in e.get("contadores", {}).items():
+            serie = contadores.setdefault(k, {})
+            for rid, suma in puntos:
+                serie[rid] = serie.get(rid, 0.0) + suma
+        for k, puntos in e.get("observaciones", {}).items():
+            serie = observaciones.setdefault(k, {})
+            for rid, suma, n, maximo in puntos:
+                acc = serie.setdefault(rid, [0.0, 0, None])
+                acc[0] += suma
+                acc[1] += n
+                if maximo is not None and (acc[2] is None or maximo > acc[2]):
+                    acc[2] = maximo
+        for k, h in e.get("histogramas", {}).items():
+            destino = histogramas.setdefault(k, {})
+            for c, n in h.items():
+                destino[c] = destino.get(c, 0) + n
+    return {
+        "resolucion": exportaciones[0]["resolucion"] if exportaciones else None,
+        "totales": totales,
+        "contadores": {k: [[rid, s[rid]] for rid in sorted(s)] for k, s in contadores.items()},
+        "observaciones": {k: [[rid, *s[rid]] for rid in sorted(s)] for k, s in observaciones.items()},
+        "histogramas": histogramas,
+    }
+
+
+def resumir(fusion: Dict[str, Any]) -> Dict[str, Any]:
+    """Tendencias legibles: ritmo por segundo de cada contador y media/máximo/percentiles de cada observación."""
+    r = fusion["resolucion"] or 1.0
+    contadores = {
+        k: {"total": fusion["totales"].get(k), "por_segundo": [[rid * r, s / r] for rid, s in puntos]}
+        for k, puntos in fusion["contadores"].items()
+    }
+    observaciones = {}
+    for k, puntos in fusion["observaciones"].items():
+        hist = fusion["histogramas"].get(k, {})
+        observaciones[k] = {
+            "p50": percentil_histograma(hist, 50),
+            "p95": percentil_histograma(hist, 95),
+            "p99": percentil_histograma(hist, 99),
+            "serie": [[rid * r, s / n if n else None, maximo] for rid, s, n, maximo in puntos],
+        }
+    return {"resolucion": r, "contadores": contadores, "observaciones": observaciones}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de tipos de tarea. Cada tipo declara su manejador, las entradas que espera,
+los recursos que necesita, si admite agrupación en lotes y un estimador de coste.
+Los tipos externos se registran con entry points del grupo `so_distribuido.tipos_tarea`
+cuyo objeto es un TipoTarea (o una función que devuelve uno o varios).
+"""
+from importlib.metadata import entry_points
+from typing import Dict, Any, List, Optional, Callable, Union
+
+from Libs.motores import MotoresPerezosos
+
+GRUPO_ENTRY_POINTS = "so_distribuido.tipos_tarea"
+
+
+def _es_referencia(valor: Any) -> bool:
+    return isinstance(valor, dict) and "$ref" in valor
+
+
+class TipoTarea:
+    def __init__(
+        self,
+        nombre: str,
+        manejador: Union[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+        modulo: Optional[str] = None,
+        requeridos: Optional[Dict[str, type]] = None,
+        opcionales: Optional[Dict[str, type]] = None,
+        recursos: Optional[Dict[str, float]] = None,
+        agrupable: bool = False,
+        estimar_coste: Optional[Callable[[Dict[str, Any]], float]] = None,
+    ):
+        """
+        manejador: función payload -> resultado, o "modulo:funcion" que se importa en el primer uso.
+        modulo: motor que se carga (y se calienta al arrancar) antes de ejecutar el tipo.
+        requeridos/opcionales: {campo: tipo Python} del payload; un {"$ref": ...} vale por cualquiera.
+        recursos: solicitud por defecto cuando la tarea no declara la suya.
+        """
+        if isinstance(manejador, str):
+            modulo, _, manejador = manejador.partition(":")
+        self.nombre = nombre
+        self.manejador = manejador
+        self.modulo = modulo
+        self.requeridos = requeridos or {}
+        self.opcionales = opcionales or {}
+        self.recursos = recursos or {}
+        self.agrupable = agrupable
+        self.estimar_coste = estimar_coste
+
+    def validar(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Mensaje de error si el payload no cumple el esquema, o None."""
+        for campo, tipo in self.requeridos.items():
+            if campo not in payload:
+                return f"Falta el campo '{campo}' para el tipo {self.nombre}"
+        for campo, tipo in list(self.requeridos.items()) + list(self.opcionales.items()):
+            valor = payload.get(campo)
+            if valor is not None and not _es_referencia(valor) and not isinstance(valor, tipo):
+                return f"El campo '{campo}' debe ser {tipo.__name__} para el tipo {self.nombre}"
+        return None
+
+    def describir(self) -> Dict[str, Any]:
+        return {
+            "requeridos": {k: t.__name__ for k, t in self.requeridos.items()},
+            "opcionales": {k: t.__name__ for k, t in self.opcionales.items()},
+            "recursos": self.recursos,
+            "agrupable": self.agrupable,
+            "estima_coste": self.estimar_coste is not None,
+        }
+
+
+class RegistroTipos:
+    def __init__(self, metricas=None):
+        self.metricas = metricas
+        self._tipos: Dict[str, TipoTarea] = {}
+        self._motores = MotoresPerezosos({}, metricas)
+
+    def registrar(self, tipo: TipoTarea):
+        self._tipos[tipo.nombre] = tipo
+        if tipo.modulo:
+            self._motores.modulos[tipo.nombre] = tipo.modulo
+
+    def cargar_entry_points(self, grupo: str = GRUPO_ENTRY_POINTS) -> List[str]:
+        """Registra los tipos publicados por paquetes instalados. Devuelve sus nombres."""
+        nuevos = []
+        for ep in entry_points(group=grupo):
+            try:
+                objeto = ep.load()
+                if not isinstance(objeto, TipoTarea):
+                    objeto = objeto()
+            except Exception:
+                if self.metricas is not None:
+                    self.metricas.inc("tipos_tarea_con_error")
+                continue  # un plugin roto no impide arrancar el nodo
+            for tipo in objeto if isinstance(objeto, (list, tuple)) else [objeto]:
+                self.registrar(tipo)
+                nuevos.append(tipo.nombre)
+        return nuevos
+
+    def obtener(self, nombre: str) -> Optional[TipoTarea]:
+        return self._tipos.get(nombre)
+
+    def nombres(self) -> List[str]:
+        return sorted(self._tipos)
+
+    def validar(self, nombre: str, payload: Dict[str, Any]) -> Optional[str]:
+        tipo = self._tipos.get(nombre)
+        if tipo is None:
+            return f"Tipo de tarea no soportado: {nombre}"
+        return tipo.validar(payload)
+
+    def motor(self, nombre: str):
+        """Módulo del motor del tipo, importado en el primer uso."""
+        return self._motores.cargar(nombre)
+
+    def ejecutar(self, nombre: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        tipo = self._tipos[nombre]
+        manejador = tipo.manejador
+        if isinstance(manejador, str):
+            manejador = getattr(self.motor(nombre), manejador)
+        return manejador(payload)
+
+    def solicitud_por_defecto(self, nombre: str) -> Dict[str, float]:
+        tipo = self._tipos.get(nombre)
+        return tipo.recursos if tipo else {}
+
+    def estimar_coste(self, nombre: str, payload: Dict[str, Any]) -> Optional[float]:
+        tipo = self._tipos.get(nombre)
+        if tipo is None or tipo.estimar_coste is None:
+            return None
+        try:
+            return float(tipo.estimar_coste(payload))
+        except Exception:
+            return None
+
+    def calentar(self):
+        self._motores.calentar()
+
+    def calientes(self) -> Dict[str, bool]:
+        return self._motores.calientes()
+
+    def todos_calientes(self) -> bool:
+        return self._motores.todos_calientes()
+
+    def describir(self) -> Dict[str, Any]:
+        return {nombre: t.describir() for nombre, t in sorted(self._tipos.items())}
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Trabajos como grafos acíclicos (DAG) de tareas con dependencias.
+Lleva el estado de cada tarea, calcula cuáles están listas y reescribe las
+referencias a salidas intermedias ({"$ref": "<tarea>"}) para que viajen entre
+nodos por referencia en lugar de volver al cliente.
+"""
+from typing import Dict, Any, List, Optional, Callable
+
+PENDIENTE = "PENDIENTE"
+EN_EJECUCION = "EN_EJECUCION"
+COMPLETADA = "COMPLETADA"
+FALLIDA = "FALLIDA"
+OMITIDA = "OMITIDA"  # no se ejecutó porque falló una dependencia
+
+
+def _buscar_referencias(valor: Any, encontradas: set):
+    if isinstance(valor, dict):
+        if "$ref" in valor:
+            encontradas.add(valor["$ref"])
+            return
+        for v in valor.values():
+            _buscar_referencias(v, encontradas)
+    elif isinstance(valor, list):
+        for v in valor:
+            _buscar_referencias(v, encontradas)
+
+
+def _reescribir(valor: Any, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+    """Copia `valor` sustituyendo cada dict con "$ref" por fn(ref)."""
+    if isinstance(valor, dict):
+        if "$ref" in valor:
+            return fn(valor)
+        return {k: _reescribir(v, fn) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_reescribir(v, fn) for v in valor]
+    return valor
+
+
+def resolver_referencias(payload: Dict[str, Any], obtener_fn: Callable[[str, str], Any]) -> Dict[str, Any]:
+    """
+    Sustituye cada {"$ref": id_global, "url": nodo, "campo": opcional} por la salida real.
+    obtener_fn(id_global, url) devuelve la salida completa de esa tarea.
+    """
+    cache: Dict[str, Any] = {}
+
+    def _resolver(ref: Dict[str, Any]):
+        tid = ref["$ref"]
+        if tid not in cache:
+            cache[tid] = obtener_fn(tid, ref.get("url"))
+        salida = cache[tid]
+        campo = ref.get("campo")
+        return salida[campo] if campo is not None else salida
+
+    return _reescribir(payload, _resolver)
+
+
+class GrafoTrabajo:
+    def __init__(self, trabajo_id: str, tareas: List[Dict[str, Any]]):
+        """tareas: [{"id", "tipo", "payload", "recursos"?, "depende_de"?}, ...]"""
+        self.id = trabajo_id
+        self.tareas: Dict[str, Dict[str, Any]] = {}
+        for t in tareas:
+            if t["id"] in self.tareas:
+                raise ValueError(f"Tarea duplicada en el trabajo: {t['id']}")
+            self.tareas[t["id"]] = t
+        self.dependencias: Dict[str, set] = {}
+        self.con_referencias: set = set()
+        for tid, t in self.tareas.items():
+            refs: set = set()
+            _buscar_referencias(t.get("payload", {}), refs)  # un $ref implica dependencia
+            if refs:
+                self.con_referencias.add(tid)
+            deps = set(t.get("depende_de") or []) | refs
+            desconocidas = deps - set(self.tareas)
+            if desconocidas:
+                raise ValueError(f"Dependencias desconocidas en {tid}: {sorted(desconocidas)}")
+            self.dependencias[tid] = deps
+        self.dependientes: Dict[str, set] = {tid: set() for tid in self.tareas}
+        for tid, deps in self.dependencias.items():
+            for d in deps:
+                self.dependientes[d].add(tid)
+        self._validar_aciclico()
+        self.estados: Dict[str, str] = {tid: PENDIENTE for tid in self.tareas}
+        self.ubicaciones: Dict[str, str] = {}  # tarea -> URL del nodo que guarda su salida
+
+    def _validar_aciclico(self):
+        # Kahn: si no se pueden ordenar todas, hay un ciclo
+        grados = {tid: len(deps) for tid, deps in self.dependencias.items()}
+        pendientes = [tid for tid, g in grados.items() if g == 0]
+        visitadas = 0
+        while pendientes:
+            tid = pendientes.pop()
+            visitadas += 1
+            for hijo in self.dependientes[tid]:
+                grados[hijo] -= 1
+                if grados[hijo] == 0:
+                    pendientes.append(hijo)
+        if visitadas != len(self.tareas):
+            raise ValueError("El trabajo contiene un ciclo de dependencias")
+
+    def id_global(self, tid: str) -> str:
+        return f"{self.id}.{tid}"
+
+    def listas(self) -> List[str]:
+        """Tareas pendientes cuyas dependencias ya están completadas."""
+        return [
+            tid for tid, estado in self.estados.items()
+            if estado == PENDIENTE and all(self.estados[d] == COMPLETADA for d in self.dependencias[tid])
+        ]
+
+    def es_final(self, tid: str) -> bool:
+        """Las tareas sin dependientes devuelven su salida al cliente en lugar de una referencia."""
+        return not self.dependientes[tid]
+
+    def tarea_para_despacho(self, tid: str, mi_url: str) -> Dict[str, Any]:
+        """Tarea lista para ejecutar_tarea: id global, referencias con ubicación y afinidad de datos."""
+        t = self.tareas[tid]
+
+        def _ubicar(ref: Dict[str, Any]):
+            origen = ref["$ref"]
+            return dict(ref, **{"$ref": self.id_global(origen), "url": self.ubicaciones.get(origen)})
+
+        payload = dict(t.get("payload", {}))
+        if tid in self.con_referencias:
+            # Solo se recorre el payload (quizá con listas grandes) si contiene referencias
+            payload = _reescribir(payload, _ubicar)
+            payload["_refs"] = True
+        payload["origen"] = mi_url
+        afinidad = sorted({self.ubicaciones[d] for d in self.dependencias[tid] if d in self.ubicaciones})
+        if afinidad:
+            payload["_afinidad"] = afinidad
+        if not self.es_final(tid):
+            payload["_por_referencia"] = True
+        return {
+            "id": self.id_global(tid),
+            "tipo": t["tipo"],
+            "payload": payload,
+            "recursos": t.get("recursos") or {},
+        }
+
+    def marcar(self, tid: str, estado: str, ubicacion: Optional[str] = None):
+        self.estados[tid] = estado
+        if ubicacion:
+            self.ubicaciones[tid] = ubicacion
+        if estado == FALLIDA:
+            self._omitir_dependientes(tid)
+
+    def _omitir_dependientes(self, tid: str):
+        for hijo in self.dependientes[tid]:
+            if self.estados[hijo] == PENDIENTE:
+                self.estados[hijo] = OMITIDA
+                self._omitir_dependientes(hijo)
+
+    def terminado(self) -> bool:
+        return all(e in (COMPLETADA, FALLIDA, OMITIDA) for e in self.estados.values())
+
+    def estado_global(self) -> str:
+        if not self.terminado():
+            return EN_EJECUCION
+        return COMPLETADA if all(e == COMPLETADA for e in self.estados.values()) else FALLIDA
+
+    def estado(self) -> Dict[str, Any]:
+        """Representación serializable que se guarda en el KV."""
+        return {
+            "estado": self.estado_global(),
+            "tareas": {
+                tid: {
+                    "estado": self.estados[tid],
+                    "depende_de": sorted(self.dependencias[tid]),
+                    "ubicacion": self.ubicaciones.get(tid),
+                }
+                for tid in self.tareas
+            },
+        }
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Trazado distribuido ligero: spans en un buffer circular por nodo, contexto propagado
+con el formato W3C traceparent (en Tarea.payload["_traza"], cabeceras y Mensaje.traza)
+y exportación en JSON compatible con OTLP. El muestreo se decide en la raíz de la traza
+y se respeta en todos los saltos; los spans no muestreados no se registran.
+"""
+import random, time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Tuple
+
+# (trace_id, span_id, muestreado) del span activo en este hilo/tarea
+_actual: ContextVar[Optional[Tuple[str, str, bool]]] = ContextVar("so_traza", default=None)
+
+
+def formatear_traceparent(trace_id: str, span_id: str, muestreado: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if muestreado else '00'}"
+
+
+def parsear_traceparent(valor) -> Optional[Tuple[str, str, bool]]:
+    if not isinstance(valor, str):
+        return None
+    partes = valor.split("-")
+    if len(partes) != 4 or len(partes[1]) != 32 or len(partes[2]) != 16:
+        return None
+    return partes[1], partes[2], partes[3] == "01"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "padre_id", "nombre", "inicio_ns", "fin_ns", "atributos", "error")
+
+    def __init__(self, trace_id: str, span_id: str, padre_id: Optional[str], nombre: str, atributos: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.padre_id = padre_id
+        self.nombre = nombre
+        self.inicio_ns = time.time_ns()
+        self.fin_ns = 0
+        self.atributos = atributos
+        self.error: Optional[str] = None
+
+    def set(self, clave: str, valor: Any):
+        self.atributos[clave] = valor
+
+
+def _valor_otlp(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+class Trazador:
+    def __init__(self, servicio: str, muestreo: float = 0.01, capacidad: int = 10000):
+        self.servicio = servicio
+        self.muestreo = muestreo
+        self._spans: deque = deque(maxlen=capacidad)  # append/popleft atómicos
+        self._rng = random.Random()
+
+    def _id(self, bits: int) -> str:
+        return f"{self._rng.getrandbits(bits):0{bits // 4}x}"
+
+    def traceparent(self) -> Optional[str]:
+        """Contexto del span activo para propagarlo a otro nodo, o None si no hay traza."""
+        ctx = _actual.get()
+        return formatear_traceparent(*ctx) if ctx else None
+
+    @contextmanager
+    def span(self, nombre: str, padre: Optional[str] = None, **atributos):
+        """
+        Abre un span hijo del contexto activo (o de `padre`, un traceparent remoto).
+        Sin contexto se inicia una traza nueva y se decide el muestreo.
+        Devuelve el Span, o None si la traza no está muestreada.
+        """
+        ctx = parsear_traceparent(padre) or _actual.get()
+        if ctx is None:
+            trace_id, padre_id = self._id(128), None
+            muestreado = self._rng.random() < self.muestreo
+        else:
+            trace_id, padre_id, muestreado = ctx
+        span_id = self._id(64)
+        token = _actual.set((trace_id, span_id, muestreado))
+        span = Span(trace_id, span_id, padre_id, nombre, atributos) if muestreado else None
+        try:
+            yield span
+        except BaseException as e:
+            if span is not None:
+                span.error = repr(e)
+            raise
+        finally:
+            _actual.reset(token)
+            if span is not None:
+                span.fin_ns = time.time_ns()
+                self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        return [s for s in list(self._spans) if trace_id is None or s.trace_id == trace_id]
+
+    def exportar_otlp(self, trace_id: Optional[str] = None) -> Dict[str, Any]:
+        """Spans del buffer en el formato JSON de OTLP (ExportTraceServiceRequest)."""
+        spans = []
+        for s in self.spans(trace_id):
+            item = {
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "name": s.nombre,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(s.inicio_ns),
+                "endTimeUnixNano": str(s.fin_ns),
+                "attributes": [{"key": k, "value": _valor_otlp(v)} for k, v in s.atributos.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.padre_id:
+                item["parentSpanId"] = s.padre_id
+            spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.servicio}}]},
+                "scopeSpans": [{"scope": {"name": "so_distribuido"}, "spans": spans}],
+            }]
+        }
@@ -4,56 +4,239 @@ Nodo unificado para sistema operativo descentralizado.
 Cada nodo puede recibir, planificar y ejecutar tareas sin depender de un coordinador central.
 """
 
-import os, time, threading, numpy as np, httpx
+import os, time, json, threading, contextlib
+import multiprocessing
 import random
 import uuid
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.routing import APIRoute
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 
-from Libs.descubrimiento import Descubridor
+from Libs.descubrimiento import Descubridor, DescubridorLoopback
 from Libs.mensajeria import Mensaje
-from Libs.metricas import Metricas
+from Libs.metricas import Metricas, fusionar_instantaneas, texto_de
 from Libs.planificador import PlanificadorLocal
 from Libs.kv import KVReplicado
+from Libs.kv_particionado import KVParticionado, QuorumNoAlcanzado
+from Libs.recursos import Recursos, solicitud_de_tarea, detectar_cpus
+from Libs.especulacion import PoliticaEspeculativa, RegistroCancelaciones
+from Libs.idempotencia import TablaDeduplicacion, RenovadorLease
+from Libs import resultados as ev
+from Libs.resultados import RegistroResultados
+from Libs import trabajos as dag
+from Libs.trabajos import GrafoTrabajo, resolver_referencias
+from Libs.trazas import Trazador
+from Libs.perfilado import Perfilador, exportar_esperas_texto, formatear_colapsado
+from Libs.estado_nodo import ContadorPorHilo
+from Libs.multiproceso import AgenteHost, ServidorIPC, ClienteIPC, ProxyIPC, directorio_host
+from Libs.motores import ModuloPerezoso
+from Libs.tipos_tarea import TipoTarea, RegistroTipos
+from Libs import codificacion
+from Libs.historial import ArchivoHistorial, CompactadorHistorial
+from Libs.modelos import RegistroModelos, ModeloDesconocido
+from Libs.salud import SaludVecinos
+from Libs import series as ts
+from Libs.series import SeriesMetricas
+from Libs import gradientes
+from Libs.gradientes import CompresorGradientes, BaseDeltaPerdida
+
+# httpx, NumPy y los motores de cálculo se importan en el primer uso (o al calentar tras arrancar)
+httpx = ModuloPerezoso("httpx")
 
 # --- Configuración desde variables de entorno ---
 PUERTO = int(os.getenv("PUERTO", "8100"))
 GRUPO = os.getenv("DESCUBRIMIENTO_GRUPO", "239.10.10.10")
 PGRUPO = int(os.getenv("DESCUBRIMIENTO_PUERTO", "50000"))
 NOMBRE = os.getenv("NOMBRE", "nodo")
+URL_NODO = os.getenv("URL_NODO")  # p.ej. http://127.0.0.1:8101 cuando NOMBRE no resuelve por DNS
+# "multicast" (por defecto) o "loopback": unicast a DESCUBRIMIENTO_PARES en 127.0.0.1
+DESCUBRIMIENTO_MODO = os.getenv("DESCUBRIMIENTO_MODO", "multicast")
+DESCUBRIMIENTO_PARES = [int(p) for p in os.getenv("DESCUBRIMIENTO_PARES", "").split(",") if p]
+RANURAS = int(os.getenv("RANURAS", "0")) or None  # por defecto: una por CPU utilizable
+ADMISION_TIMEOUT = float(os.getenv("ADMISION_TIMEOUT", "5.0"))
+# Ejecución especulativa por tipo, ej: '{"regresion_lineal": {"percentil": 99}, "*": {"habilitada": false}}'
+ESPECULACION = json.loads(os.getenv("ESPECULACION", "{}"))
+ESPECULACION_MAX_EXTRA = float(os.getenv("ESPECULACION_MAX_EXTRA", "0.1"))
+ESPECULACION_HILOS = int(os.getenv("ESPECULACION_HILOS", "0"))  # 0: dos por ranura del worker
+LEASE_TTL = float(os.getenv("LEASE_TTL", "30.0"))  # propiedad de una tarea en ejecución
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "600.0"))  # cuánto se recuerda un resultado
+DEDUP_MAX = int(os.getenv("DEDUP_MAX", "10000"))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15.0"))
+TRABAJO_PARALELISMO = int(os.getenv("TRABAJO_PARALELISMO", "8"))  # tareas de un trabajo en vuelo
+TRABAJO_TIMEOUT_TAREA = float(os.getenv("TRABAJO_TIMEOUT_TAREA", "300.0"))
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0.01"))  # fracción de trazas raíz registradas
+TRAZAS_CAPACIDAD = int(os.getenv("TRAZAS_CAPACIDAD", "10000"))  # spans en el buffer circular
+PERFIL_MAX_SEGUNDOS = float(os.getenv("PERFIL_MAX_SEGUNDOS", "60.0"))
+# Workers de uvicorn que forman este nodo (uvicorn --workers N); con N > 1 comparten estado por host
+WORKERS = int(os.getenv("WORKERS", "1"))
+HOST_DIR = os.getenv("HOST_DIR") or directorio_host(PUERTO)
+# Procesos de cómputo con datos en memoria compartida (0: se calcula en el hilo de la petición)
+EJECUTOR_PROCESOS = int(os.getenv("EJECUTOR_PROCESOS", "0"))
+MEMCOMP_UMBRAL = int(os.getenv("MEMCOMP_UMBRAL", "100000"))  # elementos de X a partir de los que compensa
+MEMCOMP_SEGMENTOS_LIBRES = int(os.getenv("MEMCOMP_SEGMENTOS_LIBRES", "8"))
+KV_ARRANQUE_ESPERA = float(os.getenv("KV_ARRANQUE_ESPERA", "3.0"))  # espera máxima a un vecino del que copiar el KV
+COMPRESION_UMBRAL = int(os.getenv("COMPRESION_UMBRAL", "1024"))  # bytes a partir de los que se comprime entre nodos
+# "replicado" (por defecto: todas las claves en todos los nodos) o "particionado" (anillo de hash con KV_REPLICAS)
+KV_MODO = os.getenv("KV_MODO", "replicado")
+KV_REPLICAS = int(os.getenv("KV_REPLICAS", "3"))
+KV_QUORUM_LECTURA = int(os.getenv("KV_QUORUM_LECTURA", "1"))
+KV_QUORUM_ESCRITURA = int(os.getenv("KV_QUORUM_ESCRITURA", "1"))
+KV_VNODOS = int(os.getenv("KV_VNODOS", "64"))  # puntos de cada nodo en el anillo
+GOSSIP_INTERVALO = float(os.getenv("GOSSIP_INTERVALO", "0.2"))  # segundos entre rondas de difusión del KV
+GOSSIP_FANOUT = int(os.getenv("GOSSIP_FANOUT", "3"))  # vecinos al azar por ronda
+GOSSIP_EN_VUELO = int(os.getenv("GOSSIP_EN_VUELO", "1"))  # envíos pendientes máximos por vecino
+HISTORIAL_TTL = float(os.getenv("HISTORIAL_TTL", "3600.0"))  # cuánto se conservan tareas y trabajos terminados
+HISTORIAL_TTL_PENDIENTE = float(os.getenv("HISTORIAL_TTL_PENDIENTE", "86400.0"))  # tareas que nunca terminan
+GRADIENTE_TTL = float(os.getenv("GRADIENTE_TTL", "600.0"))
+KV_GRACIA_LAPIDA = float(os.getenv("KV_GRACIA_LAPIDA", "300.0"))  # vida de un borrado antes de olvidarlo
+KV_COMPACTAR_INTERVALO = float(os.getenv("KV_COMPACTAR_INTERVALO", "30.0"))
+KV_ARCHIVO = os.getenv("KV_ARCHIVO")  # JSONL donde archivar lo desalojado (opcional)
+MODELOS_CACHE = int(os.getenv("MODELOS_CACHE", "64"))  # modelos con coeficientes en memoria
+MODELOS_REVALIDAR = float(os.getenv("MODELOS_REVALIDAR", "1.0"))  # s entre comprobaciones de versión en el KV
+SALUD_UMBRAL_ERRORES = int(os.getenv("SALUD_UMBRAL_ERRORES", "2"))  # fallos seguidos que abren el circuito
+SALUD_ENFRIAMIENTO = float(os.getenv("SALUD_ENFRIAMIENTO", "5.0"))  # s con el circuito abierto antes de probar
+METRICAS_CLUSTER_PLAZO = float(os.getenv("METRICAS_CLUSTER_PLAZO", "1.0"))  # s máximos esperando a los vecinos
+GRADIENTE_CODEC = os.getenv("GRADIENTE_CODEC", "q8")  # f32, q16, q8, topk, delta o "ninguno" (lista JSON)
+GRADIENTE_TOPK = float(os.getenv("GRADIENTE_TOPK", "0.01"))  # fracción de valores que envía topk
+GRADIENTE_REFRESCO = int(os.getenv("GRADIENTE_REFRESCO", "10"))  # cada cuántas rondas delta va completo
+CUERPO_MAX_BYTES = int(os.getenv("CUERPO_MAX_BYTES", str(64 * 1024 * 1024)))  # cuerpo compacto ya descomprimido
 
 def get_mi_url():
-    return f"http://{NOMBRE}:{PUERTO}"
+    return URL_NODO or f"http://{NOMBRE}:{PUERTO}"
+
+class RutaCompacta(APIRoute):
+    """Ruta que, además de JSON, acepta los cuerpos compactos/comprimidos de Libs.codificacion."""
+
+    def get_route_handler(self):
+        original = super().get_route_handler()
+
+        async def manejador(request: Request):
+            tipo = request.headers.get("content-type")
+            compresion = request.headers.get("content-encoding")
+            if codificacion.es_compacto(tipo, compresion):
+                crudo = await request.body()
+                try:
+                    objeto = codificacion.decodificar(crudo, tipo, compresion, maximo=CUERPO_MAX_BYTES)
+                except codificacion.CuerpoDemasiadoGrande as e:
+                    metricas.inc("cuerpos_rechazados_tamano")
+                    raise HTTPException(status_code=413, detail=str(e))
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Cuerpo no decodificable: {e}")
+                metricas.inc("cuerpos_compactos_rx")
+                # FastAPI valida lo que devuelve request.json(): se le entrega ya decodificado
+                cabeceras = [(k, v) for k, v in request.scope["headers"]
+                             if k not in (b"content-type", b"content-encoding")]
+                request = Request({**request.scope, "headers": cabeceras + [(b"content-type", b"application/json")]},
+                                  request.receive)
+                request._body = crudo
+                request._json = objeto
+            return await original(request)
+
+        return manejador
 
 # --- Instancias globales ---
 app = FastAPI(title=f"Nodo {NOMBRE} - SO Descentralizado")
+app.router.route_class = RutaCompacta
 metricas = Metricas()
-_carga = 0
-_lock = threading.Lock()
+series = SeriesMetricas(metricas)  # historia acotada de las métricas (ver /metrics/cluster)
+compresor_gradientes = CompresorGradientes(
+    GRADIENTE_CODEC if GRADIENTE_CODEC != "ninguno" else "f32", ratio_topk=GRADIENTE_TOPK, refresco=GRADIENTE_REFRESCO
+)
+_pool_metricas = ThreadPoolExecutor(max_workers=16, thread_name_prefix="metricas-cluster")
+_carga = ContadorPorHilo()  # tareas en ejecución en este nodo
+if WORKERS > 1:
+    # Las ranuras del host se reparten entre los workers
+    recursos = Recursos(ranuras=max(1, (RANURAS or detectar_cpus()) // WORKERS))
+else:
+    recursos = Recursos(ranuras=RANURAS)
+especulacion = PoliticaEspeculativa(metricas, ESPECULACION, max_extra=ESPECULACION_MAX_EXTRA,
+                                    max_hilos=ESPECULACION_HILOS or max(8, 2 * recursos.ranuras))
+canceladas = RegistroCancelaciones()
+dedup = TablaDeduplicacion(max_entradas=DEDUP_MAX, ttl=DEDUP_TTL)
+registro = RegistroResultados()
+trazador = Trazador(NOMBRE, muestreo=TRAZAS_MUESTREO, capacidad=TRAZAS_CAPACIDAD)
+perfilador = Perfilador(max_segundos=PERFIL_MAX_SEGUNDOS)
+host: AgenteHost = None  # solo en modo multiproceso (WORKERS > 1)
+ejecutor_computo: ProcessPoolExecutor = None  # solo con EJECUTOR_PROCESOS > 0
+segmentos = None  # PoolSegmentos de memoria compartida, junto con ejecutor_computo
+tipos = RegistroTipos(metricas)  # tipos de tarea que sabe ejecutar este nodo (ver más abajo)
+_caliente = threading.Event()  # motores cargados: el nodo está listo para tareas sin latencia de carga
+_kv_sincronizado = threading.Event()
+
+def carga_del_nodo() -> int:
+    return host.agregados()["carga"] if host else _carga.valor()
+
+def recursos_del_nodo() -> Dict[str, Any]:
+    inst = recursos.instantanea()
+    if host:
+        agregados = host.agregados()
+        inst.update(ranuras=agregados["ranuras"], ranuras_libres=agregados["ranuras_libres"],
+                    cola=agregados["cola"])
+    return inst
 
 def obtener_metricas_locales():
-    with _lock:
-        carga_actual = _carga
-    return {"carga": carga_actual}
+    # "tipos" en el latido: el planificador de los vecinos solo nos envía tipos que sabemos ejecutar
+    return {"carga": carga_del_nodo(), **recursos_del_nodo(), "tipos": tipos.nombres(),
+            "codificacion": codificacion.capacidades(), "gradientes": gradientes.disponibles()}
 
-kv = KVReplicado(get_mi_url())
+if KV_MODO == "particionado":
+    kv = KVParticionado(
+        get_mi_url(),
+        obtener_vecinos_fn=lambda: desc.lista_vecinos_con_metricas(),
+        metricas=metricas,
+        replicas=KV_REPLICAS,
+        quorum_lectura=KV_QUORUM_LECTURA,
+        quorum_escritura=KV_QUORUM_ESCRITURA,
+        vnodos=KV_VNODOS,
+        umbral_compresion=COMPRESION_UMBRAL,
+        gracia_lapida=KV_GRACIA_LAPIDA,
+    )
+else:
+    kv = KVReplicado(get_mi_url(), metricas=metricas, umbral_compresion=COMPRESION_UMBRAL,
+                     gracia_lapida=KV_GRACIA_LAPIDA)
+modelos = RegistroModelos(kv, metricas=metricas, max_cache=MODELOS_CACHE, revalidar=MODELOS_REVALIDAR)
+salud = SaludVecinos(metricas, umbral_errores=SALUD_UMBRAL_ERRORES, enfriamiento=SALUD_ENFRIAMIENTO)
 planificador = PlanificadorLocal(
     mi_nombre=NOMBRE,
     mi_url=get_mi_url(),
     metricas=metricas,
-    obtener_carga_fn=lambda: _carga
-)
-desc = Descubridor(
-    grupo=GRUPO,
-    puerto=PGRUPO,
-    nombre=NOMBRE,
-    servicio_url=get_mi_url(),
-    obtener_metricas_fn=obtener_metricas_locales,
-    intervalo=1.5
+    obtener_carga_fn=carga_del_nodo,
+    obtener_recursos_fn=recursos_del_nodo,
+    salud=salud,
 )
-def enviar_mensaje(destino_url: str, tipo: str, payload: Dict[str, Any], msg_id: str = None):
-    """Envía un mensaje a otro nodo de forma asíncrona."""
+if DESCUBRIMIENTO_MODO == "loopback":
+    desc = DescubridorLoopback(
+        puerto=PGRUPO,
+        pares=DESCUBRIMIENTO_PARES,
+        nombre=NOMBRE,
+        servicio_url=get_mi_url(),
+        obtener_metricas_fn=obtener_metricas_locales,
+        intervalo=1.5,
+        al_expirar=salud.olvidar
+    )
+else:
+    desc = Descubridor(
+        grupo=GRUPO,
+        puerto=PGRUPO,
+        nombre=NOMBRE,
+        servicio_url=get_mi_url(),
+        obtener_metricas_fn=obtener_metricas_locales,
+        intervalo=1.5,
+        al_expirar=salud.olvidar
+    )
+def _capacidades_de(url: str):
+    """Formatos que anuncia un vecino en su latido (None: versión anterior, solo JSON)."""
+    for v in desc.lista_vecinos_con_metricas():
+        if v.get("url") == url:
+            return v.get("codificacion")
+    return None
+
+def enviar_mensaje(destino_url: str, tipo: str, payload: Dict[str, Any], msg_id: str = None,
+                   capacidades: Dict[str, List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Envía un mensaje a otro nodo; devuelve su respuesta o None si no llegó."""
     if msg_id is None:
         msg_id = str(uuid.uuid4())
     mensaje = Mensaje(
@@ -61,13 +244,49 @@ def enviar_mensaje(destino_url: str, tipo: str, payload: Dict[str, Any], msg_id:
         tipo=tipo,
         origen=get_mi_url(),
         destino=destino_url.split("/")[-1].split(":")[0],  # extraer nombre del host
-        payload=payload
+        payload=payload,
+        traza=trazador.traceparent()
     )
     try:
-        httpx.post(f"{destino_url}/mensajes", json=mensaje.dict(), timeout=2.0)
+        cuerpo, cabeceras = codificacion.codificar(mensaje.dict(), capacidades, COMPRESION_UMBRAL)
+        metricas.inc("bytes_mensajes_tx", len(cuerpo))
+        r = httpx.post(f"{destino_url}/mensajes", content=cuerpo, headers=cabeceras, timeout=2.0)
+        return r.json()
     except Exception as e:
         metricas.inc("mensajes_fallidos")
         # Opcional: guardar en cola para reenvío
+        return None
+
+def _cancelar_remoto(url: str, tarea_id: str):
+    """Pide a otro nodo que descarte una tarea (fire-and-forget)."""
+    def _enviar():
+        try:
+            httpx.post(f"{url}/tareas/{tarea_id}/cancelar", timeout=2.0)
+        except Exception:
+            pass
+    threading.Thread(target=_enviar, daemon=True).start()
+
+def _post_tarea(url: str, t: "Tarea", timeout: float, traza: str = None):
+    """Reenvía una tarea a otro nodo contando los bytes enviados."""
+    cuerpo, cabeceras = codificacion.codificar(t.model_dump(), _capacidades_de(url), COMPRESION_UMBRAL)
+    metricas.inc("bytes_reenvio_tx", len(cuerpo))
+    if traza:
+        cabeceras["traceparent"] = traza
+    try:
+        r = httpx.post(f"{url}/tareas/ejecutar", content=cuerpo, headers=cabeceras, timeout=timeout)
+    except Exception:
+        salud.fallo(url)
+        raise
+    # La duración incluye el cómputo remoto: cuenta como éxito/fallo, no como RTT
+    if r.is_server_error:
+        salud.fallo(url)
+    else:
+        salud.exito(url)
+    return r
+
+def _preferir_sanos(vecinos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Para los reenvíos de recuperación: los vecinos con el circuito cerrado, si queda alguno."""
+    return [v for v in vecinos if salud.disponible(v["url"])] or vecinos
 
 # --- Sondeo activo de vecinos (tolerancia a fallos) ---
 def monitorear_vecinos():
@@ -76,12 +295,18 @@ def monitorear_vecinos():
         for v in vecinos:
             if v["url"] == get_mi_url():
                 continue
+            t0 = time.perf_counter()
             try:
                 r = httpx.get(f"{v['url']}/estado", timeout=1.0)
-                if r.status_code != 200:
-                    pass  # opcional: lista negra
             except Exception:
-                pass  # nodo no responde → se ignorará en planificación
+                salud.fallo(v["url"])  # no responde: el planificador lo salta con el circuito abierto
+                continue
+            if r.status_code == 200:
+                salud.exito(v["url"], rtt_ms=(time.perf_counter() - t0) * 1000.0)
+            else:
+                salud.fallo(v["url"])
+        if KV_MODO == "particionado":
+            kv.replicar_a_vecinos(vecinos)  # anti-entropía periódica, pistas y traspasos
         time.sleep(2.0)
 
 # --- Modelos Pydantic ---
@@ -89,99 +314,579 @@ class Tarea(BaseModel):
     id: str
     tipo: str
     payload: Dict[str, Any]
+    recursos: Dict[str, float] = {}  # ej: {"cpu": 2, "mem_mb": 512}
+
+class TareaTrabajo(Tarea):
+    depende_de: List[str] = []
+
+class Trabajo(BaseModel):
+    id: str
+    tareas: List[TareaTrabajo]
+
+class Prediccion(BaseModel):
+    modelo_id: str
+    X: List[Any]  # filas (o una sola fila) sin el término independiente
+    version: Optional[int] = None  # None: la última publicada
 
 class Resultado(BaseModel):
     tarea_id: str
     estado: str
     detalle: Dict[str, Any] = {}
 
-def calcular_gradiente(modelo, datos):
-    # Simulación: devuelve un vector de ceros del mismo tamaño que el modelo
-    import numpy as np
-    return np.zeros_like(modelo).tolist()
 def _ejecutar_federado(payload: Dict[str, Any]):
     # 1. Entrenar localmente
-    gradiente = calcular_gradiente(payload["modelo"], payload["datos"])
+    gradiente = tipos.motor("federado").calcular_gradiente(payload["modelo"], payload["datos"])
 
     # 2. Enviar gradiente a un nodo coordinador (o a todos)
     vecinos = desc.lista_vecinos_con_metricas()
     for v in vecinos:
         if "coordinador" in v["nombre"]:  # convención
-            enviar_mensaje(v["url"], "gradiente", {"grad": gradiente})
+            _enviar_gradiente(v, gradiente)
 
     return {"estado": "gradiente_enviado"}
+def _enviar_gradiente(vecino: Dict[str, Any], gradiente: List[float]):
+    """Comprimido con GRADIENTE_CODEC si el vecino lo anuncia; si no, como lista."""
+    codec = compresor_gradientes.codec
+    if GRADIENTE_CODEC == "ninguno" or codec not in (vecino.get("gradientes") or ()):
+        payload = {"grad": gradiente}
+    else:
+        payload = {"grad_cod": compresor_gradientes.comprimir(vecino["url"], gradiente)}
+        metricas.inc("gradientes_comprimidos")
+    respuesta = enviar_mensaje(vecino["url"], "gradiente", payload, capacidades=vecino.get("codificacion"))
+    if not (respuesta or {}).get("ok") and "grad_cod" in payload:
+        compresor_gradientes.olvidar(vecino["url"])  # delta: la siguiente ronda va completa
+
 # --- Ejecución local de tareas ---
 def _ejecutar_regresion(payload: Dict[str, Any]):
-    X = np.array(payload["X"], dtype=float)
-    y = np.array(payload["y"], dtype=float)
-    X_test = np.array(payload.get("X_test", X[:2]), dtype=float)
-    Xb = np.c_[np.ones((X.shape[0], 1)), X]
-    w = np.linalg.pinv(Xb.T @ Xb) @ Xb.T @ y
-    Xb_test = np.c_[np.ones((X_test.shape[0], 1)), X_test]
-    y_pred = Xb_test @ w
-    return {"coeficientes": w.tolist(), "predicciones": y_pred.tolist()}
+    computo = tipos.motor("regresion_lineal")
+    X_test = payload.get("X_test", payload["X"][:2])
+    if ejecutor_computo is not None and _coste_regresion(payload) >= MEMCOMP_UMBRAL:
+        # Los arrays se escriben una vez en memoria compartida; al proceso solo viaja el descriptor
+        from Libs.memoria_compartida import empaquetar
+        seg, descriptor = empaquetar(segmentos, {"X": payload["X"], "y": payload["y"], "X_test": X_test})
+        try:
+            metricas.inc("tareas_memoria_compartida")
+            res = ejecutor_computo.submit(computo.regresion_lineal_compartida, descriptor).result()
+        finally:
+            segmentos.soltar(seg)
+    else:
+        res = computo.regresion_lineal_json(payload["X"], payload["y"], X_test)
+    if payload.get("modelo_id"):
+        # Queda registrado para /predecir: las predicciones nuevas no vuelven a ajustar
+        res["modelo"] = modelos.publicar(payload["modelo_id"], res["coeficientes"])
+    return res
+
+def _coste_regresion(payload: Dict[str, Any]) -> float:
+    X = payload["X"]
+    if not isinstance(X, list) or not X:
+        return 0.0
+    # Filas escalares (X 1-D) cuentan como una sola variable
+    return len(X) * (len(X[0]) if isinstance(X[0], list) else 1)
+
+# Tipos incorporados; los de otros paquetes llegan por entry points al arrancar
+tipos.registrar(TipoTarea(
+    "regresion_lineal", _ejecutar_regresion, modulo="Libs.computo",
+    requeridos={"X": list, "y": list}, opcionales={"X_test": list, "modelo_id": str},
+    recursos={"cpu": 1}, agrupable=True, estimar_coste=_coste_regresion,
+))
+tipos.registrar(TipoTarea(
+    "federado", _ejecutar_federado, modulo="Libs.computo",
+    requeridos={"modelo": list, "datos": object}, recursos={"cpu": 1},
+))
+
+def _validar_tipo(tipo: str, payload: Dict[str, Any]):
+    """Rechaza en la entrada los tipos no soportados o con payload inválido (antes de planificar)."""
+    error = tipos.validar(tipo, payload)
+    if error is not None:
+        metricas.inc("tareas_tipo_rechazadas")
+        raise HTTPException(status_code=400, detail=error)
+
+def _obtener_salida(tarea_id: str, url: str = None):
+    """Salida de una tarea previa: local si está aquí; si no, se trae una vez de su nodo y se guarda."""
+    salida = dedup.resultado(tarea_id)
+    if salida is not None:
+        return salida
+    if not url or url == get_mi_url():
+        # Del mismo nodo pero quizá la ejecutó otro worker del host
+        salida = host.preguntar("dedup.resultado", tarea_id) if host else None
+        if salida is None:
+            raise RuntimeError(f"Salida de {tarea_id} no disponible")
+        dedup.completar(tarea_id, salida)
+        return salida
+    r = httpx.get(f"{url}/tareas/{tarea_id}/resultado", timeout=10.0)
+    r.raise_for_status()
+    salida = r.json()["resultado"]
+    # La salida queda colocada en el nodo que la consume
+    dedup.completar(tarea_id, salida)
+    metricas.inc("salidas_remotas_traidas")
+    return salida
 
 def _ejecutar_tarea_local(t: Tarea):
-    global _carga
+    solicitud = solicitud_de_tarea(t)
+    with trazador.span("admision", cpu=solicitud["cpu"]):
+        admitida = recursos.reservar(solicitud, timeout=ADMISION_TIMEOUT)
+    if not admitida:
+        metricas.inc("tareas_rechazadas_admision")
+        raise RuntimeError("Sin ranuras libres para la tarea")
+    if canceladas.esta_cancelada(t.id):
+        # Cancelada mientras esperaba ranura: no gastar cómputo
+        recursos.liberar(solicitud)
+        return {"ok": False, "resultado": {}}
     t0 = time.time()
-    with _lock:
-        _carga += 1
+    _carga.sumar()
+    metricas.inc("tareas_ejecutadas")
     try:
-        if t.tipo == "regresion_lineal":
-            res = _ejecutar_regresion(t.payload)
-        else:
-            res = {"mensaje": f"Tipo de tarea no reconocido: {t.tipo}"}
+        with trazador.span("computo", tipo=t.tipo):
+            payload = resolver_referencias(t.payload, _obtener_salida) if t.payload.get("_refs") else t.payload
+            res = tipos.ejecutar(t.tipo, payload)
         return {"ok": True, "resultado": res}
     finally:
         dur = (time.time() - t0) * 1000.0
         metricas.observe("duracion_ms", dur)
-        with _lock:
-            _carga -= 1
+        _carga.restar()
+        recursos.liberar(solicitud)
 
 # --- Constantes ---
 MAX_REINTENTOS = 2
 
+# --- Idempotencia ---
+def _clave_lease(tarea_id: str) -> str:
+    return f"lease_{tarea_id}"
+
+def _dueno_lease(tarea_id: str):
+    lease = kv.get(_clave_lease(tarea_id))
+    return lease.get("dueno") if isinstance(lease, dict) else None
+
+def _respuesta_duplicada(t: Tarea):
+    """Si la tarea ya se ejecutó o la ejecuta otro nodo, devuelve la respuesta a dar; si no, None."""
+    previo = dedup.resultado(t.id)
+    if previo is not None:
+        metricas.inc("tareas_duplicadas")
+        return {"estado": "COMPLETADA", "resultado": previo}
+    if t.payload.get("_especulativa"):
+        # La copia especulativa existe porque el dueño del lease tarda: no responderle con el lease
+        return None
+    lease = kv.get(_clave_lease(t.id))
+    if not isinstance(lease, dict) or lease.get("dueno") in (None, get_mi_url()):
+        return None
+    if lease.get("estado") == "COMPLETADA":
+        try:
+            r = httpx.get(f"{lease['dueno']}/tareas/{t.id}/resultado", timeout=2.0)
+            if r.status_code == 200:
+                metricas.inc("tareas_duplicadas")
+                return {"estado": "COMPLETADA", "resultado": r.json()["resultado"]}
+        except Exception:
+            pass
+    elif lease.get("expira", 0) > time.time():
+        metricas.inc("tareas_duplicadas")
+        return {"estado": "EN_EJECUCION", "en": lease["dueno"]}
+    return None
+
+def _estado_final_tarea(tarea_id: str):
+    """COMPLETADA/FALLIDA si la tarea terminó (según sus eventos o su lease), o None."""
+    ultimo = registro.ultimo(tarea_id)
+    if ultimo is not None and ultimo["tipo"] in ev.TERMINALES:
+        return "COMPLETADA" if ultimo["tipo"] == ev.COMPLETADO else "FALLIDA"
+    lease = kv.get(_clave_lease(tarea_id))
+    if isinstance(lease, dict) and lease.get("estado") == "COMPLETADA":
+        return "COMPLETADA"
+    return None
+
+# --- Modo multiproceso ---
+METODOS_KV = ("get", "put", "borrar", "adquirir_lease", "liberar_lease", "estado_completo",
+              "fusionar_desde_vecino", "registro", "leer_registro", "diferencias",
+              "ejecutar_coordinado")
+_kv_local, _desc_local = kv, desc  # el líder usa estos; los demás workers, proxies por IPC
+
+def _arrancar_kv():
+    """Copia el KV de un vecino en cuanto se descubre uno, en lugar de esperar al gossip."""
+    if KV_MODO == "particionado":
+        # Cada vecino solo tiene su parte: las claves de este nodo llegan por anti-entropía
+        _kv_sincronizado.set()
+        return
+    limite = time.time() + KV_ARRANQUE_ESPERA
+    while time.time() < limite:
+        vecinos = [v for v in desc.lista_vecinos_con_metricas() if v["url"] != get_mi_url()]
+        random.shuffle(vecinos)
+        for v in vecinos:
+            try:
+                r = httpx.get(f"{v['url']}/kv/estado_completo", timeout=2.0)
+                r.raise_for_status()
+                estado_remoto = r.json()
+            except Exception:
+                continue
+            kv.fusionar_desde_vecino(estado_remoto)
+            metricas.inc("kv_arranque_claves", len(estado_remoto))
+            _kv_sincronizado.set()
+            return
+        time.sleep(0.1)
+    _kv_sincronizado.set()  # sin vecinos: el KV local es el de partida
+
+def _iniciar_agente_red():
+    desc.iniciar()
+    if KV_MODO != "particionado":
+        kv.iniciar_gossip(lambda: desc.lista_vecinos_con_metricas(), intervalo=GOSSIP_INTERVALO,
+                          fanout=GOSSIP_FANOUT, en_vuelo_max=GOSSIP_EN_VUELO)
+    threading.Thread(target=monitorear_vecinos, daemon=True, name="monitor_vecinos").start()
+    threading.Thread(target=_arrancar_kv, daemon=True, name="kv-arranque").start()
+    CompactadorHistorial(kv, _estado_final_tarea, metricas=metricas, ttl=HISTORIAL_TTL,
+                         intervalo=KV_COMPACTAR_INTERVALO,
+                         archivo=ArchivoHistorial(KV_ARCHIVO) if KV_ARCHIVO else None,
+                         ttl_pendiente=HISTORIAL_TTL_PENDIENTE,
+                         es_responsable=_responsable_historial).iniciar()
+
+def _responsable_historial(clave: str) -> bool:
+    """Un solo nodo reescribe cada clave compartida: su primera réplica o, replicado, la URL menor."""
+    if KV_MODO == "particionado":
+        return kv.replicas_de(clave)[0] == get_mi_url()
+    return get_mi_url() <= min((v["url"] for v in desc.lista_vecinos_con_metricas()), default=get_mi_url())
+
+def _calentar():
+    """Carga motores y dependencias pesadas después de anunciarse y de abrir el puerto."""
+    t0 = time.perf_counter()
+    tipos.calentar()
+    httpx.Client  # fuerza la importación de httpx
+    # Primer uso de las rutas de validación/serialización de los modelos más frecuentes
+    Tarea.model_validate_json('{"id": "_", "tipo": "_", "payload": {}}').model_dump_json()
+    Resultado.model_validate({"tarea_id": "_", "estado": "_"}).model_dump_json()
+    metricas.observe("calentamiento_ms", (time.perf_counter() - t0) * 1000.0)
+    _caliente.set()
+
+def _operaciones_lider() -> Dict[str, Any]:
+    """Operaciones que el líder sirve por IPC; solo los métodos que tiene el KV del modo activo."""
+    operaciones = {f"kv.{m}": getattr(_kv_local, m) for m in METODOS_KV if hasattr(_kv_local, m)}
+    operaciones["desc.lista_vecinos_con_metricas"] = _desc_local.lista_vecinos_con_metricas
+    return operaciones
+
+def _asumir_liderazgo():
+    """Este worker pasa a ser el agente de descubrimiento/gossip y el dueño del KV del host."""
+    global kv, desc
+    kv, desc = _kv_local, _desc_local
+    modelos.kv = kv
+    ServidorIPC(host.ruta_lider, _operaciones_lider()).iniciar()
+    _iniciar_agente_red()
+
+def _vigilar_lider():
+    # Si el líder muere se libera su flock y otro worker toma el relevo (el KV se rehace por gossip)
+    while not host.intentar_liderazgo():
+        time.sleep(1.0)
+    metricas.inc("relevos_lider")
+    _asumir_liderazgo()
+
+def _publicar_estado_worker():
+    while True:
+        inst = recursos.instantanea()
+        host.publicar({"carga": _carga.valor(), "ranuras": inst["ranuras"],
+                       "ranuras_libres": inst["ranuras_libres"], "cola": inst["cola"]})
+        time.sleep(0.1)
+
+def _cancelar_local(tarea_id: str):
+    # Propagar la cancelación por la cadena de reenvíos (el principal y su copia especulativa)
+    for url in canceladas.cancelar(tarea_id):
+        _cancelar_remoto(url, tarea_id)
+
+def _iniciar_multiproceso():
+    global host, kv, desc
+    host = AgenteHost(HOST_DIR, WORKERS)
+    ServidorIPC(host.ruta_worker(host.indice), {
+        "metricas.instantanea": metricas.instantanea,
+        "series.exportar": series.exportar,
+        "registro.publicar": lambda clave, tipo, datos: registro.publicar(clave, tipo, datos, difundir=False),
+        "dedup.resultado": dedup.resultado,
+        "tareas.cancelar": _cancelar_local,
+    }).iniciar()
+    registro.difusor = lambda clave, tipo, datos: host.difundir("registro.publicar", clave, tipo, datos)
+    threading.Thread(target=_publicar_estado_worker, daemon=True, name="host-estado").start()
+    if host.intentar_liderazgo():
+        _asumir_liderazgo()
+        return
+    cliente = ClienteIPC(host.ruta_lider)
+    kv = ProxyIPC(cliente, "kv", METODOS_KV)
+    modelos.kv = kv
+    desc = ProxyIPC(cliente, "desc", ("lista_vecinos_con_metricas",))
+    threading.Thread(target=_vigilar_lider, daemon=True, name="host-vigilante").start()
+
 # --- Endpoints ---
 @app.on_event("startup")
 def inicio():
-    desc.iniciar()
-    threading.Thread(target=monitorear_vecinos, daemon=True).start()
+    global ejecutor_computo, segmentos
+    tipos.cargar_entry_points()  # antes de anunciarse: el latido ya lleva los tipos completos
+    series.iniciar()
+    # Primero anunciarse y aceptar tráfico de control; los motores se calientan en segundo plano
+    if WORKERS > 1:
+        _iniciar_multiproceso()
+    else:
+        _iniciar_agente_red()
+    threading.Thread(target=_calentar, daemon=True, name="calentamiento").start()
+    if EJECUTOR_PROCESOS > 0:
+        from Libs.memoria_compartida import PoolSegmentos
+        segmentos = PoolSegmentos(max_libres=MEMCOMP_SEGMENTOS_LIBRES)
+        # forkserver: los procesos no heredan los hilos ni los sockets del servidor
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["Libs.computo"])
+        ejecutor_computo = ProcessPoolExecutor(max_workers=EJECUTOR_PROCESOS, mp_context=ctx)
+
+@app.on_event("shutdown")
+def fin():
+    if ejecutor_computo is not None:
+        ejecutor_computo.shutdown(wait=False, cancel_futures=True)
+    if segmentos is not None:
+        segmentos.cerrar()
+
+@app.get("/salud/vivo")
+def salud_vivo():
+    """El proceso responde (liveness): no implica que los motores estén cargados."""
+    return {"vivo": True}
+
+@app.get("/salud/listo")
+def salud_listo():
+    """Readiness: 200 cuando los motores están calientes; 503 mientras se cargan."""
+    estado = {
+        "listo": _caliente.is_set(),
+        "motores": tipos.calientes(),
+        "kv_sincronizado": _kv_sincronizado.is_set(),
+    }
+    if not estado["listo"]:
+        raise HTTPException(status_code=503, detail=estado)
+    return estado
 
 @app.get("/metrics")
 def metrics():
-    return metricas.exportar_texto()
+    if host:
+        # Un solo nodo lógico: se suman las métricas de todos los workers
+        otras = host.recolectar("metricas.instantanea")
+        inst = fusionar_instantaneas([metricas.instantanea()] + otras)
+        texto = texto_de(inst) + f"\n# TYPE workers_vivos gauge\nworkers_vivos {1 + len(otras)}"
+    else:
+        texto = metricas.exportar_texto()
+    return texto + "\n" + salud.exportar_texto() + "\n" + exportar_esperas_texto()
+
+@app.get("/metrics/series")
+def metrics_series(resolucion: float = 1.0, ventana: float = 300.0):
+    """Series de este nodo (todos sus workers) en formato sumable."""
+    exportaciones = [series.exportar(resolucion, ventana)]
+    if host:
+        exportaciones += host.recolectar("series.exportar", resolucion, ventana)
+    return ts.fusionar(exportaciones)
+
+def _series_de(url: str, resolucion: float, ventana: float) -> Dict[str, Any]:
+    r = httpx.get(f"{url}/metrics/series", params={"resolucion": resolucion, "ventana": ventana},
+                  timeout=METRICAS_CLUSTER_PLAZO)
+    r.raise_for_status()
+    return r.json()
+
+@app.get("/metrics/cluster")
+def metrics_cluster(resolucion: float = 1.0, ventana: float = 300.0):
+    """Ritmos y latencias de todo el clúster: consulta a los vecinos en paralelo con un plazo."""
+    vecinos = [v["url"] for v in desc.lista_vecinos_con_metricas() if v["url"] != get_mi_url()]
+    futuros = {_pool_metricas.submit(_series_de, u, resolucion, ventana): u for u in vecinos}
+    exportaciones = [metrics_series(resolucion, ventana)]
+    hechos, pendientes = wait(list(futuros), timeout=METRICAS_CLUSTER_PLAZO)
+    sin_respuesta = [futuros[f] for f in pendientes]
+    for f in hechos:
+        try:
+            exportaciones.append(f.result())
+        except Exception:
+            sin_respuesta.append(futuros[f])
+    for f in pendientes:
+        f.cancel()
+    return {
+        "nodos": 1 + len(vecinos) - len(sin_respuesta),
+        "sin_respuesta": sorted(sin_respuesta),
+        **ts.resumir(ts.fusionar(exportaciones)),
+    }
 
 @app.get("/estado")
 def estado():
-    with _lock:
-        carga = _carga
     return {
         "nombre": NOMBRE,
         "url": get_mi_url(),
-        "carga": carga,
+        "carga": carga_del_nodo(),
+        **recursos_del_nodo(),
     }
 
+@app.get("/tipos")
+def tipos_soportados():
+    return tipos.describir()
+
 @app.post("/kv/sync")
-async def sync_kv(estado_remoto: Dict[str, Dict[str, Any]]):
+def sync_kv(estado_remoto: Dict[str, Dict[str, Any]]):
     kv.fusionar_desde_vecino(estado_remoto)
     return {"ok": True}
 
 @app.get("/kv/estado_completo")
-async def get_kv_estado():
+def get_kv_estado():
     return kv.estado_completo()
 
+@app.get("/kv/registro")
+def get_kv_registro(clave: str):
+    """Registro local de una clave (lecturas con quórum del modo particionado)."""
+    return kv.registro(clave)
+
+@app.delete("/kv/registro")
+def borrar_kv_registro(clave: str):
+    """Borra una clave en todo el clúster: la lápida se difunde como cualquier escritura."""
+    return {"version": kv.borrar(clave)}
+
+@app.post("/kv/digest")
+def digest_kv(digesto: Dict[str, int]):
+    """Anti-entropía: qué claves del resumen {clave: versión} le faltan o tiene atrasadas este nodo."""
+    return {"faltan": kv.diferencias(digesto)}
+
+@app.post("/kv/coordinar")
+def coordinar_kv(peticion: Dict[str, Any]):
+    """Escritura o lease de una clave de la que este nodo es réplica (modo particionado)."""
+    if KV_MODO != "particionado":
+        raise HTTPException(status_code=404, detail="KV no particionado")
+    try:
+        return {"r": kv.ejecutar_coordinado(peticion["op"], peticion.get("args", []), peticion.get("kwargs"))}
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QuorumNoAlcanzado as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 @app.post("/tareas")
-async def submit_tarea(t: Tarea):
+def submit_tarea(t: Tarea):
+    _validar_tipo(t.tipo, t.payload)
     metricas.inc("tareas_recibidas")
-    t_dict = {"id": t.id, "tipo": t.tipo, "payload": t.payload, "estado": "SUBMITIDO"}
-    lista = kv.get("tareas") or []
-    lista.append(t_dict)
-    version = kv.put("tareas", lista)
-    kv.replicar_a_vecinos(desc.lista_vecinos_con_metricas())
+    t_dict = {"id": t.id, "tipo": t.tipo, "payload": t.payload, "estado": "SUBMITIDO", "ts": time.time()}
+    while True:
+        # Escritura condicional: otro worker o nodo que añada a la vez obliga a releer, no se pisa
+        reg = kv.leer_registro("tareas")
+        vigente = reg is not None and not reg.get("borrado") and reg.get("expira", float("inf")) > time.time()
+        lista = list(reg["valor"] or []) if vigente else []
+        lista.append(t_dict)
+        version = kv.put("tareas", lista, si_version=reg["version"] if vigente else 0)
+        if version is not None:
+            break
+        metricas.inc("tareas_conflictos_envio")
+    registro.publicar(t.id, ev.PROGRESO, {"estado": "SUBMITIDO"})
     return {"ok": True, "version": version}
 
+def _publicar_respuesta(tarea_id: str, respuesta: Dict[str, Any]):
+    """Traduce la respuesta de ejecutar_tarea a un evento del flujo de resultados."""
+    estado = respuesta.get("estado")
+    if estado == "COMPLETADA":
+        registro.publicar(tarea_id, ev.COMPLETADO, {"estado": estado, "resultado": respuesta.get("resultado")})
+    elif estado == "FALLIDA":
+        registro.publicar(tarea_id, ev.FALLIDO, {"estado": estado, "error": respuesta.get("error")})
+    elif estado != "CANCELADA":
+        # La copia cancelada no publica: el resultado válido llega por la copia ganadora
+        registro.publicar(tarea_id, ev.PROGRESO, respuesta)
+
+# --- Trabajos (DAG de tareas) ---
+def _despachar_para_trabajo(tarea: Dict[str, Any]) -> Dict[str, Any]:
+    t = Tarea(**tarea)
+    respuesta = ejecutar_tarea(t, None)
+    if respuesta.get("estado") in ("COMPLETADA", "FALLIDA"):
+        return respuesta
+    # Reenviada o en curso en otro nodo: el resultado llega por /resultados
+    evento = registro.esperar_terminal(t.id, TRABAJO_TIMEOUT_TAREA)
+    if evento and evento["tipo"] == ev.COMPLETADO:
+        datos = evento["datos"]
+        return {"estado": "COMPLETADA", "resultado": datos.get("resultado", datos.get("detalle"))}
+    return {"estado": "FALLIDA", "error": "Sin resultado de la tarea"}
+
+def _guardar_trabajo(grafo: GrafoTrabajo):
+    kv.put(f"trabajo_{grafo.id}", grafo.estado())
+
+def _ejecutar_trabajo(grafo: GrafoTrabajo):
+    """Despacha en paralelo las tareas listas hasta que el DAG termina."""
+    with trazador.span("trabajo", trabajo_id=grafo.id, tareas=len(grafo.tareas)):
+        _ejecutar_trabajo_dag(grafo)
+
+def _ejecutar_trabajo_dag(grafo: GrafoTrabajo):
+    finales = {}
+    with ThreadPoolExecutor(max_workers=TRABAJO_PARALELISMO, thread_name_prefix="trabajo") as pool:
+        en_vuelo = {}
+        while True:
+            for tid in grafo.listas():
+                grafo.marcar(tid, dag.EN_EJECUCION)
+                tarea = grafo.tarea_para_despacho(tid, get_mi_url())
+                tarea["payload"]["_traza"] = trazador.traceparent()  # el pool no hereda el contexto
+                en_vuelo[pool.submit(_despachar_para_trabajo, tarea)] = tid
+            _guardar_trabajo(grafo)
+            if not en_vuelo:
+                break
+            hechos, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED)
+            for f in hechos:
+                tid = en_vuelo.pop(f)
+                try:
+                    respuesta = f.result()
+                except Exception as e:
+                    respuesta = {"estado": "FALLIDA", "error": str(e)}
+                res = respuesta.get("resultado")
+                if respuesta.get("estado") != "COMPLETADA":
+                    grafo.marcar(tid, dag.FALLIDA)
+                elif isinstance(res, dict) and "$ref" in res:
+                    grafo.marcar(tid, dag.COMPLETADA, ubicacion=res.get("url"))
+                else:
+                    grafo.marcar(tid, dag.COMPLETADA)
+                    finales[tid] = res
+                registro.publicar(grafo.id, ev.PARCIAL, {
+                    "tarea": tid, "estado": grafo.estados[tid], "resultado": finales.get(tid)
+                })
+    estado = grafo.estado_global()
+    tipo = ev.COMPLETADO if estado == dag.COMPLETADA else ev.FALLIDO
+    registro.publicar(grafo.id, tipo, {"estado": estado, "resultados": finales})
+
+@app.post("/trabajos")
+def submit_trabajo(trabajo: Trabajo):
+    try:
+        grafo = GrafoTrabajo(trabajo.id, [t.model_dump() for t in trabajo.tareas])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for t in trabajo.tareas:
+        _validar_tipo(t.tipo, t.payload)
+    metricas.inc("trabajos_recibidos")
+    _guardar_trabajo(grafo)
+    registro.publicar(trabajo.id, ev.PROGRESO, {"estado": "SUBMITIDO", "tareas": len(grafo.tareas)})
+    threading.Thread(target=_ejecutar_trabajo, args=(grafo,), daemon=True).start()
+    return {"ok": True, "trabajo_id": trabajo.id, "stream": f"/resultados/{trabajo.id}/stream"}
+
+# --- Modelos ---
+@app.post("/predecir")
+def predecir(p: Prediccion):
+    """Predicción con los coeficientes en caché de un modelo registrado (sin reajustar)."""
+    t0 = time.perf_counter()
+    try:
+        version, y = modelos.predecir(p.modelo_id, p.X, p.version)
+    except ModeloDesconocido as e:
+        raise HTTPException(status_code=404, detail=f"Modelo desconocido: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metricas.observe("prediccion_us", (time.perf_counter() - t0) * 1e6)
+    metricas.inc("predicciones", len(y))
+    return {"modelo_id": p.modelo_id, "version": version, "predicciones": y.tolist()}
+
+@app.get("/modelos/{modelo_id}")
+def describir_modelo(modelo_id: str):
+    datos = modelos.describir(modelo_id)
+    if datos is None:
+        raise HTTPException(status_code=404, detail="Modelo desconocido")
+    return datos
+
+@app.get("/trabajos/{trabajo_id}")
+def estado_trabajo(trabajo_id: str):
+    estado = kv.get(f"trabajo_{trabajo_id}")
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo desconocido")
+    return estado
+
 @app.post("/tareas/ejecutar")
 def ejecutar_tarea(t: Tarea, request: Request):
+    padre = request.headers.get("traceparent") if request is not None else None
+    with trazador.span("tarea.ejecutar", padre=padre or t.payload.get("_traza"),
+                       tarea_id=t.id, tipo=t.tipo) as span:
+        if span is not None:
+            span.set("coste", tipos.estimar_coste(t.tipo, t.payload))
+        respuesta = _despachar_tarea(t, request)
+        if span is not None:
+            span.set("estado", respuesta.get("estado"))
+    _publicar_respuesta(t.id, respuesta)
+    return respuesta
+
+def _despachar_tarea(t: Tarea, request: Request):
     reintento = t.payload.get("_reintento", 0)
     origen = t.payload.get("origen") or f"http://{request.client.host}:{request.client.port}"
 
@@ -197,26 +902,90 @@ def ejecutar_tarea(t: Tarea, request: Request):
                 pass
         return {"estado": "FALLIDA", "error": "Máximo de reintentos"}
 
+    if canceladas.esta_cancelada(t.id):
+        return {"estado": "CANCELADA"}
+
+    duplicada = _respuesta_duplicada(t)
+    if duplicada is not None:
+        return duplicada
+
+    # Antes de planificar: un tipo que este nodo no conoce no debe viajar ni reintentarse
+    _validar_tipo(t.tipo, t.payload)
+    if not t.recursos:
+        t.recursos = dict(tipos.solicitud_por_defecto(t.tipo))
+
     vecinos = desc.lista_vecinos_con_metricas()
-    decision = planificador.elegir_ejecutor(vecinos, t)
+    with trazador.span("planificar", vecinos=len(vecinos)) as span:
+        decision = planificador.elegir_ejecutor(vecinos, t)
+        if span is not None:
+            span.set("decision", str(decision))
 
     if decision == "YO":
+        previa = dedup.registrar(t.id)
+        if previa is not None:
+            # Misma tarea ya en curso en este nodo: engancharse a esa ejecución
+            metricas.inc("tareas_duplicadas")
+            res = dedup.esperar(previa, timeout=LEASE_TTL)
+            if res is not None:
+                return {"estado": "COMPLETADA", "resultado": res}
+            return {"estado": "EN_EJECUCION", "en": get_mi_url()}
         try:
-            resultado = _ejecutar_tarea_local(t)
+            obtenido, dueno = kv.adquirir_lease(_clave_lease(t.id), get_mi_url(), LEASE_TTL, ttl_registro=DEDUP_TTL)
+        except Exception:
+            # Sin quórum o sin líder por IPC: la entrada de dedup no puede quedarse en curso
+            dedup.abandonar(t.id)
+            raise
+        if not obtenido and not t.payload.get("_especulativa"):
+            dedup.abandonar(t.id)
+            metricas.inc("tareas_duplicadas")
+            return {"estado": "EN_EJECUCION", "en": dueno}
+        # Una copia especulativa sin lease corre igual, pero no toca el lease del dueño
+
+        def _liberar(completada: bool = False):
+            if obtenido:
+                kv.liberar_lease(_clave_lease(t.id), get_mi_url(), completada=completada, ttl_registro=DEDUP_TTL)
+
+        try:
+            registro.publicar(t.id, ev.PROGRESO, {"estado": "EN_EJECUCION", "nodo": get_mi_url()})
+            # Latido: una tarea más larga que LEASE_TTL no debe quedar libre para otro nodo
+            latido = RenovadorLease(lambda: kv.adquirir_lease(_clave_lease(t.id), get_mi_url(), LEASE_TTL,
+                                                              ttl_registro=DEDUP_TTL)[0],
+                                    LEASE_TTL / 3) if obtenido else contextlib.nullcontext()
+            with latido:
+                resultado = _ejecutar_tarea_local(t)
+            if canceladas.esta_cancelada(t.id):
+                # Otra copia ganó la carrera: descartar sin notificar
+                dedup.abandonar(t.id)
+                _liberar()
+                metricas.inc("tareas_canceladas")
+                return {"estado": "CANCELADA"}
+            dedup.completar(t.id, resultado["resultado"])
+            _liberar(completada=True)
+            salida = resultado["resultado"]
+            if t.payload.get("_por_referencia"):
+                # Salida intermedia de un trabajo: se queda aquí y viaja solo la referencia
+                salida = {"$ref": t.id, "url": get_mi_url()}
             if origen != get_mi_url():
-                httpx.post(f"{origen}/resultados", json={
-                    "tarea_id": t.id,
-                    "estado": "COMPLETADA",
-                    "detalle": resultado["resultado"]
-                }, timeout=2.0)
-            return {"estado": "COMPLETADA", "resultado": resultado["resultado"]}
+                try:
+                    with trazador.span("callback", destino=origen):
+                        httpx.post(f"{origen}/resultados", json={
+                            "tarea_id": t.id,
+                            "estado": "COMPLETADA",
+                            "detalle": salida
+                        }, headers={"traceparent": trazador.traceparent() or ""}, timeout=2.0)
+                except Exception:
+                    # La tarea ya está hecha: un callback fallido no debe provocar otra ejecución
+                    metricas.inc("callbacks_fallidos")
+            return {"estado": "COMPLETADA", "resultado": salida}
         except Exception as e:
             metricas.inc("tareas_fallidas")
+            dedup.abandonar(t.id)
+            _liberar()
             t.payload["_reintento"] = reintento + 1
-            otros_vecinos = [v for v in vecinos if v["url"] != get_mi_url()]
+            otros_vecinos = _preferir_sanos([v for v in vecinos if v["url"] != get_mi_url()])
             if otros_vecinos:
                 fallback = random.choice(otros_vecinos)["url"]
-                httpx.post(f"{fallback}/tareas/ejecutar", json=t.dict(), timeout=2.0)
+                _post_tarea(fallback, t, timeout=2.0, traza=trazador.traceparent())
                 return {"estado": "REENVIADO_POR_ERROR", "a": fallback}
             else:
                 return {"estado": "FALLIDA", "error": "No hay nodos alternativos"}
@@ -224,23 +993,45 @@ def ejecutar_tarea(t: Tarea, request: Request):
 
     elif decision and decision.startswith("http"):
 
-        try:
-
-            r = httpx.post(f"{decision}/tareas/ejecutar", json=t.dict(), timeout=10.0)
+        traza = trazador.traceparent()  # los hilos de la especulación no heredan el contexto
 
+        def _reenviar(url):
+            canceladas.registrar_reenvio(t.id, url)
+            # La copia al segundo destino es especulativa: el primero puede tener ya el lease
+            copia = t if url == decision else t.model_copy(update={"payload": {**t.payload, "_especulativa": True}})
+            with trazador.span("reenviar", padre=traza, destino=url):
+                r = _post_tarea(url, copia, timeout=10.0, traza=trazador.traceparent())
             if r.status_code == 200:
-
                 return r.json()
+            raise Exception("Nodo destino rechazó la tarea")
 
-            else:
+        def _cancelar_perdedor(url):
+            # Nunca se cancela al dueño del lease: su resultado es el que queda registrado
+            if _dueno_lease(t.id) != url:
+                _cancelar_remoto(url, t.id)
+
+        # Segundo mejor candidato remoto para un posible duplicado especulativo
+        alternos = [u for u in planificador.clasificar(vecinos, t) if u not in ("YO", decision)]
+
+        try:
 
-                raise Exception("Nodo destino rechazó la tarea")
+            _, respuesta = especulacion.ejecutar(
+                t.tipo, _reenviar, [decision] + alternos[:1],
+                cancelar=_cancelar_perdedor,
+                es_final=lambda r: r.get("estado") == "COMPLETADA"
+            )
+            return respuesta
 
         except Exception:
 
+            # El primer destino puede seguir calculándola: no reenviar si ya tiene dueño o resultado
+            duplicada = _respuesta_duplicada(t)
+            if duplicada is not None:
+                return duplicada
+
             t.payload["_reintento"] = reintento + 1
 
-            otros = [v for v in vecinos if v["url"] != decision]
+            otros = _preferir_sanos([v for v in vecinos if v["url"] != decision])
 
             if otros:
 
@@ -248,7 +1039,7 @@ def ejecutar_tarea(t: Tarea, request: Request):
 
                 try:
 
-                    httpx.post(f"{nuevo}/tareas/ejecutar", json=t.dict(), timeout=2.0)
+                    _post_tarea(nuevo, t, timeout=2.0, traza=trazador.traceparent())
 
                     return {"estado": "REENVIADO_POR_FALLO", "a": nuevo}
 
@@ -279,20 +1070,104 @@ def ejecutar_tarea(t: Tarea, request: Request):
             else:
 
                 return {"estado": "FALLIDA", "error": "No hay nodos disponibles"}
+@app.get("/tareas/{tarea_id}/resultado")
+def resultado_tarea(tarea_id: str):
+    res = dedup.resultado(tarea_id)
+    if res is None and host:
+        res = host.preguntar("dedup.resultado", tarea_id)  # quizá la ejecutó otro worker
+    if res is None:
+        raise HTTPException(status_code=404, detail="Resultado no disponible")
+    return {"tarea_id": tarea_id, "resultado": res}
+
+@app.post("/tareas/{tarea_id}/cancelar")
+def cancelar_tarea(tarea_id: str):
+    _cancelar_local(tarea_id)
+    if host:
+        host.difundir("tareas.cancelar", tarea_id)
+    return {"ok": True}
+
 @app.post("/mensajes")
-async def recibir_mensaje(m: Mensaje):
+def recibir_mensaje(m: Mensaje):
+    # Síncrono: decodificar gradientes y escribir en el KV bloquean; FastAPI lo corre en el threadpool
+    with trazador.span("mensaje.recibir", padre=m.traza, tipo=m.tipo):
+        return _procesar_mensaje(m)
+
+def _procesar_mensaje(m: Mensaje):
     if m.destino != NOMBRE:
         return {"ok": False, "razon": "destino incorrecto"}
     if m.tipo == "ping":
         return {"ok": True, "respuesta": "pong"}
     elif m.tipo == "gradiente":
-        kv.put(f"gradiente_{m.id}", m.payload)
+        payload = m.payload
+        cod = payload.get("grad_cod")
+        if cod is not None:
+            try:
+                g = compresor_gradientes.descomprimir(m.origen, cod)
+            except BaseDeltaPerdida:
+                metricas.inc("gradientes_delta_sin_base")
+                return {"ok": False, "razon": "delta sin base"}
+            except (KeyError, ValueError) as e:
+                return {"ok": False, "razon": f"gradiente inválido: {e}"}
+            if cod["codec"] == "delta":
+                # En el KV solo gradientes autocontenidos: el delta depende de la ronda anterior
+                payload = dict(payload, grad_cod=gradientes.codificar(g, "q16"))
+        kv.put(f"gradiente_{m.id}", payload, ttl=GRADIENTE_TTL)
         return {"ok": True}  # ← debe devolver {"ok": True}
     else:
         return {"ok": False, "razon": "tipo no soportado"}
 
 @app.post("/resultados")
-async def recibir_resultado(res: Resultado):
+async def recibir_resultado(res: Resultado, request: Request):
+    with trazador.span("resultado.recibir", padre=request.headers.get("traceparent"),
+                       tarea_id=res.tarea_id, estado=res.estado):
+        _registrar_resultado(res)
+    return {"ok": True}
+
+def _registrar_resultado(res: Resultado):
     metricas.inc("resultados_recibidos")
-    print(f"[{NOMBRE}] Resultado recibido para tarea {res.tarea_id}: {res.estado}")
-    return {"ok": True}
\ No newline at end of file
+    tipo = {"COMPLETADA": ev.COMPLETADO, "FALLIDA": ev.FALLIDO, "PARCIAL": ev.PARCIAL}.get(res.estado, ev.PROGRESO)
+    registro.publicar(res.tarea_id, tipo, {"estado": res.estado, "detalle": res.detalle})
+
+@app.get("/trazas")
+def exportar_trazas(trace_id: str = None):
+    """Spans del buffer local en JSON compatible con OTLP (opcionalmente de una sola traza)."""
+    return trazador.exportar_otlp(trace_id)
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def perfilar(seconds: float = 5.0, intervalo_ms: float = 10.0):
+    """Perfil por muestreo de todos los hilos en pilas colapsadas (flamegraph.pl / speedscope)."""
+    pilas = perfilador.perfilar(seconds, intervalo=max(intervalo_ms, 1.0) / 1000.0)
+    if pilas is None:
+        raise HTTPException(status_code=409, detail="Ya hay un perfil en curso")
+    return formatear_colapsado(pilas)
+
+@app.get("/resultados/{clave}")
+def ultimo_resultado(clave: str):
+    ultimo = registro.ultimo(clave)
+    if ultimo is None:
+        raise HTTPException(status_code=404, detail="Sin eventos para esa tarea o trabajo")
+    return ultimo
+
+def _formato_sse(evento: Dict[str, Any]) -> str:
+    return f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+@app.get("/resultados/{clave}/stream")
+async def stream_resultados(clave: str, request: Request):
+    """Server-Sent Events con progreso, parciales y finalización de una tarea o trabajo."""
+    desde = int(request.headers.get("last-event-id") or 0)
+
+    async def generar():
+        nonlocal desde
+        while not await request.is_disconnected():
+            eventos, terminado = await registro.esperar(clave, desde, SSE_KEEPALIVE)
+            if not eventos and not terminado:
+                yield ": keepalive\n\n"
+                continue
+            for e in eventos:
+                desde = e["seq"]
+                yield _formato_sse(e)
+            if terminado:
+                return
+
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
\ No newline at end of file
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+from tools.bench_cluster import parsear_metricas, percentil, resumen_balance, generar_tarea, comparar
+
+
+def test_parsear_metricas_texto_y_json():
+    texto = "# TYPE tareas_ejecutadas counter\ntareas_ejecutadas 12.0\nduracion_ms_avg 3.5"
+    assert parsear_metricas(texto) == {"tareas_ejecutadas": 12.0, "duracion_ms_avg": 3.5}
+    # FastAPI serializa el texto de /metrics como cadena JSON
+    assert parsear_metricas(json.dumps(texto))["tareas_ejecutadas"] == 12.0
+
+
+def test_percentil_y_balance():
+    assert percentil([], 50) is None
+    assert percentil(list(range(101)), 99) == 99
+    b = resumen_balance({"a": 10.0, "b": 10.0})
+    assert b["cv"] == 0.0 and b["max_min"] == 1.0
+
+
+def test_generar_tarea_respeta_mezcla_y_tamanos():
+    rng = random.Random(1)
+    t = generar_tarea({"regresion_lineal": 1.0}, [7], rng)
+    assert t["tipo"] == "regresion_lineal"
+    assert len(t["payload"]["X"]) == 7
+
+
+def test_comparar_informes():
+    base = {"throughput_rps": 10.0, "latencia_ms": {"p50": 5.0, "p99": 10.0},
+            "bytes": {"kv_sync": 100.0, "reenvio": 0.0}}
+    actual = {"throughput_rps": 12.0, "latencia_ms": {"p50": 5.0, "p99": 20.0},
+              "bytes": {"kv_sync": 50.0, "reenvio": 10.0}}
+    c = comparar(actual, base)
+    assert c["throughput_rps"] == 0.2
+    assert c["p99_ms"] == 1.0
+    assert c["bytes_kv_sync"] == -0.5
+    assert c["bytes_reenvio"] is None
+
+
+def test_micro_comparar_detecta_regresiones():
+    from tools.bench_micro import comparar as comparar_micro
+    base = {"resultados": {"kv_fusionar[1000]": {"mediana_us": 100.0}, "x[1]": {"mediana_us": 10.0}}}
+    actual = {"resultados": {"kv_fusionar[1000]": {"mediana_us": 180.0}, "x[1]": {"mediana_us": 11.0},
+                             "nuevo[1]": {"mediana_us": 5.0}}}
+    regresiones = comparar_micro(actual, base, tolerancia=0.5)
+    assert [r["caso"] for r in regresiones] == ["kv_fusionar[1000]"]
+
+
+def test_micro_casos_registrados_se_pueden_medir():
+    from tools.bench_micro import CASOS, medir
+    for nombre, (escalas, preparar) in CASOS.items():
+        res = medir(preparar(escalas[0]), presupuesto_s=0.0, max_reps=3)
+        assert res["reps"] == 3 and res["min_us"] <= res["mediana_us"], nombre
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Libs import codificacion
+from Libs.kv import KVReplicado
+
+PAR = {"formatos": ["json-nd"], "compresion": ["deflate"]}
+
+
+def _datos():
+    return {
+        "X": [[i * 0.5, i * 1.5] for i in range(200)],
+        "ids": list(range(40)),
+        "corta": [1.0, 2.0],
+        "mixta": [1, "a", None],
+        "irregular": [[1.0, 2.0], [3.0]],
+        "anidada": [{"v": [float(i) for i in range(20)]}],
+    }
+
+
+def test_ida_y_vuelta_conserva_valores_y_tipos():
+    datos = _datos()
+    cuerpo, cabeceras = codificacion.codificar(datos, PAR)
+    assert cabeceras == {"Content-Type": codificacion.TIPO_JSON_COMPACTO, "Content-Encoding": "deflate"}
+    assert len(cuerpo) < len(json.dumps(datos)) / 2
+    recuperado = codificacion.decodificar(cuerpo, cabeceras["Content-Type"], cabeceras["Content-Encoding"])
+    assert recuperado == datos
+    assert isinstance(recuperado["ids"][0], int)
+
+
+def test_listas_numericas_viajan_como_buffers():
+    empaquetado = codificacion.empaquetar_arrays(_datos(), binario=True)
+    dtype, forma, datos = empaquetado["X"]["$nd"]
+    assert (dtype, forma, len(datos)) == ("<f8", [200, 2], 200 * 2 * 8)
+    assert empaquetado["ids"]["$nd"][0] == "<i8"
+    # Lo pequeño, lo no numérico y lo irregular se deja como está
+    assert empaquetado["corta"] == [1.0, 2.0]
+    assert empaquetado["mixta"] == [1, "a", None]
+    assert empaquetado["irregular"] == [[1.0, 2.0], [3.0]]
+
+
+def test_par_sin_capacidades_recibe_json_sin_comprimir():
+    datos = _datos()
+    cuerpo, cabeceras = codificacion.codificar(datos, None)
+    assert cabeceras == {"Content-Type": "application/json"}
+    assert json.loads(cuerpo) == datos
+    # Por debajo del umbral no se comprime
+    _, cabeceras = codificacion.codificar({"a": 1}, PAR)
+    assert "Content-Encoding" not in cabeceras
+
+
+def test_replicacion_kv_usa_el_formato_del_vecino():
+    kv = KVReplicado("http://yo:8100")
+    kv.put("modelo", [float(i) for i in range(500)])
+    with patch("Libs.kv.httpx.post") as post:
+        kv.replicar_a_vecino("http://v1:8100", PAR)
+        kv.replicar_a_vecino("http://antiguo:8100")
+    compacta, antigua = post.call_args_list
+    assert compacta.kwargs["headers"]["Content-Encoding"] == "deflate"
+    assert antigua.kwargs["headers"] == {"Content-Type": "application/json"}
+    assert len(compacta.kwargs["content"]) < len(antigua.kwargs["content"])
+
+
+def test_endpoints_aceptan_json_y_formatos_compactos():
+    from nodo.main import app, kv
+    cliente = TestClient(app)
+    estado = {"pesos_cod": {"valor": [float(i) for i in range(300)], "version": 3}}
+    cuerpo, cabeceras = codificacion.codificar(estado, PAR)
+    r = cliente.post("/kv/sync", content=cuerpo, headers=cabeceras)
+    assert r.status_code == 200
+    assert kv.get("pesos_cod") == estado["pesos_cod"]["valor"]
+
+    r = cliente.post("/kv/sync", json={"legado_cod": {"valor": 1, "version": 1}})
+    assert r.status_code == 200 and kv.get("legado_cod") == 1
+
+    r = cliente.post("/kv/sync", content=b"basura", headers={"Content-Type": codificacion.TIPO_JSON_COMPACTO,
+                                                              "Content-Encoding": "deflate"})
+    assert r.status_code == 400
+
+
+def test_descompresion_acotada_responde_413(monkeypatch):
+    import zlib
+    import nodo.main as nodo
+    bomba = zlib.compress(b" " * 10_000_000, 9)  # ~10 KB que se expanden a 10 MB
+    with pytest.raises(codificacion.CuerpoDemasiadoGrande):
+        codificacion.decodificar(bomba, codificacion.TIPO_JSON_COMPACTO, "deflate", maximo=1_000_000)
+    assert codificacion.decodificar(zlib.compress(b"[1,2]"), codificacion.TIPO_JSON_COMPACTO,
+                                    "deflate", maximo=5) == [1, 2]
+    monkeypatch.setattr(nodo, "CUERPO_MAX_BYTES", 1_000_000)
+    r = TestClient(nodo.app).post("/kv/sync", content=bomba, headers={
+        "Content-Type": codificacion.TIPO_JSON_COMPACTO, "Content-Encoding": "deflate"})
+    assert r.status_code == 413
@@ -128,4 +128,50 @@ def test_purga_vecinos_expirados():
 
     vecinos = d.lista_vecinos_con_metricas()
     assert len(vecinos) == 1
-    assert vecinos[0]["nombre"] == "nodo_reciente"
\ No newline at end of file
+    assert vecinos[0]["nombre"] == "nodo_reciente"
+
+def test_procesar_anuncio_acepta_latido_con_recursos():
+    """Los latidos con ranuras y memoria deben quedar disponibles para el planificador."""
+    d = Descubridor("239.10.10.10", 50000, "yo", "http://yo:8000", lambda: {})
+    latido = json.dumps({
+        "nombre": "grande",
+        "url": "http://grande:8101",
+        "ts": time.time(),
+        "carga": 3,
+        "ranuras": 64,
+        "ranuras_libres": 61,
+        "cola": 0,
+    }).encode()
+
+    assert d._procesar_anuncio(latido)
+    assert not d._procesar_anuncio(b"no es json")
+    vecinos = d.lista_vecinos_con_metricas()
+    assert vecinos[0]["ranuras"] == 64
+    assert vecinos[0]["ranuras_libres"] == 61
+
+
+def test_descubridor_loopback_intercambia_latidos():
+    """Dos nodos en 127.0.0.1 se descubren sin multidifusión."""
+    import socket
+    from Libs.descubrimiento import DescubridorLoopback
+
+    puertos = []
+    for _ in range(2):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("127.0.0.1", 0))
+        puertos.append(s.getsockname()[1])
+        s.close()
+
+    a = DescubridorLoopback(puertos[0], puertos, "a", "http://127.0.0.1:1", lambda: {"carga": 1}, intervalo=0.05)
+    b = DescubridorLoopback(puertos[1], puertos, "b", "http://127.0.0.1:2", lambda: {"carga": 2}, intervalo=0.05)
+    a.iniciar()
+    b.iniciar()
+    try:
+        limite = time.time() + 3.0
+        while time.time() < limite and not (a.vecinos and b.vecinos):
+            time.sleep(0.05)
+    finally:
+        a.detener()
+        b.detener()
+    assert a.lista_vecinos_con_metricas()[0]["carga"] == 2
+    assert b.lista_vecinos_con_metricas()[0]["nombre"] == "a"
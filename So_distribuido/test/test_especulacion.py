@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import time
+from Libs.metricas import Metricas
+from Libs.especulacion import PoliticaEspeculativa, RegistroCancelaciones
+
+
+def _politica_con_historial(ms=10.0, **kwargs):
+    m = Metricas()
+    for _ in range(50):
+        m.observe("reenvio_ms_lento", ms)
+    p = PoliticaEspeculativa(m, {"*": {"min_ms": 1.0}}, **kwargs)
+    p._fichas = 1.0  # presupuesto disponible para la prueba
+    return m, p
+
+
+def test_percentil_de_metricas():
+    m = Metricas()
+    for v in range(1, 101):
+        m.observe("lat", float(v))
+    assert m.percentil("lat", 50) in (50.0, 51.0)
+    assert m.percentil("lat", 99) >= 99.0
+    assert m.percentil("otra", 50) is None
+
+
+def test_sin_historial_no_se_duplica():
+    p = PoliticaEspeculativa(Metricas())
+    lanzados = []
+    ganador, res = p.ejecutar("nuevo", lambda url: lanzados.append(url) or "ok",
+                              ["http://a", "http://b"], cancelar=lambda url: None)
+    assert ganador == "http://a"
+    assert lanzados == ["http://a"]
+
+
+def test_duplicado_gana_y_el_perdedor_se_cancela():
+    m, p = _politica_con_historial()
+    cancelados = []
+
+    def lanzar(url):
+        if url == "http://lento":
+            time.sleep(0.5)
+        return {"de": url}
+
+    ganador, res = p.ejecutar("lento", lanzar, ["http://lento", "http://rapido"],
+                              cancelar=cancelados.append)
+    assert ganador == "http://rapido"
+    assert res == {"de": "http://rapido"}
+    assert cancelados == ["http://lento"]
+    assert m.contadores["tareas_especuladas"] == 1
+
+
+def test_tipo_deshabilitado_no_especula():
+    m = Metricas()
+    for _ in range(50):
+        m.observe("reenvio_ms_fijo", 1.0)
+    p = PoliticaEspeculativa(m, {"fijo": {"habilitada": False}})
+    assert p.umbral_s("fijo") is None
+
+
+def test_presupuesto_limita_la_carga_extra():
+    m, p = _politica_con_historial(max_extra=0.0)
+    p._fichas = 0.0
+    lanzados = []
+
+    def lanzar(url):
+        lanzados.append(url)
+        time.sleep(0.05)
+        return url
+
+    ganador, _ = p.ejecutar("lento", lanzar, ["http://a", "http://b"], cancelar=lambda url: None)
+    assert ganador == "http://a"
+    assert lanzados == ["http://a"]
+
+
+def test_registro_cancelaciones_devuelve_destinos_del_reenvio():
+    r = RegistroCancelaciones(max_entradas=2)
+    r.registrar_reenvio("t1", "http://b:8101")
+    r.registrar_reenvio("t1", "http://c:8101")  # copia especulativa
+    r.registrar_reenvio("t1", "http://b:8101")
+    assert r.cancelar("t1") == ["http://b:8101", "http://c:8101"]
+    assert r.cancelar("t1") == []
+    assert r.esta_cancelada("t1")
+    r.cancelar("t2")
+    r.cancelar("t3")
+    assert not r.esta_cancelada("t1")  # acotado en tamaño
+
+
+def test_solo_gana_una_respuesta_final():
+    m, p = _politica_con_historial()
+    cancelados = []
+
+    def lanzar(url):
+        if url == "http://lento":
+            time.sleep(0.3)
+            return {"estado": "COMPLETADA", "de": url}
+        return {"estado": "EN_EJECUCION", "en": "http://lento"}
+
+    ganador, res = p.ejecutar("lento", lanzar, ["http://lento", "http://rapido"],
+                              cancelar=cancelados.append,
+                              es_final=lambda r: r["estado"] == "COMPLETADA")
+    assert ganador == "http://lento" and res["de"] == "http://lento"
+    assert cancelados == []
+
+
+def test_sin_duplicado_posible_se_lanza_en_el_mismo_hilo():
+    import threading
+    p = PoliticaEspeculativa(Metricas())
+    hilos = []
+    p.ejecutar("nuevo", lambda url: hilos.append(threading.current_thread()),
+               ["http://a"], cancelar=lambda url: None)
+    assert hilos == [threading.current_thread()]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import threading
+from Libs.estado_nodo import ContadorPorHilo, LocksRayados
+from Libs.kv import KVReplicado
+from Libs.metricas import Metricas
+
+
+def test_contador_suma_celdas_de_varios_hilos():
+    c = ContadorPorHilo()
+
+    def trabajar():
+        for _ in range(1000):
+            c.sumar()
+        c.restar(10)
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert c.valor() == 8 * 990
+
+
+def test_contador_pliega_hilos_terminados():
+    c = ContadorPorHilo()
+    for _ in range(20):
+        h = threading.Thread(target=c.sumar)
+        h.start()
+        h.join()
+    c.sumar()  # el alta de una celda nueva compacta las de hilos muertos
+    assert c.valor() == 21
+    assert len(c._celdas) == 1
+
+
+def test_locks_rayados_estables_por_clave():
+    locks = LocksRayados("prueba", n=4)
+    assert locks.para("a") is locks.para("a")
+    assert len({id(locks.para(f"k{i}")) for i in range(100)}) == 4
+
+
+def test_kv_concurrente_sin_perder_escrituras():
+    kv = KVReplicado("http://yo")
+
+    def escribir(i):
+        for j in range(200):
+            kv.put(f"k{i}_{j}", j)
+        kv.fusionar_desde_vecino({f"r{i}": {"valor": i, "version": 3}})
+
+    hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(8)]
+    for h in hilos:
+        h.start()
+    estado = kv.estado_completo()  # instantánea mientras otros escriben
+    for h in hilos:
+        h.join()
+    assert isinstance(estado, dict)
+    final = kv.estado_completo()
+    assert len(final) == 8 * 201
+    kv.fusionar_desde_vecino({"r0": {"valor": "viejo", "version": 2}})
+    assert kv.get("r0") == 0
+
+
+def test_metricas_concurrentes():
+    m = Metricas()
+
+    def trabajar():
+        for _ in range(1000):
+            m.inc("c")
+            m.observe("d", 2.0)
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert m.contadores["c"] == 4000
+    assert "d_avg 2.0" in m.exportar_texto()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+import time
+from unittest.mock import patch
+
+from Libs import codificacion
+from Libs.gossip import DifusorGossip
+from Libs.kv import KVReplicado
+from Libs.metricas import Metricas
+
+
+class Cluster:
+    """N nodos KVReplicado con su DifusorGossip; las rondas se ejecutan a mano."""
+
+    def __init__(self, n, **opciones):
+        self.urls = [f"http://g{i}:8100" for i in range(n)]
+        self.metricas = Metricas()
+        self.kvs = {u: KVReplicado(u, metricas=self.metricas) for u in self.urls}
+        vecinos = [{"url": u} for u in self.urls]
+        for kv in self.kvs.values():
+            kv.gossip = DifusorGossip(kv, lambda: vecinos, metricas=self.metricas, **opciones)
+        self.bloqueados = set()
+
+    def post(self, url, content, headers, timeout):
+        destino = url[:-len("/kv/sync")]
+        while destino in self.bloqueados:
+            time.sleep(0.01)
+        estado = codificacion.decodificar(content, headers["Content-Type"], headers.get("Content-Encoding"))
+        self.kvs[destino].fusionar_desde_vecino(estado)
+
+    def ronda(self):
+        for kv in self.kvs.values():
+            kv.gossip.ronda()
+        # Esperar a que terminen los envíos de la ronda
+        while any(sum(kv.gossip._en_vuelo.values()) for kv in self.kvs.values()):
+            time.sleep(0.001)
+
+    def convergido(self, clave, valor):
+        return all(kv.get(clave) == valor for kv in self.kvs.values())
+
+
+def test_escritura_llega_a_todo_el_cluster_en_rondas_logaritmicas():
+    cluster = Cluster(32, fanout=3, anti_entropia_cada=0)
+    with patch("Libs.kv.httpx.post", side_effect=cluster.post):
+        cluster.kvs[cluster.urls[0]].put("config", {"v": 1})
+        rondas = 0
+        while not cluster.convergido("config", {"v": 1}):
+            cluster.ronda()
+            rondas += 1
+            assert rondas <= 3 * math.ceil(math.log2(32))
+        # Los rumores se apagan solos
+        for _ in range(10):
+            cluster.ronda()
+    assert all(kv.gossip.pendientes() == 0 for kv in cluster.kvs.values())
+
+
+def test_rafaga_de_escrituras_se_agrupa_sin_crear_hilos():
+    cluster = Cluster(20, fanout=3, anti_entropia_cada=0)
+    origen = cluster.kvs[cluster.urls[0]]
+    # Conjuntos de hilos y no recuentos: los que dejan otros tests pueden terminar entre medias
+    hilos_antes = set(threading.enumerate())
+    with patch("Libs.kv.httpx.post", side_effect=cluster.post) as post:
+        for i in range(1000):
+            origen.put(f"tarea_{i}", i)
+        assert set(threading.enumerate()) - hilos_antes == set()
+        origen.gossip.ronda()
+        while sum(origen.gossip._en_vuelo.values()):
+            time.sleep(0.001)
+    # Una ronda: un mensaje por vecino elegido con las 1000 claves
+    assert post.call_count == 3
+    assert len(set(threading.enumerate()) - hilos_antes) <= 3
+
+
+def test_vecino_lento_no_acumula_envios():
+    cluster = Cluster(2, fanout=1, en_vuelo_max=1, anti_entropia_cada=0)
+    origen = cluster.kvs[cluster.urls[0]]
+    cluster.bloqueados.add(cluster.urls[1])
+    with patch("Libs.kv.httpx.post", side_effect=cluster.post) as post:
+        origen.put("a", 1)
+        origen.gossip.ronda()
+        origen.put("b", 2)
+        origen.gossip.ronda()  # el único vecino sigue con un envío en curso
+        assert cluster.metricas.contadores["gossip_contrapresion"] == 1
+        assert origen.gossip.pendientes() == 2
+        cluster.bloqueados.clear()
+        while sum(origen.gossip._en_vuelo.values()):
+            time.sleep(0.001)
+        origen.gossip.ronda()
+        while sum(origen.gossip._en_vuelo.values()):
+            time.sleep(0.001)
+    assert post.call_count == 2
+    assert cluster.kvs[cluster.urls[1]].get("b") == 2
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import json
+
+import numpy as np
+import pytest
+
+from Libs import gradientes
+from Libs.gradientes import BaseDeltaPerdida, CompresorGradientes
+
+
+def _tam(obj) -> int:
+    return len(json.dumps(obj))
+
+
+@pytest.fixture
+def grad():
+    return np.random.default_rng(0).normal(size=50_000)
+
+
+@pytest.mark.parametrize("codec,reduccion,error_max", [("q16", 7, 1e-4), ("q8", 14, 2e-2)])
+def test_cuantizacion_reduce_bytes_con_error_acotado(grad, codec, reduccion, error_max):
+    plano = _tam({"grad": grad.tolist()})
+    cod = gradientes.codificar(grad, codec)
+    assert _tam({"grad_cod": cod}) * reduccion < plano
+    rango = grad.max() - grad.min()
+    assert np.abs(gradientes.decodificar(cod) - grad).max() <= rango * error_max
+
+
+def test_topk_con_residuo_no_pierde_nada(grad):
+    emisor, receptor = CompresorGradientes("topk", ratio_topk=0.01), CompresorGradientes()
+    cod = emisor.comprimir("http://coord", grad)
+    assert _tam({"grad_cod": cod}) * 50 < _tam({"grad": grad.tolist()})
+    recibido = receptor.descomprimir("http://n1", cod)
+    assert np.count_nonzero(recibido) == 500
+    # Enviado + residuo pendiente == gradiente original (error feedback)
+    assert np.allclose(recibido + emisor._residuos["http://coord"], grad, atol=1e-6)
+    # Sin gradientes nuevos, las rondas siguientes van vaciando el residuo
+    total = recibido.copy()
+    for _ in range(99):
+        total += receptor.descomprimir("http://n1", emisor.comprimir("http://coord", np.zeros_like(grad)))
+    assert np.allclose(total, grad, atol=1e-5)
+
+
+def test_delta_reconstruye_entre_rondas_y_detecta_base_perdida(grad):
+    emisor, receptor = CompresorGradientes("delta", refresco=10), CompresorGradientes()
+    actual = grad
+    for ronda in range(5):
+        cod = emisor.comprimir("http://coord", actual)
+        g = receptor.descomprimir("http://n1", cod)
+        assert cod["completo"] == (ronda == 0)
+        assert np.abs(g - actual).max() < 1e-2
+        actual = actual + np.random.default_rng(ronda).normal(scale=0.01, size=grad.size)
+    # Un receptor que no vio las rondas anteriores lo rechaza; el emisor vuelve a enviar completo
+    with pytest.raises(BaseDeltaPerdida):
+        CompresorGradientes().descomprimir("http://n1", emisor.comprimir("http://coord", actual))
+    emisor.olvidar("http://coord")
+    assert emisor.comprimir("http://coord", actual)["completo"]
+
+
+def test_mensaje_gradiente_comprimido_se_guarda_autocontenido(grad):
+    from fastapi.testclient import TestClient
+    from nodo.main import app, kv, NOMBRE
+    client = TestClient(app)
+    emisor = CompresorGradientes("delta")
+    for ronda in range(2):
+        mensaje = {"id": f"gd{ronda}", "tipo": "gradiente", "origen": "http://fed:8100", "destino": NOMBRE,
+                   "payload": {"grad_cod": emisor.comprimir("http://coord", grad + ronda)}}
+        assert client.post("/mensajes", json=mensaje).json() == {"ok": True}
+    guardado = kv.get("gradiente_gd1")["grad_cod"]
+    assert guardado["codec"] == "q16"
+    assert np.abs(gradientes.gradiente_de(kv.get("gradiente_gd1")) - (grad + 1)).max() < 1e-2
+
+
+def test_refresco_de_uno_envia_siempre_completo_y_topk_invalido_se_rechaza(grad):
+    emisor = CompresorGradientes("delta", refresco=1)
+    assert all(emisor.comprimir("http://coord", grad)["completo"] for _ in range(3))
+    cod = CompresorGradientes("topk").comprimir("http://coord", grad)
+    with pytest.raises(ValueError):
+        gradientes.decodificar(dict(cod, n=10))
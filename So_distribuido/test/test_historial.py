@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import time
+
+from Libs.historial import ArchivoHistorial, CompactadorHistorial, compactar_lista_tareas
+from Libs.kv import KVReplicado
+from Libs.metricas import Metricas
+
+
+def test_ttl_caduca_igual_en_todas_las_replicas():
+    a, b = KVReplicado("http://a"), KVReplicado("http://b")
+    a.put("gradiente_1", [1, 2], ttl=60)
+    a.put("fijo", 1)
+    b.fusionar_desde_vecino(a.estado_completo())
+    assert b.registro("gradiente_1")["expira"] == a.registro("gradiente_1")["expira"]
+    a.put("gradiente_2", [3], ttl=0.01)
+    time.sleep(0.02)
+    assert a.get("gradiente_2") is None
+    # Un registro caducado no se reenvía ni resucita al fusionarlo
+    assert "gradiente_2" not in a.estado_completo()
+    b.fusionar_desde_vecino({"gradiente_2": a.registro("gradiente_2")})
+    assert b.registro("gradiente_2") is None
+    assert a.compactar() == 1 and a.registro("gradiente_2") is None
+
+
+def test_lapida_gana_a_versiones_anteriores_y_caduca_tras_la_gracia():
+    a = KVReplicado("http://a", gracia_lapida=0.05)
+    b = KVReplicado("http://b")
+    a.put("x", "v1")
+    b.fusionar_desde_vecino(a.estado_completo())
+    a.borrar("x")
+    assert a.get("x") is None
+    # b aún envía su v1 (anti-entropía): no revive la clave
+    a.fusionar_desde_vecino(b.estado_completo())
+    assert a.get("x") is None
+    b.fusionar_desde_vecino(a.estado_completo())
+    assert b.get("x") is None and b.registro("x")["borrado"]
+    assert a.compactar() == 0
+    time.sleep(0.06)
+    assert a.compactar() == 1 and a.registro("x") is None
+
+
+def test_compactador_resume_tareas_y_trabajos_y_archiva(tmp_path):
+    kv = KVReplicado("http://a", metricas=Metricas())
+    kv.put("tareas", [
+        {"id": "t1", "tipo": "regresion_lineal", "payload": {"X": [[1]] * 100}, "estado": "SUBMITIDO"},
+        {"id": "t2", "tipo": "regresion_lineal", "payload": {}, "estado": "SUBMITIDO"},
+    ])
+    kv.put("trabajo_j", {"estado": "COMPLETADA", "tareas": {
+        "a": {"estado": "COMPLETADA", "depende_de": [], "ubicacion": "http://a"},
+        "b": {"estado": "COMPLETADA", "depende_de": ["a"], "ubicacion": None},
+    }})
+    archivo = ArchivoHistorial(str(tmp_path / "historial.jsonl"))
+    compactador = CompactadorHistorial(kv, {"t1": "COMPLETADA"}.get, ttl=60, archivo=archivo)
+    assert compactador.ronda()["trabajos"] == 1
+    tareas = kv.get("tareas")
+    assert tareas[0]["estado"] == "COMPLETADA" and "payload" not in tareas[0]
+    assert tareas[1]["estado"] == "SUBMITIDO"
+    trabajo = kv.get("trabajo_j")
+    assert trabajo["estado"] == "COMPLETADA" and trabajo["por_estado"] == {"COMPLETADA": 2}
+    assert "expira" in kv.registro("trabajo_j")
+    # Sin cambios no se reescribe nada
+    version = kv.registro("tareas")["version"]
+    assert compactador.ronda() == {"tareas": 0, "trabajos": 0, "claves": 0}
+    assert kv.registro("tareas")["version"] == version
+    # Pasado el TTL la tarea terminada se desaloja al archivo
+    compactador.ttl = 0
+    time.sleep(0.01)
+    assert compactador.ronda()["tareas"] == 1
+    assert [t["id"] for t in kv.get("tareas")] == ["t2"]
+    assert archivo.leer()[0]["datos"]["id"] == "t1"
+
+
+def test_lista_sin_tareas_terminadas_no_cambia():
+    lista = [{"id": "t", "estado": "SUBMITIDO"}]
+    assert compactar_lista_tareas(lista, lambda _: None, ttl=60) is None
+
+
+def test_compactador_no_pisa_un_envio_concurrente_y_caduca_pendientes():
+    kv = KVReplicado("http://a", metricas=Metricas())
+    ahora = time.time()
+    kv.put("tareas", [{"id": "viva", "estado": "SUBMITIDO", "ts": ahora},
+                      {"id": "perdida", "estado": "SUBMITIDO", "ts": ahora - 7200},
+                      {"id": "hecha", "estado": "SUBMITIDO", "ts": ahora}])
+    compactador = CompactadorHistorial(kv, {"hecha": "COMPLETADA"}.get, metricas=kv.metricas,
+                                       ttl=60, ttl_pendiente=3600)
+    registro = kv.registro
+
+    def registro_y_envio(clave):
+        reg = registro(clave)
+        kv.put("tareas", reg["valor"] + [{"id": "nueva", "estado": "SUBMITIDO", "ts": ahora}])
+        return reg
+
+    kv.registro = registro_y_envio  # un submit llega entre la lectura y la escritura
+    assert compactador.ronda()["tareas"] == 0
+    assert kv.metricas.contadores["historial_conflictos"] == 1
+    kv.registro = registro
+    assert compactador.ronda()["tareas"] == 1
+    assert [t["id"] for t in kv.get("tareas")] == ["viva", "hecha", "nueva"]
+
+
+def test_envio_concurrente_de_tareas_no_pierde_ninguna(monkeypatch):
+    import nodo.main as nodo
+    kv = KVReplicado("http://a")
+    kv.put("tareas", [{"id": "previa", "estado": "SUBMITIDO"}])
+    monkeypatch.setattr(nodo, "kv", kv)
+    leer = kv.leer_registro
+    otro_envio = [{"id": "otro", "estado": "SUBMITIDO"}]
+
+    def leer_y_envio(clave):
+        reg = leer(clave)
+        if otro_envio:  # otro worker añade su tarea entre la lectura y la escritura
+            kv.put("tareas", reg["valor"] + [otro_envio.pop()])
+        return reg
+
+    kv.leer_registro = leer_y_envio
+    r = nodo.submit_tarea(nodo.Tarea(id="mia", tipo="regresion_lineal", payload={"X": [[1]], "y": [1]}))
+    assert r["ok"] and r["version"] == kv.registro("tareas")["version"]
+    assert [t["id"] for t in kv.get("tareas")] == ["previa", "otro", "mia"]
+
+
+def test_solo_el_responsable_reescribe_las_claves_compartidas():
+    kv = KVReplicado("http://b")
+    kv.put("tareas", [{"id": "t", "estado": "SUBMITIDO"}])
+    kv.put("trabajo_j", {"estado": "FALLIDA", "tareas": {}})
+    version = kv.registro("tareas")["version"]
+    compactador = CompactadorHistorial(kv, lambda _: "COMPLETADA", es_responsable=lambda clave: False)
+    assert compactador.ronda() == {"tareas": 0, "trabajos": 0, "claves": 0}
+    assert kv.registro("tareas")["version"] == version
+    assert not kv.get("trabajo_j").get("resumen")
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest.mock import patch, MagicMock
+from Libs.idempotencia import TablaDeduplicacion
+from Libs.kv import KVReplicado
+
+
+def test_registrar_detecta_duplicados_y_cachea_resultado():
+    tabla = TablaDeduplicacion()
+    assert tabla.registrar("t1") is None
+    entrada = tabla.registrar("t1")
+    assert entrada is not None
+
+    hilo = threading.Thread(target=tabla.completar, args=("t1", {"ok": 1}))
+    hilo.start()
+    assert tabla.esperar(entrada, timeout=1.0) == {"ok": 1}
+    hilo.join()
+    assert tabla.resultado("t1") == {"ok": 1}
+
+
+def test_abandonar_libera_el_id_para_reintentos():
+    tabla = TablaDeduplicacion()
+    tabla.registrar("t1")
+    tabla.abandonar("t1")
+    assert tabla.registrar("t1") is None
+
+
+def test_tabla_acotada_por_tamano_y_ttl():
+    tabla = TablaDeduplicacion(max_entradas=2, ttl=0.05)
+    for i in range(5):
+        tabla.completar(f"t{i}", i)
+    assert len(tabla) == 2
+    assert tabla.resultado("t0") is None
+    assert tabla.resultado("t4") == 4
+    time.sleep(0.1)
+    assert tabla.resultado("t4") is None
+
+
+def test_lease_en_kv_bloquea_a_otro_dueno():
+    kv = KVReplicado("http://a:8100")
+    assert kv.adquirir_lease("lease_t1", "http://a:8100", ttl=10) == (True, "http://a:8100")
+    assert kv.adquirir_lease("lease_t1", "http://b:8100", ttl=10) == (False, "http://a:8100")
+    kv.liberar_lease("lease_t1", "http://a:8100")
+    assert kv.adquirir_lease("lease_t1", "http://b:8100", ttl=10)[0]
+
+
+def test_lease_vencido_o_completado():
+    kv = KVReplicado("http://a:8100")
+    kv.adquirir_lease("lease_t2", "http://a:8100", ttl=-1)
+    assert kv.adquirir_lease("lease_t2", "http://b:8100", ttl=10)[0]
+    kv.liberar_lease("lease_t2", "http://b:8100", completada=True)
+    assert kv.adquirir_lease("lease_t2", "http://c:8100", ttl=10) == (False, "http://b:8100")
+
+
+def test_tarea_duplicada_devuelve_resultado_sin_recalcular():
+    from nodo.main import ejecutar_tarea, Tarea
+    tarea = Tarea(id="dup1", tipo="regresion_lineal", payload={"origen": "http://cliente:9000", "X": [[1]], "y": [1]})
+    request = MagicMock()
+
+    with patch("nodo.main.planificador") as plan, \
+         patch("nodo.main.desc") as desc, \
+         patch("nodo.main.httpx.post"), \
+         patch("nodo.main._ejecutar_tarea_local",
+               return_value={"ok": True, "resultado": {"x": 1}}) as local:
+        plan.elegir_ejecutor.return_value = "YO"
+        desc.lista_vecinos_con_metricas.return_value = []
+        r1 = ejecutar_tarea(tarea, request)
+        r2 = ejecutar_tarea(tarea, request)
+
+    assert r1 == {"estado": "COMPLETADA", "resultado": {"x": 1}}
+    assert r2 == r1
+    assert local.call_count == 1
+
+
+def test_tarea_con_lease_ajeno_no_se_reenvia():
+    from nodo.main import ejecutar_tarea, Tarea, kv
+    import httpx
+    kv.adquirir_lease("lease_dup2", "http://lento:8101", ttl=30)
+    tarea = Tarea(id="dup2", tipo="regresion_lineal", payload={"origen": "http://cliente:9000"})
+
+    with patch("nodo.main.planificador") as plan, \
+         patch("nodo.main.desc") as desc, \
+         patch("nodo.main.httpx.post", side_effect=httpx.RequestError("Timeout")) as post:
+        plan.elegir_ejecutor.return_value = "http://lento:8101"
+        plan.clasificar.return_value = []
+        desc.lista_vecinos_con_metricas.return_value = []
+        r = ejecutar_tarea(tarea, MagicMock())
+
+    assert r == {"estado": "EN_EJECUCION", "en": "http://lento:8101"}
+    assert post.call_count == 0
+
+
+def test_copia_especulativa_no_se_responde_con_el_lease():
+    from nodo.main import ejecutar_tarea, Tarea, kv
+    kv.adquirir_lease("lease_dup3", "http://lento:8101", ttl=30)
+    tarea = Tarea(id="dup3", tipo="regresion_lineal",
+                  payload={"origen": "http://cliente:9000", "X": [[1]], "y": [1], "_especulativa": True})
+
+    with patch("nodo.main.planificador") as plan, \
+         patch("nodo.main.desc") as desc, \
+         patch("nodo.main.httpx.post"), \
+         patch("nodo.main._ejecutar_tarea_local",
+               return_value={"ok": True, "resultado": {"x": 3}}) as local:
+        plan.elegir_ejecutor.return_value = "YO"
+        desc.lista_vecinos_con_metricas.return_value = []
+        r = ejecutar_tarea(tarea, MagicMock())
+
+    assert r == {"estado": "COMPLETADA", "resultado": {"x": 3}}
+    assert local.call_count == 1
+    # El lease sigue siendo del nodo lento
+    assert kv.get("lease_dup3")["dueno"] == "http://lento:8101"
+
+
+def test_fallo_al_adquirir_el_lease_no_deja_la_tarea_en_curso():
+    import pytest
+    from nodo.main import ejecutar_tarea, Tarea, dedup
+    from Libs.kv_particionado import QuorumNoAlcanzado
+    tarea = Tarea(id="dup4", tipo="regresion_lineal", payload={"origen": "http://cliente:9000", "X": [[1]], "y": [1]})
+
+    with patch("nodo.main.planificador") as plan, \
+         patch("nodo.main.desc") as desc, \
+         patch("nodo.main.kv") as kv, \
+         patch("nodo.main._ejecutar_tarea_local") as local:
+        plan.elegir_ejecutor.return_value = "YO"
+        desc.lista_vecinos_con_metricas.return_value = []
+        kv.adquirir_lease.side_effect = QuorumNoAlcanzado("lease_dup4")
+        with pytest.raises(QuorumNoAlcanzado):
+            ejecutar_tarea(tarea, MagicMock())
+
+    assert local.call_count == 0
+    # La entrada de dedup se ha soltado: un reintento puede volver a registrarla
+    assert dedup.registrar("dup4") is None
+    dedup.abandonar("dup4")
+
+
+def test_renovador_mantiene_el_lease_mientras_dura_la_ejecucion():
+    from Libs.idempotencia import RenovadorLease
+    kv = KVReplicado("http://a:8100")
+    kv.adquirir_lease("lease_larga", "http://a:8100", ttl=0.05)
+    with RenovadorLease(lambda: kv.adquirir_lease("lease_larga", "http://a:8100", ttl=0.05)[0], 0.015) as r:
+        time.sleep(0.2)
+        assert kv.adquirir_lease("lease_larga", "http://b:8100", ttl=10) == (False, "http://a:8100")
+    assert r.renovaciones >= 3
+    kv.liberar_lease("lease_larga", "http://a:8100", completada=True)
+    time.sleep(0.03)
+    assert kv.get("lease_larga")["estado"] == "COMPLETADA"
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlsplit
+
+import httpx
+import pytest
+
+from Libs import codificacion
+from Libs.kv_particionado import AnilloHash, KVParticionado, QuorumNoAlcanzado
+
+
+def _respuesta(obj):
+    r = MagicMock()
+    r.json.return_value = obj
+    return r
+
+
+class Red:
+    """Nodos KVParticionado en memoria conectados por un httpx simulado."""
+
+    def __init__(self, n, **opciones):
+        self.urls = [f"http://n{i}:8100" for i in range(n)]
+        self.caidos = set()
+        self.rutas = []
+        self.enviadas = 0  # claves enviadas por /kv/sync
+        self.nodos = {
+            u: KVParticionado(u, lambda u=u: self._vecinos(u), intervalo_anti_entropia=0, **opciones)
+            for u in self.urls
+        }
+
+    def _vecinos(self, yo):
+        return [{"url": u, "codificacion": codificacion.capacidades()}
+                for u in self.urls if u != yo and u not in self.caidos]
+
+    def _destino(self, url):
+        partes = urlsplit(url)
+        base = f"{partes.scheme}://{partes.netloc}"
+        if base in self.caidos:
+            raise httpx.ConnectError("caído")
+        return self.nodos[base], partes.path
+
+    def post(self, url, content, headers, timeout):
+        nodo, ruta = self._destino(url)
+        obj = codificacion.decodificar(content, headers["Content-Type"], headers.get("Content-Encoding"))
+        self.rutas.append(ruta)
+        if ruta == "/kv/sync":
+            self.enviadas += len(obj)
+            nodo.fusionar_desde_vecino(obj)
+            return _respuesta({"ok": True})
+        if ruta == "/kv/digest":
+            return _respuesta({"faltan": nodo.diferencias(obj)})
+        return _respuesta({"r": nodo.ejecutar_coordinado(obj["op"], obj["args"], obj["kwargs"])})
+
+    def get(self, url, params, timeout):
+        nodo, _ = self._destino(url)
+        return _respuesta(nodo.registro(params["clave"]))
+
+    def refrescar(self):
+        for nodo in self.nodos.values():
+            nodo._refrescar(forzar=True)
+
+    def __enter__(self):
+        self._patch = patch("Libs.kv_particionado.httpx", post=self.post, get=self.get)
+        self._patch.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._patch.stop()
+
+
+def test_anillo_reparte_y_mueve_pocas_claves_al_crecer():
+    anillo = AnilloHash(vnodos=64)
+    anillo.reconstruir([f"n{i}" for i in range(4)])
+    claves = [f"k{i}" for i in range(2000)]
+    antes = {c: anillo.preferentes(c, 2) for c in claves}
+    assert all(len(set(p)) == 2 for p in antes.values())
+    anillo.reconstruir([f"n{i}" for i in range(5)])
+    movidas = [c for c in claves if anillo.preferentes(c, 1) != antes[c][:1]]
+    # Solo cambian de dueño las que pasan al nodo nuevo (~1/5)
+    assert 0.1 < len(movidas) / len(claves) < 0.35
+    assert all(anillo.preferentes(c, 1) == ["n4"] for c in movidas)
+
+
+def test_cada_clave_vive_solo_en_sus_replicas():
+    with Red(5, replicas=2, quorum_escritura=2) as red:
+        cliente = red.nodos[red.urls[0]]
+        for i in range(100):
+            cliente.put(f"k{i}", i)
+        guardadas = {u: len(n.estado_completo()) for u, n in red.nodos.items()}
+        assert sum(guardadas.values()) == 200
+        assert max(guardadas.values()) < 100
+        # Cualquier nodo lee cualquier clave
+        assert red.nodos[red.urls[3]].get("k42") == 42
+        assert cliente.get("k7") == 7
+
+
+def test_lease_coordinado_por_la_replica_primaria():
+    with Red(4, replicas=2, quorum_escritura=2) as red:
+        a, b = red.nodos[red.urls[0]], red.nodos[red.urls[1]]
+        assert a.adquirir_lease("lease_t", "http://a", ttl=30) == (True, "http://a")
+        assert b.adquirir_lease("lease_t", "http://b", ttl=30) == (False, "http://a")
+        a.liberar_lease("lease_t", "http://a", completada=True)
+        assert b.get("lease_t")["estado"] == "COMPLETADA"
+
+
+def test_quorum_de_escritura_y_entrega_de_pistas():
+    with Red(3, replicas=3, quorum_escritura=2) as red:
+        red.refrescar()
+        a = red.nodos[red.urls[0]]
+        replicas = a.replicas_de("clave")
+        coordinador = red.nodos[replicas[0]]
+        red.caidos.update(replicas[1:])
+        with pytest.raises(QuorumNoAlcanzado):
+            coordinador.put("clave", "v1")
+        # Vuelven: la siguiente ronda de anti-entropía entrega lo pendiente
+        red.caidos.clear()
+        coordinador.anti_entropia()
+        for u in replicas[1:]:
+            assert red.nodos[u].registro("clave")["valor"] == "v1"
+
+
+def test_anti_entropia_solo_envia_las_claves_que_difieren():
+    with Red(3, replicas=3, quorum_escritura=3) as red:
+        red.refrescar()
+        a = red.nodos[red.urls[0]]
+        for i in range(20):
+            a.put(f"k{i}", i)
+        red.enviadas = 0
+        a.anti_entropia()
+        # Réplicas al día: solo viaja el resumen de versiones
+        assert "/kv/digest" in red.rutas and red.enviadas == 0
+        a.local.put("k3", "nuevo", version=50)  # cambio que las demás réplicas no vieron
+        a.anti_entropia()
+        assert red.enviadas == 2
+        for u in red.urls[1:]:
+            assert red.nodos[u].registro("k3")["valor"] == "nuevo"
+
+
+def test_lectura_con_quorum_repara_replicas_atrasadas():
+    with Red(3, replicas=3, quorum_lectura=3) as red:
+        red.refrescar()
+        a, b = red.nodos[red.urls[0]], red.nodos[red.urls[1]]
+        a.put("x", 1)
+        b.local.put("x", 5, version=9)  # b tiene una versión más nueva que no se propagó
+        assert a.get("x") == 5
+        assert a.registro("x")["version"] == 9
+
+
+def test_claves_se_traspasan_al_cambiar_miembros():
+    with Red(3, replicas=1) as red:
+        red.caidos.add(red.urls[2])
+        red.refrescar()
+        a = red.nodos[red.urls[0]]
+        for i in range(60):
+            a.put(f"k{i}", i)
+        assert red.nodos[red.urls[2]].estado_completo() == {}
+        red.caidos.clear()
+        red.refrescar()
+        for u in red.urls[:2]:
+            red.nodos[u].anti_entropia()
+        nuevo = red.nodos[red.urls[2]].estado_completo()
+        assert nuevo
+        # Las claves traspasadas ya no ocupan sitio en sus antiguos dueños
+        assert sum(len(n.estado_completo()) for n in red.nodos.values()) == 60
+
+
+def test_quorum_fallido_en_el_coordinador_no_se_escribe_en_local():
+    with Red(4, replicas=2, quorum_escritura=2) as red:
+        red.refrescar()
+        a = red.nodos[red.urls[0]]
+        clave = next(f"k{i}" for i in range(100) if red.urls[0] not in a.replicas_de(f"k{i}"))
+        red.caidos.add(a.replicas_de(clave)[1])
+        with pytest.raises(QuorumNoAlcanzado):
+            a.put(clave, "v")
+        assert a.local.registro(clave) is None
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from Libs import computo
+from Libs.memoria_compartida import PoolSegmentos, empaquetar, abrir
+
+
+def _datos(n=500, d=3):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, d))
+    y = 2.0 + X @ np.array([1.5, -2.0, 0.7])
+    return X, y
+
+
+def test_empaquetar_desde_listas_y_abrir_sin_copia():
+    pool = PoolSegmentos(tam_minimo=4096)
+    X, y = _datos()
+    seg, desc = empaquetar(pool, {"X": X.tolist(), "y": y.tolist(), "X_test": X[:2].tolist()})
+    try:
+        arrays = abrir(desc)
+        assert np.array_equal(arrays["X"], X) and np.array_equal(arrays["y"], y)
+        assert arrays["X_test"].shape == (2, 3)
+        assert all(d["offset"] % 64 == 0 for d in desc["arrays"].values())
+        # Es una vista del segmento: lo escrito en la memoria compartida se ve sin copiar
+        seg.shm.buf[:8] = np.float64(42.0).tobytes()
+        assert arrays["X"][0, 0] == 42.0
+        del arrays
+    finally:
+        pool.soltar(seg)
+        pool.cerrar()
+
+
+def test_pool_reutiliza_y_cuenta_referencias():
+    pool = PoolSegmentos(max_libres=1, tam_minimo=4096)
+    a = pool.adquirir(1000)
+    pool.retener(a)
+    pool.soltar(a)
+    assert a.refs == 1  # aún retenido: no vuelve al pool
+    pool.soltar(a)
+    b = pool.adquirir(3000)  # misma clase de tamaño: se reutiliza
+    assert b is a and pool.reutilizados == 1
+    c = pool.adquirir(3000)
+    pool.soltar(b)
+    pool.soltar(c)  # el pool ya tiene max_libres: c se destruye
+    assert pool._n_libres == 1
+    pool.cerrar()
+
+
+def test_lista_irregular_suelta_el_segmento():
+    pool = PoolSegmentos(tam_minimo=4096)
+    with pytest.raises(ValueError):
+        empaquetar(pool, {"X": [[1.0, 2.0], [3.0]]})
+    assert pool._n_libres == 1
+    pool.cerrar()
+
+
+def test_regresion_por_bloques_equivale_a_minimos_cuadrados():
+    X, y = _datos()
+    res = computo.regresion_lineal(X, y, X[:2])
+    esperado, *_ = np.linalg.lstsq(np.c_[np.ones(len(X)), X], y, rcond=None)
+    assert np.allclose(res["coeficientes"], esperado)
+    assert np.allclose(res["predicciones"], y[:2])
+
+
+def test_regresion_con_x_de_una_dimension():
+    import nodo.main as nodo
+    x = [0.0, 1.0, 2.0, 3.0]
+    y = [1.0, 3.0, 5.0, 7.0]
+    res = computo.regresion_lineal_json(x, y, [4.0])
+    assert np.allclose(res["coeficientes"], [1.0, 2.0])
+    assert np.allclose(res["predicciones"], [9.0])
+    assert nodo._coste_regresion({"X": x}) == 4
+    assert np.allclose(nodo._ejecutar_regresion({"X": x, "y": y})["predicciones"], [1.0, 3.0])
+
+
+def test_regresion_en_proceso_de_computo():
+    pool = PoolSegmentos(tam_minimo=4096)
+    X, y = _datos()
+    seg, desc = empaquetar(pool, {"X": X, "y": y, "X_test": X[:2]})
+    try:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("forkserver")) as ex:
+            res = ex.submit(computo.regresion_lineal_compartida, desc).result(timeout=60)
+    finally:
+        pool.soltar(seg)
+        pool.cerrar()
+    assert np.allclose(res["coeficientes"], [2.0, 1.5, -2.0, 0.7])
+
+
+def test_nodo_usa_memoria_compartida_a_partir_del_umbral(monkeypatch):
+    import nodo.main as nodo
+    X, y = _datos()
+    pool = PoolSegmentos(tam_minimo=4096)
+    monkeypatch.setattr(nodo, "segmentos", pool)
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("forkserver")) as ex:
+        monkeypatch.setattr(nodo, "ejecutor_computo", ex)
+        monkeypatch.setattr(nodo, "MEMCOMP_UMBRAL", 100)
+        antes = nodo.metricas.contadores.get("tareas_memoria_compartida", 0.0)
+        res = nodo._ejecutar_regresion({"X": X.tolist(), "y": y.tolist()})
+    assert nodo.metricas.contadores["tareas_memoria_compartida"] == antes + 1
+    pool.cerrar()
+    assert np.allclose(res["predicciones"], y[:2])
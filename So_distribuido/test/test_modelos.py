@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from Libs.kv import KVReplicado
+from Libs.metricas import Metricas
+from Libs.modelos import ModeloDesconocido, RegistroModelos
+
+
+def test_prediccion_desde_cache_sin_releer_el_kv():
+    metricas = Metricas()
+    kv = KVReplicado("http://a")
+    servidor = RegistroModelos(kv, metricas=metricas, revalidar=60)
+    RegistroModelos(kv).publicar("m", [1.0, 2.0, -1.0])  # lo publica otro nodo
+    version, y = servidor.predecir("m", [[1.0, 1.0], [2.0, 0.0]])
+    assert version == 1 and y.tolist() == [2.0, 5.0]
+    assert servidor.predecir("m", [3.0, 1.0])[1].tolist() == [6.0]  # una sola fila
+    assert metricas.contadores["modelos_cache_fallos"] == 1
+    assert metricas.contadores["modelos_cache_aciertos"] == 1
+    with pytest.raises(ValueError):
+        servidor.predecir("m", [[1.0, 2.0, 3.0]])
+    with pytest.raises(ModeloDesconocido):
+        servidor.predecir("otro", [[1.0]])
+
+
+def test_version_nueva_se_recoge_al_revalidar_o_al_pedirla():
+    kv = KVReplicado("http://a")
+    RegistroModelos(kv).publicar("m", [0.0, 1.0])
+    servidor = RegistroModelos(kv, revalidar=60)
+    assert servidor.predecir("m", [[2.0]])[1].tolist() == [2.0]
+    assert RegistroModelos(kv).publicar("m", [0.0, 3.0]) == {"id": "m", "version": 2}
+    assert servidor.predecir("m", [[2.0]], version=2) == (2, pytest.approx([6.0]))
+    servidor.revalidar = 0
+    RegistroModelos(kv).publicar("m", [1.0, 3.0])
+    assert servidor.predecir("m", [[2.0]])[0] == 3
+
+
+def test_tarea_con_modelo_id_registra_y_predecir_no_reajusta():
+    from fastapi.testclient import TestClient
+    from nodo.main import app
+    client = TestClient(app)
+    tarea = {"id": "ajuste_m1", "tipo": "regresion_lineal",
+             "payload": {"X": [[0.0], [1.0], [2.0]], "y": [1.0, 3.0, 5.0], "modelo_id": "m1"}}
+    r = client.post("/tareas/ejecutar", json=tarea)
+    assert r.status_code == 200
+    assert r.json()["resultado"]["modelo"] == {"id": "m1", "version": 1}
+    r = client.post("/predecir", json={"modelo_id": "m1", "X": [[10.0], [20.0]]})
+    assert r.status_code == 200
+    assert r.json()["predicciones"] == pytest.approx([21.0, 41.0])
+    assert client.post("/predecir", json={"modelo_id": "nada", "X": [[1.0]]}).status_code == 404
+    assert client.get("/modelos/m1").json()["version"] == 1
+
+
+def test_publicaciones_simultaneas_no_repiten_version():
+    from concurrent.futures import ThreadPoolExecutor
+    kv = KVReplicado("http://a")
+    registros = [RegistroModelos(kv) for _ in range(4)]
+    with ThreadPoolExecutor(4) as ex:
+        versiones = list(ex.map(lambda r: r[1].publicar("m", [float(r[0]), 1.0])["version"],
+                                enumerate(registros * 8)))
+    assert sorted(versiones) == list(range(1, 33))
+    assert kv.get("modelo_m")["version"] == kv.registro("modelo_m")["version"] == 32
+
+
+def test_publicar_tras_borrar_el_modelo():
+    kv = KVReplicado("http://a")
+    registro = RegistroModelos(kv)
+    registro.publicar("m", [0.0, 1.0])
+    kv.borrar("modelo_m")
+    assert registro.publicar("m", [0.0, 2.0]) == {"id": "m", "version": 4}
+    assert kv.get("modelo_m")["version"] == kv.registro("modelo_m")["version"] == 4
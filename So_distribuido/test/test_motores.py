@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import sys
+from unittest.mock import patch, MagicMock
+import pytest
+from fastapi.testclient import TestClient
+from Libs.metricas import Metricas
+from Libs.motores import ModuloPerezoso, MotoresPerezosos
+
+
+def test_modulo_perezoso_importa_en_el_primer_acceso():
+    m = ModuloPerezoso("colorsys")
+    sys.modules.pop("colorsys", None)
+    assert "colorsys" not in sys.modules
+    assert m.rgb_to_hsv(1.0, 0.0, 0.0)[0] == 0.0
+    assert "colorsys" in sys.modules
+
+
+def test_motores_se_cargan_por_tipo_y_registran_tiempo():
+    metricas = Metricas()
+    motores = MotoresPerezosos({"a": "colorsys", "b": "Libs.computo"}, metricas)
+    assert motores.calientes() == {"a": False, "b": False}
+    assert motores.cargar("a").__name__ == "colorsys"
+    assert not motores.todos_calientes()
+    motores.calentar()
+    assert motores.todos_calientes()
+    assert "motor_carga_ms_b" in metricas.observaciones
+    with pytest.raises(KeyError):
+        motores.cargar("desconocido")
+
+
+def test_nodo_no_importa_numpy_ni_httpx_al_arrancar():
+    import os, subprocess
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = "import sys, nodo.main; print('numpy' in sys.modules, 'httpx' in sys.modules)"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True, cwd=raiz).stdout
+    assert salida.split() == ["False", "False"]
+
+
+def test_readiness_distingue_vivo_de_caliente():
+    import nodo.main as nodo
+    c = TestClient(nodo.app)
+    assert c.get("/salud/vivo").json() == {"vivo": True}
+    nodo._caliente.clear()
+    r = c.get("/salud/listo")
+    assert r.status_code == 503 and r.json()["detail"]["listo"] is False
+    nodo._calentar()
+    r = c.get("/salud/listo")
+    assert r.status_code == 200 and all(r.json()["motores"].values())
+
+
+def test_arranque_copia_el_kv_de_un_vecino():
+    import nodo.main as nodo
+    respuesta = MagicMock()
+    respuesta.json.return_value = {"trabajo_x": {"valor": {"estado": "COMPLETADA"}, "version": 4}}
+    with patch("nodo.main.desc") as desc, patch("nodo.main.httpx.get", return_value=respuesta) as get:
+        desc.lista_vecinos_con_metricas.return_value = [{"nombre": "n1", "url": "http://n1:8101"}]
+        nodo._kv_sincronizado.clear()
+        nodo._arrancar_kv()
+    get.assert_called_once_with("http://n1:8101/kv/estado_completo", timeout=2.0)
+    assert nodo._kv_sincronizado.is_set()
+    assert nodo.kv.get("trabajo_x") == {"estado": "COMPLETADA"}
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import pytest
+from Libs.multiproceso import AgenteHost, ServidorIPC, ClienteIPC, ProxyIPC, TablaCompartida
+from Libs.kv import KVReplicado
+from Libs.metricas import Metricas, fusionar_instantaneas, texto_de
+
+
+def test_tabla_compartida_entre_instancias(tmp_path):
+    a = TablaCompartida(str(tmp_path / "estado"), 3)
+    b = TablaCompartida(str(tmp_path / "estado"), 3)  # otro worker mapeando el mismo fichero
+    a.escribir(0, {"carga": 2, "ranuras": 4, "ranuras_libres": 2})
+    b.escribir(2, {"carga": 1, "ranuras": 4, "ranuras_libres": 3})
+    filas = a.leer(vigencia_s=5.0)
+    assert sorted(f["carga"] for f in filas) == [1, 2]
+    assert a.leer(vigencia_s=-1.0) == []  # filas caducadas (worker muerto) no cuentan
+
+
+def test_proxy_ipc_del_kv(tmp_path):
+    kv = KVReplicado("http://lider")
+    ruta = str(tmp_path / "lider.sock")
+    servidor = ServidorIPC(ruta, {f"kv.{m}": getattr(kv, m) for m in ("get", "put", "liberar_lease", "adquirir_lease")})
+    servidor.iniciar()
+    try:
+        proxy = ProxyIPC(ClienteIPC(ruta), "kv", ("get", "put", "liberar_lease", "adquirir_lease", "borrar"))
+        assert proxy.put("a", {"x": 1}) == 1
+        assert proxy.get("a") == {"x": 1}
+        ok, dueno = proxy.adquirir_lease("lease_t", "w1", 30.0)
+        assert ok and dueno == "w1"
+        proxy.liberar_lease("lease_t", "w1", completada=True)
+        assert kv.get("lease_t")["estado"] == "COMPLETADA"
+        with pytest.raises(RuntimeError):
+            proxy.borrar("a")  # permitido en el proxy pero no expuesto por el servidor
+        with pytest.raises(AttributeError):
+            proxy.estado_completo
+    finally:
+        servidor.cerrar()
+
+
+def test_cliente_sin_servidor_lanza_connection_error(tmp_path):
+    with pytest.raises(ConnectionError):
+        ClienteIPC(str(tmp_path / "nadie.sock")).llamar("kv.get", "a")
+
+
+def test_agente_host_indices_y_liderazgo(tmp_path):
+    d = str(tmp_path / "host")
+    w0 = AgenteHost(d, workers=2)
+    w1 = AgenteHost(d, workers=2)
+    assert {w0.indice, w1.indice} == {0, 1}
+    assert w0.intentar_liderazgo()
+    assert not w1.intentar_liderazgo()
+    with pytest.raises(RuntimeError):
+        AgenteHost(d, workers=2, espera_indice=0.0)
+
+    w0.publicar({"carga": 3, "ranuras": 2, "ranuras_libres": 0, "cola": 1})
+    w1.publicar({"carga": 1, "ranuras": 2, "ranuras_libres": 1, "cola": 0})
+    assert w1.agregados() == {"carga": 4, "ranuras": 4, "ranuras_libres": 1, "cola": 1}
+
+
+def test_recolectar_y_preguntar_entre_workers(tmp_path):
+    d = str(tmp_path / "host")
+    w0, w1 = AgenteHost(d, workers=3), AgenteHost(d, workers=3)
+    m = Metricas()
+    m.inc("tareas_ejecutadas", 2)
+    m.observe("duracion_ms", 10.0)
+    servidor = ServidorIPC(w1.ruta_worker(w1.indice), {
+        "metricas.instantanea": m.instantanea,
+        "dedup.resultado": lambda tid: {"y": 1} if tid == "t1" else None,
+    })
+    servidor.iniciar()
+    try:
+        # El worker 2 no existe: se omite sin fallar
+        otras = w0.recolectar("metricas.instantanea")
+        assert len(otras) == 1
+        local = Metricas()
+        local.inc("tareas_ejecutadas")
+        local.observe("duracion_ms", 20.0)
+        texto = texto_de(fusionar_instantaneas([local.instantanea()] + otras))
+        assert "tareas_ejecutadas 3.0" in texto
+        assert "duracion_ms_avg 15.0" in texto
+        assert w0.preguntar("dedup.resultado", "t1") == {"y": 1}
+        assert w0.preguntar("dedup.resultado", "t2") is None
+    finally:
+        servidor.cerrar()
+
+
+def test_lider_en_modo_replicado_sirve_el_kv(tmp_path, monkeypatch):
+    # WORKERS>1 con KV_MODO=replicado: el KVReplicado no tiene ejecutar_coordinado
+    import nodo.main as nodo
+    kv = KVReplicado("http://lider")
+    monkeypatch.setattr(nodo, "_kv_local", kv)
+    operaciones = nodo._operaciones_lider()
+    assert "kv.ejecutar_coordinado" not in operaciones
+    ruta = str(tmp_path / "lider.sock")
+    servidor = ServidorIPC(ruta, operaciones)
+    servidor.iniciar()
+    try:
+        # Un worker no líder usa el mismo proxy que monta _iniciar_multiproceso
+        proxy = ProxyIPC(ClienteIPC(ruta), "kv", nodo.METODOS_KV)
+        assert proxy.put("tareas", [{"id": "t1"}]) == 1
+        assert proxy.get("tareas") == [{"id": "t1"}]
+        ok, _ = proxy.adquirir_lease("lease_t1", "w1", 30.0)
+        assert ok and kv.get("lease_t1")["dueno"] == "w1"
+    finally:
+        servidor.cerrar()
+
+
+def test_salida_previa_de_otro_worker_del_mismo_nodo(tmp_path, monkeypatch):
+    import nodo.main as nodo
+    d = str(tmp_path / "host")
+    w0, w1 = AgenteHost(d, workers=2), AgenteHost(d, workers=2)
+    servidor = ServidorIPC(w1.ruta_worker(w1.indice), {
+        "dedup.resultado": lambda tid: {"coef": [2.0]} if tid == "j.fit" else None,
+    })
+    servidor.iniciar()
+    monkeypatch.setattr(nodo, "host", w0)
+    try:
+        # La referencia apunta a este nodo, pero la salida está en el dedup del otro worker
+        assert nodo._obtener_salida("j.fit", nodo.get_mi_url()) == {"coef": [2.0]}
+        assert nodo.dedup.resultado("j.fit") == {"coef": [2.0]}
+        with pytest.raises(RuntimeError):
+            nodo._obtener_salida("j.otra", nodo.get_mi_url())
+    finally:
+        servidor.cerrar()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import threading, time
+from fastapi.testclient import TestClient
+from Libs.perfilado import LockInstrumentado, Perfilador, exportar_esperas_texto, formatear_colapsado
+
+
+def _ocupado(evento):
+    while not evento.is_set():
+        sum(range(1000))
+
+
+def test_perfilador_captura_pilas_de_otros_hilos():
+    fin = threading.Event()
+    h = threading.Thread(target=_ocupado, args=(fin,), name="hilo-prueba", daemon=True)
+    h.start()
+    try:
+        pilas = Perfilador().perfilar(0.1, intervalo=0.005)
+    finally:
+        fin.set()
+        h.join()
+    propias = [p for p in pilas if p.startswith("hilo-prueba;")]
+    assert propias and any("test_perfilado.py:_ocupado" in p for p in propias)
+    linea = formatear_colapsado(pilas).splitlines()[0]
+    assert int(linea.rsplit(" ", 1)[1]) >= 1
+
+
+def test_una_sola_captura_a_la_vez():
+    p = Perfilador()
+    p._ocupado.acquire()
+    assert p.perfilar(0.01) is None
+
+
+def test_lock_instrumentado_mide_solo_la_contencion():
+    l = LockInstrumentado("prueba_contencion")
+    with l:
+        pass
+    assert l.contenciones == 0 and l.espera_s == 0.0
+
+    l.acquire()
+    h = threading.Thread(target=lambda: (l.acquire(), l.release()))
+    h.start()
+    time.sleep(0.05)
+    l.release()
+    h.join()
+    assert l.contenciones == 1 and l.espera_s > 0.0
+    assert l.acquire(blocking=False) and not l.acquire(blocking=False)
+    l.release()
+    texto = exportar_esperas_texto()
+    assert "lock_contenciones_prueba_contencion 1" in texto
+
+
+def test_endpoint_profile_y_metricas_de_locks():
+    from nodo.main import app
+    c = TestClient(app)
+    r = c.get("/debug/profile", params={"seconds": 0.05})
+    assert r.status_code == 200
+    assert r.text.strip()
+    metricas = c.get("/metrics").text
+    for nombre in ("kv", "metricas"):
+        assert f"lock_espera_segundos_{nombre}" in metricas
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from Libs.recursos import Recursos, solicitud_de_tarea
+from Libs.planificador import PlanificadorLocal
+
+
+def test_solicitud_por_defecto_es_una_cpu():
+    assert solicitud_de_tarea(None) == {"cpu": 1.0, "mem_mb": 0.0}
+    assert solicitud_de_tarea({"recursos": {"cpu": 4}}) == {"cpu": 4.0, "mem_mb": 0.0}
+
+
+def test_reservar_y_liberar_ranuras():
+    r = Recursos(ranuras=2)
+    assert r.reservar({"cpu": 1}, timeout=0.1)
+    assert r.reservar({"cpu": 1}, timeout=0.1)
+    # Sin ranuras libres: vence el timeout
+    assert not r.reservar({"cpu": 1}, timeout=0.05)
+    r.liberar({"cpu": 1})
+    assert r.instantanea()["ranuras_libres"] == 1
+
+
+def test_tarea_mayor_que_el_nodo_se_ejecuta_sola():
+    r = Recursos(ranuras=2)
+    assert r.reservar({"cpu": 16}, timeout=0.1)
+    assert r.instantanea()["ranuras_libres"] == 0
+    r.liberar({"cpu": 16})
+    assert r.instantanea()["ranuras_libres"] == 2
+
+
+def test_memoria_se_comprueba_aunque_no_haya_reservas():
+    r = Recursos(ranuras=4)
+    r._mem_libre = lambda: 256.0
+    assert not r.cabe({"cpu": 1, "mem_mb": 1024})
+    assert not r.reservar({"cpu": 1, "mem_mb": 1024}, timeout=0.05)
+    assert r.reservar({"cpu": 1, "mem_mb": 128}, timeout=0.05)
+
+
+def test_cola_cuenta_tareas_en_espera():
+    r = Recursos(ranuras=1)
+    r.reservar({"cpu": 1})
+    hilo = threading.Thread(target=r.reservar, args=({"cpu": 1}, 1.0))
+    hilo.start()
+    time.sleep(0.05)
+    assert r.instantanea()["cola"] == 1
+    r.liberar({"cpu": 1})
+    hilo.join()
+    assert r.instantanea()["cola"] == 0
+
+
+def test_planificador_prefiere_nodo_con_mas_capacidad_libre():
+    """Con la misma carga absoluta, un nodo de 64 ranuras debe ganarle a uno de 2."""
+    plan = PlanificadorLocal(
+        mi_nombre="pequeno",
+        mi_url="http://pequeno:8100",
+        metricas=None,
+        obtener_carga_fn=lambda: 1,
+        obtener_recursos_fn=lambda: {"ranuras": 2, "ranuras_libres": 1, "cola": 0}
+    )
+    vecinos = [
+        {"nombre": "grande", "url": "http://grande:8101", "carga": 1,
+         "ranuras": 64, "ranuras_libres": 63, "cola": 0}
+    ]
+    assert plan.elegir_ejecutor(vecinos) == "http://grande:8101"
+
+
+def test_planificador_descarta_nodo_donde_no_cabe_la_tarea():
+    class T:
+        recursos = {"cpu": 4}
+
+    plan = PlanificadorLocal(
+        mi_nombre="local",
+        mi_url="http://local:8100",
+        metricas=None,
+        obtener_carga_fn=lambda: 0,
+        obtener_recursos_fn=lambda: {"ranuras": 8, "ranuras_libres": 2, "cola": 0}
+    )
+    vecinos = [
+        {"nombre": "libre", "url": "http://libre:8101", "ranuras": 8, "ranuras_libres": 6, "cola": 0}
+    ]
+    assert plan.elegir_ejecutor(vecinos, T()) == "http://libre:8101"
+
+
+def test_puntuacion_por_carga_y_por_ranuras_en_la_misma_escala():
+    plan = PlanificadorLocal(mi_nombre="a", mi_url="http://a:8100", metricas=None,
+                             obtener_carga_fn=lambda: 0)
+    antiguo = {"nombre": "antiguo", "carga": 0}
+    holgado = {"nombre": "holgado", "ranuras": 8, "ranuras_libres": 8, "cola": 0}
+    assert 0.0 <= plan._puntuar_nodo(antiguo) < 1.0
+    assert 0.0 <= plan._puntuar_nodo(holgado) < 1.0
+    # Un nodo antiguo sin carga ya no gana siempre a uno con casi todas las ranuras libres
+    assert plan._puntuar_nodo(holgado) > plan._puntuar_nodo(antiguo)
+    assert plan._puntuar_nodo({"carga": 0}) > plan._puntuar_nodo({"carga": 3})
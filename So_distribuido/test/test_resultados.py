@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import json
+from fastapi.testclient import TestClient
+from Libs.resultados import RegistroResultados, PROGRESO, PARCIAL, COMPLETADO
+
+
+def test_eventos_desde_y_terminado():
+    r = RegistroResultados()
+    r.publicar("t1", PROGRESO, {"estado": "EN_EJECUCION"})
+    r.publicar("t1", PARCIAL, {"shard": 0})
+    r.publicar("t1", COMPLETADO, {"resultado": 42})
+    r.publicar("t1", PROGRESO, {"tarde": True})  # ignorado tras terminar
+
+    eventos, terminado = r.eventos_desde("t1", 1)
+    assert [e["tipo"] for e in eventos] == [PARCIAL, COMPLETADO]
+    assert terminado
+    assert r.ultimo("t1")["datos"] == {"resultado": 42}
+
+
+def test_esperar_despierta_al_publicar_desde_otro_hilo():
+    r = RegistroResultados()
+
+    async def suscribir():
+        threading.Timer(0.05, r.publicar, args=("t2", COMPLETADO, {"ok": True})).start()
+        return await r.esperar("t2", 0, timeout=2.0)
+
+    eventos, terminado = asyncio.run(suscribir())
+    assert terminado
+    assert eventos[0]["datos"] == {"ok": True}
+
+
+def test_registro_acotado():
+    r = RegistroResultados(max_flujos=2, max_eventos=3)
+    for i in range(5):
+        r.publicar("t", PARCIAL, {"i": i})
+    assert [e["datos"]["i"] for e in r.eventos_desde("t")[0]] == [2, 3, 4]
+    r.publicar("a", COMPLETADO)
+    r.publicar("b", COMPLETADO)
+    # Se desaloja primero el flujo terminado más antiguo
+    assert r.ultimo("a") is None
+    assert r.ultimo("t") is not None
+
+
+def test_stream_sse_entrega_resultado_recibido():
+    from nodo.main import app
+    client = TestClient(app)
+    client.post("/resultados", json={"tarea_id": "sse1", "estado": "PARCIAL", "detalle": {"shard": 1}})
+    client.post("/resultados", json={"tarea_id": "sse1", "estado": "COMPLETADA", "detalle": {"y": 2}})
+
+    with client.stream("GET", "/resultados/sse1/stream") as resp:
+        cuerpo = "".join(resp.iter_text())
+
+    bloques = [b for b in cuerpo.split("\n\n") if b.startswith("id:")]
+    datos = [json.loads(b.split("data: ", 1)[1]) for b in bloques]
+    assert [d["tipo"] for d in datos] == ["parcial", "completado"]
+    assert datos[-1]["datos"]["detalle"] == {"y": 2}
+    assert client.get("/resultados/sse1").json()["terminado"] is True
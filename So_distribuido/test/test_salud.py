@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import time
+
+from Libs.metricas import Metricas
+from Libs.planificador import PlanificadorLocal
+from Libs.salud import ABIERTO, CERRADO, SEMIABIERTO, SaludVecinos
+
+
+def test_circuito_se_abre_se_enfria_y_se_cierra():
+    salud = SaludVecinos(umbral_errores=2, enfriamiento=0.05)
+    salud.exito("http://b", rtt_ms=10.0)
+    salud.exito("http://b", rtt_ms=20.0)
+    assert salud.describir()["http://b"]["rtt_ms"] == 13.0
+    salud.fallo("http://b")
+    assert salud.permite("http://b")
+    salud.fallo("http://b")
+    assert salud.describir()["http://b"]["circuito"] == ABIERTO
+    assert not salud.permite("http://b")
+    time.sleep(0.06)
+    assert salud.permite("http://b")  # prueba tras el enfriamiento
+    assert salud.describir()["http://b"]["circuito"] == SEMIABIERTO
+    salud.fallo("http://b")  # la prueba falla: vuelve a abrirse al momento
+    assert not salud.permite("http://b")
+    time.sleep(0.06)
+    salud.permite("http://b")
+    salud.exito("http://b")
+    assert salud.describir()["http://b"]["circuito"] == CERRADO
+
+
+def test_planificador_salta_vecinos_con_circuito_abierto():
+    metricas = Metricas()
+    salud = SaludVecinos(umbral_errores=1, enfriamiento=60)
+    planificador = PlanificadorLocal("a", "http://a", metricas, lambda: 10.0, salud=salud)
+    vecinos = [{"nombre": "b", "url": "http://b", "carga": 0.0},
+               {"nombre": "c", "url": "http://c", "carga": 1.0}]
+    assert planificador.elegir_ejecutor(vecinos) == "http://b"
+    salud.fallo("http://b")
+    assert planificador.clasificar(vecinos) == ["http://c", "YO"]
+    assert metricas.contadores["planificador_vecinos_omitidos"] == 1
+
+
+def test_estado_de_los_vecinos_en_metrics():
+    salud = SaludVecinos(umbral_errores=1)
+    salud.exito("http://b", rtt_ms=1.5)
+    salud.fallo("http://c")
+    texto = salud.exportar_texto()
+    assert 'vecino_rtt_ms{vecino="http://b"} 1.500' in texto
+    assert 'vecino_circuito{vecino="http://b"} 0' in texto
+    assert 'vecino_circuito{vecino="http://c"} 2' in texto
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    salud = SaludVecinos(umbral_errores=1, enfriamiento=0.05)
+    salud.fallo("http://b")
+    time.sleep(0.06)
+    assert salud.disponible("http://b")
+    assert salud.permite("http://b")  # la prueba
+    assert not salud.permite("http://b") and not salud.disponible("http://b")
+    time.sleep(0.06)  # la prueba no devolvió resultado: se admite otra
+    assert salud.permite("http://b")
+    salud.exito("http://b")
+    assert salud.permite("http://b") and salud.permite("http://b")
+
+
+def test_el_planificador_solo_reserva_la_prueba_del_elegido():
+    salud = SaludVecinos(umbral_errores=1, enfriamiento=0.01)
+    planificador = PlanificadorLocal("a", "http://a", Metricas(), lambda: 10.0, salud=salud)
+    vecinos = [{"nombre": "b", "url": "http://b", "carga": 0.0},
+               {"nombre": "c", "url": "http://c", "carga": 1.0}]
+    salud.fallo("http://b")
+    salud.fallo("http://c")
+    time.sleep(0.02)
+    assert planificador.clasificar(vecinos) == ["http://b", "http://c", "YO"]
+    assert planificador.elegir_ejecutor(vecinos) == "http://b"
+    # La prueba de c sigue libre; la de b ya está en vuelo
+    assert planificador.elegir_ejecutor(vecinos) == "http://c"
+    assert planificador.elegir_ejecutor(vecinos) == "YO"
+
+
+def test_vecino_expirado_se_olvida():
+    from Libs.descubrimiento import Descubridor
+    salud = SaludVecinos(umbral_errores=1)
+    salud.fallo("http://b")
+    d = Descubridor("239.1.1.1", 50000, "a", "http://a", lambda: {}, timeout=1.0, al_expirar=salud.olvidar)
+    d.vecinos["b"] = (time.time() - 5, "http://b", {})
+    d._purgar_expirados()
+    assert salud.describir() == {}
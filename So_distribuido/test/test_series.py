@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from Libs import series as ts
+from Libs.metricas import Metricas
+from Libs.series import Anillo, SeriesMetricas
+
+
+def test_anillo_tiene_tamano_fijo_y_olvida_lo_antiguo():
+    anillo = Anillo(resolucion=1.0, capacidad=10)
+    for t in range(25):
+        anillo.anotar(1000.0 + t, 1.0, maximo=t)
+    puntos = anillo.puntos(ventana=3600, ahora=1024.5)
+    assert len(anillo.ids) == 10 and len(puntos) == 10
+    assert [p[0] for p in puntos] == list(range(1015, 1025))
+    assert puntos[-1] == [1024, 1.0, 1, 24]
+
+
+def test_muestreo_por_niveles_y_percentiles():
+    metricas = Metricas()
+    series = SeriesMetricas(metricas, niveles=((1.0, 60), (60.0, 10)))
+    series.muestrear(ahora=1000.0)
+    for segundo in range(3):
+        for _ in range(5):
+            metricas.inc("tareas_ejecutadas")
+        for v in (10.0, 20.0, 1000.0):
+            metricas.observe("duracion_ms", v)
+        series.muestrear(ahora=1001.0 + segundo)
+    with patch("Libs.series.time.time", return_value=1003.5):
+        fino = series.exportar(resolucion=1, ventana=60)
+        grueso = series.exportar(resolucion=60, ventana=3600)
+    assert fino["contadores"]["tareas_ejecutadas"] == [[1001, 5.0], [1002, 5.0], [1003, 5.0]]
+    assert grueso["contadores"]["tareas_ejecutadas"] == [[16, 15.0]]
+    assert grueso["observaciones"]["duracion_ms"] == [[16, 3090.0, 9, 1000.0]]
+    resumen = ts.resumir(ts.fusionar([fino]))
+    assert resumen["contadores"]["tareas_ejecutadas"]["por_segundo"][0] == [1001.0, 5.0]
+    assert resumen["observaciones"]["duracion_ms"]["p50"] == pytest.approx(20.0, rel=0.2)
+    assert resumen["observaciones"]["duracion_ms"]["p99"] == pytest.approx(1000.0, rel=0.2)
+
+
+def test_fusion_suma_ranuras_e_histogramas_de_varios_nodos():
+    a = {"resolucion": 1.0, "totales": {"x": 3}, "contadores": {"x": [[10, 1.0], [11, 2.0]]},
+         "observaciones": {"l": [[10, 4.0, 2, 3.0]]}, "histogramas": {"l": {"4": 2}}}
+    b = {"resolucion": 1.0, "totales": {"x": 5}, "contadores": {"x": [[11, 5.0]]},
+         "observaciones": {"l": [[10, 9.0, 1, 9.0]]}, "histogramas": {"l": {"4": 1, "12": 1}}}
+    f = ts.fusionar([a, b])
+    assert f["totales"] == {"x": 8}
+    assert f["contadores"]["x"] == [[10, 1.0], [11, 7.0]]
+    assert f["observaciones"]["l"] == [[10, 13.0, 3, 9.0]]
+    assert f["histogramas"]["l"] == {"4": 3, "12": 1}
+
+
+def test_metrics_cluster_no_espera_a_vecinos_lentos():
+    from fastapi.testclient import TestClient
+    import nodo.main as nodo
+    client = TestClient(nodo.app)
+    vecinos = [{"url": "http://rapido:8100"}, {"url": "http://caido:8100"}]
+    remoto = {"resolucion": 1.0, "totales": {"tareas_recibidas": 7}, "contadores": {},
+              "observaciones": {}, "histogramas": {}}
+
+    def get(url, params, timeout):
+        if "caido" in url:
+            raise ConnectionError("caído")
+        r = MagicMock()
+        r.json.return_value = remoto
+        return r
+
+    with patch.object(nodo, "desc") as desc, patch("nodo.main.httpx.get", side_effect=get):
+        desc.lista_vecinos_con_metricas.return_value = vecinos
+        r = client.get("/metrics/cluster")
+    assert r.status_code == 200
+    cuerpo = r.json()
+    assert cuerpo["nodos"] == 2 and cuerpo["sin_respuesta"] == ["http://caido:8100"]
+
+
+def test_percentiles_solo_de_la_ventana_y_observaciones_acotadas():
+    metricas = Metricas(max_observaciones=4)
+    series = SeriesMetricas(metricas, niveles=((1.0, 600),))
+    for _ in range(10):
+        metricas.observe("lat", 1000.0)  # solo caben 4: se muestrean las que quedan
+    series.muestrear(ahora=1000.0)
+    for _ in range(10):
+        metricas.observe("lat", 10.0)
+    series.muestrear(ahora=1200.0)
+    assert len(metricas.observaciones["lat"]) == 4
+    assert metricas.instantanea()["observaciones"]["lat"] == [10100.0, 20]
+    with patch("Libs.series.time.time", return_value=1200.5):
+        reciente = series.exportar(resolucion=1, ventana=60)
+        todo = series.exportar(resolucion=1, ventana=600)
+    assert sum(reciente["histogramas"]["lat"].values()) == 4
+    assert ts.resumir(ts.fusionar([reciente]))["observaciones"]["lat"]["p99"] == pytest.approx(10.0, rel=0.2)
+    assert sum(todo["histogramas"]["lat"].values()) == 8
+    # Sin observaciones nuevas no se vuelve a anotar nada
+    series.muestrear(ahora=1201.0)
+    assert series._series["o:lat"][0].puntos(600, 1201.5)[-1][0] == 1200
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from Libs.metricas import Metricas
+from Libs.planificador import PlanificadorLocal
+from Libs.tipos_tarea import TipoTarea, RegistroTipos
+
+
+def _registro():
+    registro = RegistroTipos(Metricas())
+    registro.registrar(TipoTarea("suma", lambda p: {"total": sum(p["valores"])},
+                                 requeridos={"valores": list}, recursos={"cpu": 2}))
+    return registro
+
+
+def test_validacion_de_esquema():
+    registro = _registro()
+    assert registro.validar("suma", {"valores": [1, 2]}) is None
+    assert "Falta el campo 'valores'" in registro.validar("suma", {})
+    assert "debe ser list" in registro.validar("suma", {"valores": 3})
+    assert "no soportado" in registro.validar("resta", {"valores": [1]})
+    # Las referencias a salidas de otras tareas de un trabajo se resuelven después
+    assert registro.validar("suma", {"valores": {"$ref": "previa"}}) is None
+
+
+def test_ejecuta_manejador_y_declara_recursos():
+    registro = _registro()
+    assert registro.ejecutar("suma", {"valores": [1, 2, 3]}) == {"total": 6}
+    assert registro.solicitud_por_defecto("suma") == {"cpu": 2}
+    assert registro.nombres() == ["suma"]
+
+
+def test_manejador_por_nombre_se_importa_en_el_primer_uso():
+    registro = RegistroTipos()
+    registro.registrar(TipoTarea("raiz", "math:sqrt"))
+    assert registro.calientes() == {"raiz": False}
+    assert registro.ejecutar("raiz", 9.0) == 3.0
+    assert registro.todos_calientes()
+
+
+def test_entry_points_registran_tipos_y_toleran_plugins_rotos():
+    bueno, roto = MagicMock(), MagicMock()
+    bueno.load.return_value = lambda: [TipoTarea("a", lambda p: p), TipoTarea("b", lambda p: p)]
+    roto.load.side_effect = ImportError("falta dependencia")
+    metricas = Metricas()
+    registro = RegistroTipos(metricas)
+    with patch("Libs.tipos_tarea.entry_points", return_value=[roto, bueno]):
+        assert registro.cargar_entry_points() == ["a", "b"]
+    assert metricas.contadores["tipos_tarea_con_error"] == 1
+
+
+def test_planificador_solo_elige_nodos_que_anuncian_el_tipo():
+    plan = PlanificadorLocal("yo", "http://yo", Metricas(), lambda: 0,
+                             lambda: {"ranuras": 1, "ranuras_libres": 0, "cola": 3})
+    vecinos = [
+        {"nombre": "v1", "url": "http://v1", "ranuras": 4, "ranuras_libres": 4, "tipos": ["otro"]},
+        {"nombre": "v2", "url": "http://v2", "ranuras": 2, "ranuras_libres": 1, "tipos": ["suma"]},
+        {"nombre": "v3", "url": "http://v3", "carga": 5},  # sin "tipos": versión anterior
+    ]
+    tarea = MagicMock(tipo="suma", recursos={}, payload={})
+    orden = plan.clasificar(vecinos, tarea)
+    assert "http://v1" not in orden
+    assert sorted(orden) == ["YO", "http://v2", "http://v3"]
+
+
+def test_nodo_rechaza_tipo_desconocido_antes_de_planificar():
+    from nodo.main import app
+    cliente = TestClient(app)
+    with patch("nodo.main.planificador") as plan:
+        r = cliente.post("/tareas/ejecutar", json={"id": "t-x", "tipo": "inexistente", "payload": {}})
+        r2 = cliente.post("/tareas", json={"id": "t-y", "tipo": "regresion_lineal", "payload": {"X": 1}})
+    assert r.status_code == 400 and "no soportado" in r.json()["detail"]
+    assert r2.status_code == 400
+    plan.elegir_ejecutor.assert_not_called()
+    assert "regresion_lineal" in cliente.get("/tipos").json()
+
+
+def test_nodo_ejecuta_regresion_por_el_registro():
+    from nodo.main import ejecutar_tarea, Tarea
+    tarea = Tarea(id="t-reg-tipos", tipo="regresion_lineal",
+                  payload={"origen": "http://cliente:9000", "X": [[0], [1], [2]], "y": [1, 3, 5]})
+    request = MagicMock()
+    request.headers = {}
+    with patch("nodo.main.planificador") as plan, patch("nodo.main.desc") as desc, \
+         patch("nodo.main.httpx.post"):
+        plan.elegir_ejecutor.return_value = "YO"
+        desc.lista_vecinos_con_metricas.return_value = []
+        r = ejecutar_tarea(tarea, request)
+    assert r["estado"] == "COMPLETADA"
+    assert [round(c, 6) for c in r["resultado"]["coeficientes"]] == [1.0, 2.0]
+    assert tarea.recursos == {"cpu": 1}
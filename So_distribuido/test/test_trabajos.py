@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import pytest
+from Libs.trabajos import GrafoTrabajo, resolver_referencias, COMPLETADA, FALLIDA, OMITIDA, EN_EJECUCION
+
+
+def _grafo():
+    return GrafoTrabajo("job", [
+        {"id": "pre", "tipo": "x", "payload": {}},
+        {"id": "fit", "tipo": "x", "payload": {"datos": {"$ref": "pre", "campo": "X"}}},
+        {"id": "eval", "tipo": "x", "payload": {"modelo": {"$ref": "fit"}}, "depende_de": ["pre"]},
+    ])
+
+
+def test_dependencias_y_tareas_listas():
+    g = _grafo()
+    assert g.listas() == ["pre"]
+    g.marcar("pre", COMPLETADA, ubicacion="http://a:8101")
+    assert g.listas() == ["fit"]
+    assert g.dependencias["fit"] == {"pre"}  # deducida del $ref
+    assert g.es_final("eval") and not g.es_final("fit")
+
+
+def test_ciclos_y_dependencias_desconocidas_se_rechazan():
+    with pytest.raises(ValueError):
+        GrafoTrabajo("c", [
+            {"id": "a", "tipo": "x", "payload": {}, "depende_de": ["b"]},
+            {"id": "b", "tipo": "x", "payload": {}, "depende_de": ["a"]},
+        ])
+    with pytest.raises(ValueError):
+        GrafoTrabajo("d", [{"id": "a", "tipo": "x", "payload": {}, "depende_de": ["nada"]}])
+
+
+def test_despacho_reescribe_referencias_con_ubicacion_y_afinidad():
+    g = _grafo()
+    g.marcar("pre", COMPLETADA, ubicacion="http://a:8101")
+    t = g.tarea_para_despacho("fit", "http://yo:8100")
+    assert t["id"] == "job.fit"
+    assert t["payload"]["datos"] == {"$ref": "job.pre", "campo": "X", "url": "http://a:8101"}
+    assert t["payload"]["_afinidad"] == ["http://a:8101"]
+    assert t["payload"]["_por_referencia"] is True
+    assert t["payload"]["_refs"] is True
+
+
+def test_fallo_omite_dependientes():
+    g = _grafo()
+    g.marcar("pre", FALLIDA)
+    assert g.estados["fit"] == OMITIDA and g.estados["eval"] == OMITIDA
+    assert g.terminado() and g.estado_global() == FALLIDA
+
+
+def test_resolver_referencias_trae_cada_salida_una_vez():
+    llamadas = []
+
+    def obtener(tid, url):
+        llamadas.append((tid, url))
+        return {"X": [1, 2], "y": [3]}
+
+    payload = {"a": {"$ref": "j.pre", "campo": "X", "url": "u"}, "b": [{"$ref": "j.pre", "url": "u"}]}
+    res = resolver_referencias(payload, obtener)
+    assert res == {"a": [1, 2], "b": [{"X": [1, 2], "y": [3]}]}
+    assert llamadas == [("j.pre", "u")]
+
+
+def test_trabajo_completo_pasa_salidas_por_referencia():
+    from fastapi.testclient import TestClient
+    from nodo.main import app, registro, kv
+    client = TestClient(app)
+    X = [[0.0], [1.0], [2.0], [3.0]]
+    trabajo = {
+        "id": "pipeline1",
+        "tareas": [
+            {"id": "fit", "tipo": "regresion_lineal",
+             "payload": {"X": X, "y": [1.0, 3.0, 5.0, 7.0], "X_test": X}},
+            {"id": "refit", "tipo": "regresion_lineal",
+             "payload": {"X": X, "y": {"$ref": "fit", "campo": "predicciones"}, "X_test": [[10.0]]}},
+        ],
+    }
+    r = client.post("/trabajos", json=trabajo)
+    assert r.status_code == 200
+
+    evento = registro.esperar_terminal("pipeline1", timeout=5.0)
+    assert evento["tipo"] == "completado"
+    assert list(evento["datos"]["resultados"]) == ["refit"]  # solo la salida final vuelve al cliente
+    assert evento["datos"]["resultados"]["refit"]["predicciones"][0] == pytest.approx(21.0)
+    assert kv.get("trabajo_pipeline1")["estado"] == "COMPLETADA"
+
+
+def test_trabajo_con_ciclo_devuelve_400():
+    from fastapi.testclient import TestClient
+    from nodo.main import app
+    client = TestClient(app)
+    r = client.post("/trabajos", json={"id": "malo", "tareas": [
+        {"id": "a", "tipo": "x", "payload": {}, "depende_de": ["a"]}
+    ]})
+    assert r.status_code == 400
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch, MagicMock
+from Libs.trazas import Trazador, parsear_traceparent, formatear_traceparent
+
+
+def test_spans_anidados_comparten_traza():
+    tr = Trazador("nodo", muestreo=1.0)
+    with tr.span("raiz") as raiz:
+        with tr.span("hijo", x=1) as hijo:
+            pass
+    assert hijo.trace_id == raiz.trace_id
+    assert hijo.padre_id == raiz.span_id
+    assert raiz.padre_id is None
+    assert [s.nombre for s in tr.spans()] == ["hijo", "raiz"]
+
+
+def test_sin_muestreo_no_registra_pero_propaga_contexto():
+    tr = Trazador("nodo", muestreo=0.0)
+    with tr.span("raiz") as raiz:
+        tp = tr.traceparent()
+    assert raiz is None
+    assert tr.spans() == []
+    assert parsear_traceparent(tp)[2] is False
+    assert tr.traceparent() is None  # fuera del span no queda contexto
+
+
+def test_padre_remoto_respeta_decision_de_muestreo():
+    tr = Trazador("nodo", muestreo=0.0)
+    padre = formatear_traceparent("a" * 32, "b" * 16, True)
+    with tr.span("remoto", padre=padre) as s:
+        pass
+    assert s.trace_id == "a" * 32 and s.padre_id == "b" * 16
+    assert parsear_traceparent("basura") is None
+
+
+def test_buffer_circular_y_formato_otlp():
+    tr = Trazador("nodoX", muestreo=1.0, capacidad=2)
+    for i in range(5):
+        with tr.span(f"s{i}", i=i):
+            pass
+    otlp = tr.exportar_otlp()
+    rs = otlp["resourceSpans"][0]
+    assert rs["resource"]["attributes"][0]["value"]["stringValue"] == "nodoX"
+    spans = rs["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["s3", "s4"]
+    assert spans[0]["attributes"] == [{"key": "i", "value": {"intValue": "3"}}]
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+
+
+def test_error_marca_estado_del_span():
+    tr = Trazador("nodo", muestreo=1.0)
+    try:
+        with tr.span("falla"):
+            raise ValueError("x")
+    except ValueError:
+        pass
+    assert tr.exportar_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["status"]["code"] == 2
+
+
+def test_ejecutar_tarea_registra_spans_por_fase():
+    from nodo.main import ejecutar_tarea, Tarea, trazador
+    padre = formatear_traceparent("c" * 32, "d" * 16, True)
+    tarea = Tarea(id="traza1", tipo="regresion_lineal",
+                  payload={"X": [[0.0], [1.0]], "y": [0.0, 1.0], "origen": "http://yo", "_traza": padre})
+    with patch("nodo.main.desc") as desc, patch("nodo.main.planificador") as plan:
+        desc.lista_vecinos_con_metricas.return_value = []
+        plan.elegir_ejecutor.return_value = "YO"
+        request = MagicMock()
+        request.headers = {}
+        ejecutar_tarea(tarea, request)
+
+    nombres = {s.nombre for s in trazador.spans("c" * 32)}
+    assert {"tarea.ejecutar", "planificar", "admision", "computo"} <= nombres
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Banco de carga para un clúster local de N nodos.
+Levanta N procesos uvicorn en 127.0.0.1 con descubrimiento loopback (sin multidifusión),
+genera carga de lazo abierto (llegadas de Poisson) con mezcla de tareas, tamaños y caídas
+de nodos programadas, y escribe un informe JSON comparable entre ejecuciones.
+
+Ejemplo:
+    python tools/bench_cluster.py --nodos 3 --tasa 20 --duracion 30 --fallos 15:2 --salida bench.json
+    python tools/bench_cluster.py --nodos 3 --tasa 20 --duracion 30 --comparar bench.json
+"""
+import argparse, json, os, random, socket, subprocess, sys, threading, time, uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def puerto_libre(tipo=socket.SOCK_STREAM) -> int:
+    s = socket.socket(socket.AF_INET, tipo)
+    s.bind(("127.0.0.1", 0))
+    puerto = s.getsockname()[1]
+    s.close()
+    return puerto
+
+
+def lanzar_nodos(n: int, env_extra: Dict[str, str] = None) -> List[Dict[str, Any]]:
+    puertos = [puerto_libre() for _ in range(n)]
+    puertos_udp = [puerto_libre(socket.SOCK_DGRAM) for _ in range(n)]
+    pares = ",".join(str(p) for p in puertos_udp)
+    nodos = []
+    for i, (p, pu) in enumerate(zip(puertos, puertos_udp)):
+        url = f"http://127.0.0.1:{p}"
+        env = dict(os.environ, PUERTO=str(p), NOMBRE=f"bench{i}", URL_NODO=url,
+                   DESCUBRIMIENTO_MODO="loopback", DESCUBRIMIENTO_PUERTO=str(pu),
+                   DESCUBRIMIENTO_PARES=pares, **(env_extra or {}))
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "nodo.main:app", "--host", "127.0.0.1",
+             "--port", str(p), "--log-level", "warning"],
+            cwd=RAIZ, env=env,
+        )
+        nodos.append({"nombre": f"bench{i}", "url": url, "proc": proc, "vivo": True})
+    return nodos
+
+
+def esperar_listos(nodos: List[Dict[str, Any]], timeout: float = 30.0):
+    limite = time.time() + timeout
+    for n in nodos:
+        while True:
+            try:
+                if httpx.get(n["url"] + "/salud/listo", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > limite:
+                raise RuntimeError(f"{n['nombre']} no arrancó")
+            time.sleep(0.1)
+
+
+def parsear_metricas(texto: str) -> Dict[str, float]:
+    """Convierte la exposición de texto de /metrics en {nombre: valor}."""
+    if texto.startswith('"'):
+        texto = json.loads(texto)  # /metrics responde el texto serializado como JSON
+    valores = {}
+    for linea in texto.splitlines():
+        if not linea or linea.startswith("#"):
+            continue
+        partes = linea.rsplit(" ", 1)
+        if len(partes) == 2:
+            try:
+                valores[partes[0]] = float(partes[1])
+            except ValueError:
+                pass
+    return valores
+
+
+def percentil(valores: List[float], p: float):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def resumen_balance(por_nodo: Dict[str, float]) -> Dict[str, Any]:
+    """Reparto de tareas ejecutadas: coeficiente de variación y relación máx/mín."""
+    vals = list(por_nodo.values())
+    if not vals:
+        return {"por_nodo": {}, "cv": None, "max_min": None}
+    media = sum(vals) / len(vals)
+    var = sum((v - media) ** 2 for v in vals) / len(vals)
+    return {
+        "por_nodo": por_nodo,
+        "cv": (var ** 0.5) / media if media else None,
+        "max_min": max(vals) / min(vals) if min(vals) > 0 else None,
+    }
+
+
+def generar_tarea(mezcla: Dict[str, float], tamanos: List[int], rng: random.Random) -> Dict[str, Any]:
+    tipo = rng.choices(list(mezcla), weights=list(mezcla.values()))[0]
+    filas = rng.choice(tamanos)
+    X = [[rng.gauss(0, 1) for _ in range(3)] for _ in range(filas)]
+    y = [2.0 + 1.5 * a - 2.0 * b + 0.7 * c for a, b, c in X]
+    return {"id": str(uuid.uuid4()), "tipo": tipo,
+            "payload": {"X": X, "y": y, "X_test": X[:2]}}
+
+
+def _raspar(nodo: Dict[str, Any]) -> Dict[str, float]:
+    try:
+        return parsear_metricas(httpx.get(nodo["url"] + "/metrics", timeout=2.0).text)
+    except httpx.HTTPError:
+        return {}
+
+
+def ejecutar(args) -> Dict[str, Any]:
+    rng = random.Random(args.semilla)
+    mezcla = {k: float(v) for k, v in (p.split(":") for p in args.mezcla.split(","))}
+    tamanos = [int(x) for x in args.tamanos.split(",")]
+    fallos = sorted((float(t), int(i)) for t, i in (f.split(":") for f in args.fallos.split(",") if f))
+
+    nodos = lanzar_nodos(args.nodos)
+    metricas_finales: Dict[str, Dict[str, float]] = {}
+    latencias: List[float] = []
+    estados: Counter = Counter()
+    lock = threading.Lock()
+    try:
+        esperar_listos(nodos)
+        time.sleep(args.calentamiento)  # al menos un par de latidos para que se vean entre sí
+
+        cliente = httpx.Client(timeout=args.timeout)
+
+        def enviar(tarea, url):
+            t0 = time.perf_counter()
+            try:
+                r = cliente.post(url + "/tareas/ejecutar", json=tarea)
+                estado = r.json().get("estado") if r.status_code == 200 else f"HTTP_{r.status_code}"
+            except Exception:
+                estado = "ERROR_CLIENTE"
+            dur = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                estados[estado] += 1
+                if estado == "COMPLETADA":
+                    latencias.append(dur)
+
+        pool = ThreadPoolExecutor(max_workers=args.max_en_vuelo)
+        inicio = time.time()
+        siguiente = inicio
+        enviadas = 0
+        while True:
+            # Lazo abierto: la siguiente llegada no espera a que terminen las anteriores
+            siguiente += rng.expovariate(args.tasa)
+            if siguiente - inicio > args.duracion:
+                break
+            while fallos and fallos[0][0] <= time.time() - inicio:
+                _, idx = fallos.pop(0)
+                nodo = nodos[idx]
+                metricas_finales[nodo["nombre"]] = _raspar(nodo)
+                nodo["proc"].kill()
+                nodo["vivo"] = False
+            espera = siguiente - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            vivos = [n for n in nodos if n["vivo"]]
+            pool.submit(enviar, generar_tarea(mezcla, tamanos, rng), rng.choice(vivos)["url"])
+            enviadas += 1
+        pool.shutdown(wait=True)
+        total_s = time.time() - inicio
+        time.sleep(args.calentamiento)  # dejar que terminen los reenvíos asíncronos
+        for n in nodos:
+            if n["vivo"]:
+                metricas_finales[n["nombre"]] = _raspar(n)
+    finally:
+        for n in nodos:
+            if n["proc"].poll() is None:
+                n["proc"].terminate()
+        for n in nodos:
+            n["proc"].wait(timeout=10)
+
+    def _suma(nombre):
+        return sum(m.get(nombre, 0.0) for m in metricas_finales.values())
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+        "enviadas": enviadas,
+        "estados": dict(estados),
+        "duracion_s": total_s,
+        "throughput_rps": estados["COMPLETADA"] / total_s if total_s else 0.0,
+        "latencia_ms": {
+            "p50": percentil(latencias, 50),
+            "p99": percentil(latencias, 99),
+            "media": sum(latencias) / len(latencias) if latencias else None,
+        },
+        "bytes": {
+            "kv_sync": _suma("bytes_kv_sync_tx"),
+            "reenvio": _suma("bytes_reenvio_tx"),
+        },
+        "balance": resumen_balance({k: m.get("tareas_ejecutadas", 0.0) for k, m in metricas_finales.items()}),
+    }
+
+
+def comparar(actual: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    """Cambio relativo de las cifras principales respecto a una ejecución anterior."""
+    def _rel(a, b):
+        return None if a is None or not b else (a - b) / b
+
+    return {
+        "throughput_rps": _rel(actual["throughput_rps"], base["throughput_rps"]),
+        "p50_ms": _rel(actual["latencia_ms"]["p50"], base["latencia_ms"]["p50"]),
+        "p99_ms": _rel(actual["latencia_ms"]["p99"], base["latencia_ms"]["p99"]),
+        "bytes_kv_sync": _rel(actual["bytes"]["kv_sync"], base["bytes"]["kv_sync"]),
+        "bytes_reenvio": _rel(actual["bytes"]["reenvio"], base["bytes"]["reenvio"]),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--nodos", type=int, default=3)
+    ap.add_argument("--tasa", type=float, default=10.0, help="llegadas por segundo (Poisson)")
+    ap.add_argument("--duracion", type=float, default=20.0, help="segundos de generación de carga")
+    ap.add_argument("--mezcla", default="regresion_lineal:1", help="tipo:peso,tipo:peso")
+    ap.add_argument("--tamanos", default="50,200,1000", help="filas de X posibles por tarea")
+    ap.add_argument("--fallos", default="", help="segundo:indice_nodo,... nodos a matar durante la carga")
+    ap.add_argument("--max-en-vuelo", type=int, default=256)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--calentamiento", type=float, default=3.0)
+    ap.add_argument("--semilla", type=int, default=0)
+    ap.add_argument("--salida", default=None, help="ruta del informe JSON")
+    ap.add_argument("--comparar", default=None, help="informe JSON previo para comparar")
+    args = ap.parse_args()
+
+    informe = ejecutar(args)
+    if args.comparar:
+        with open(args.comparar) as f:
+            informe["comparacion"] = comparar(informe, json.load(f))
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks de las rutas calientes del nodo, parametrizados por escala:
+  - PlanificadorLocal.elegir_ejecutor con 10 a 10k vecinos
+  - KVReplicado.fusionar_desde_vecino / estado_completo con 1k a 1M claves
+  - recepción de latidos del Descubridor (procesar + purgar) con 10 a 10k vecinos
+  - Metricas.exportar_texto con hasta 1M observaciones
+
+Ejemplo:
+    python tools/bench_micro.py                                  # todas las escalas
+    python tools/bench_micro.py --rapido --guardar tools/bench_baseline.json
+    python tools/bench_micro.py --rapido --comparar tools/bench_baseline.json
+Con --comparar sale con código 1 si algún caso empeora más que --tolerancia.
+"""
+import argparse, json, os, platform, sys, time
+from typing import Dict, Any, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Libs.planificador import PlanificadorLocal
+from Libs.kv import KVReplicado
+from Libs.descubrimiento import Descubridor
+from Libs.metricas import Metricas
+
+# nombre -> (escalas, preparar(escala) -> función a medir)
+CASOS: Dict[str, tuple] = {}
+
+
+def caso(nombre: str, escalas: List[int]):
+    def registrar(preparar: Callable[[int], Callable[[], Any]]):
+        CASOS[nombre] = (escalas, preparar)
+        return preparar
+    return registrar
+
+
+def _vecinos(n: int) -> List[Dict[str, Any]]:
+    return [{"nombre": f"n{i}", "url": f"http://n{i}:8100", "carga": i % 7,
+             "ranuras": 8, "ranuras_libres": i % 9, "cola": 0} for i in range(n)]
+
+
+@caso("planificador_elegir", [10, 100, 1000, 10000])
+def _planificador(n):
+    plan = PlanificadorLocal("yo", "http://yo:8100", None, lambda: 1,
+                             obtener_recursos_fn=lambda: {"ranuras": 8, "ranuras_libres": 4, "cola": 0})
+    vecinos = _vecinos(n)
+    return lambda: plan.elegir_ejecutor(vecinos)
+
+
+def _estado_remoto(n: int) -> Dict[str, Dict[str, Any]]:
+    return {f"k{i}": {"valor": {"i": i}, "version": 2} for i in range(n)}
+
+
+@caso("kv_fusionar", [1000, 10000, 100000, 1000000])
+def _kv_fusionar(n):
+    kv = KVReplicado("http://yo:8100")
+    kv.fusionar_desde_vecino(_estado_remoto(n))
+    remoto = _estado_remoto(n)  # mismas versiones: mide el coste de comparar sin escribir
+    return lambda: kv.fusionar_desde_vecino(remoto)
+
+
+@caso("kv_estado_completo", [1000, 10000, 100000, 1000000])
+def _kv_estado(n):
+    kv = KVReplicado("http://yo:8100")
+    kv.fusionar_desde_vecino(_estado_remoto(n))
+    return kv.estado_completo
+
+
+@caso("latido_recibir", [10, 100, 1000, 10000])
+def _latido(n):
+    d = Descubridor("239.10.10.10", 50000, "yo", "http://yo:8000", lambda: {}, timeout=1e9)
+    ahora = time.time()
+    for v in _vecinos(n):
+        d.vecinos[v["nombre"]] = (ahora, v["url"], {"carga": v["carga"]})
+    latido = json.dumps({"nombre": "n0", "url": "http://n0:8100", "ts": ahora, "carga": 1,
+                         "ranuras": 8, "ranuras_libres": 3, "cola": 0}).encode()
+
+    def recibir():
+        # Una iteración del bucle de escuchar(): procesar el datagrama y purgar expirados
+        d._procesar_anuncio(latido)
+        d._purgar_expirados()
+    return recibir
+
+
+@caso("metricas_exportar", [1000, 100000, 1000000])
+def _metricas(n):
+    m = Metricas()
+    for i in range(n):
+        m.observe("duracion_ms", float(i % 1000))
+    for i in range(50):
+        m.inc(f"contador_{i}")
+    return m.exportar_texto
+
+
+def medir(fn: Callable[[], Any], presupuesto_s: float, max_reps: int = 1000) -> Dict[str, float]:
+    """Repite fn hasta agotar el presupuesto; devuelve mínimo y mediana por llamada en µs."""
+    fn()  # calentamiento
+    tiempos = []
+    limite = time.perf_counter() + presupuesto_s
+    while len(tiempos) < max_reps and (len(tiempos) < 3 or time.perf_counter() < limite):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1e6)
+    tiempos.sort()
+    return {"min_us": tiempos[0], "mediana_us": tiempos[len(tiempos) // 2], "reps": len(tiempos)}
+
+
+def ejecutar(nombres: List[str], rapido: bool, presupuesto_s: float) -> Dict[str, Any]:
+    resultados = {}
+    for nombre in nombres:
+        escalas, preparar = CASOS[nombre]
+        if rapido:
+            escalas = escalas[:2]
+        for escala in escalas:
+            res = medir(preparar(escala), presupuesto_s)
+            resultados[f"{nombre}[{escala}]"] = res
+            print(f"{nombre:22s} {escala:>9d}  mediana {res['mediana_us']:12.1f} µs  "
+                  f"min {res['min_us']:12.1f} µs  ({res['reps']} reps)", file=sys.stderr)
+    return {"python": platform.python_version(), "maquina": platform.machine(), "resultados": resultados}
+
+
+def comparar(actual: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[Dict[str, Any]]:
+    """Casos cuya mediana empeora más de `tolerancia` (fracción) respecto a la línea base."""
+    regresiones = []
+    for clave, res in actual["resultados"].items():
+        previo = base["resultados"].get(clave)
+        if not previo:
+            continue
+        cambio = (res["mediana_us"] - previo["mediana_us"]) / previo["mediana_us"]
+        if cambio > tolerancia:
+            regresiones.append({"caso": clave, "base_us": previo["mediana_us"],
+                                "actual_us": res["mediana_us"], "cambio": cambio})
+    return regresiones
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("casos", nargs="*", default=list(CASOS), help=f"subconjunto de {list(CASOS)}")
+    ap.add_argument("--rapido", action="store_true", help="solo las dos escalas menores de cada caso")
+    ap.add_argument("--presupuesto", type=float, default=0.5, help="segundos de medición por caso y escala")
+    ap.add_argument("--guardar", default=None, help="escribe los resultados como nueva línea base")
+    ap.add_argument("--comparar", default=None, help="línea base JSON con la que comparar")
+    ap.add_argument("--tolerancia", type=float, default=0.5, help="empeoramiento admitido (0.5 = +50%%)")
+    args = ap.parse_args()
+
+    informe = ejecutar(args.casos, args.rapido, args.presupuesto)
+    if args.guardar:
+        with open(args.guardar, "w") as f:
+            json.dump(informe, f, indent=2, sort_keys=True)
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia)
+        for r in regresiones:
+            print(f"REGRESIÓN {r['caso']}: {r['base_us']:.1f} µs -> {r['actual_us']:.1f} µs "
+                  f"({r['cambio']:+.0%})", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+    if not args.guardar:
+        print(json.dumps(informe, indent=2))
+
+
+if __name__ == "__main__":
+    main()